@@ -1,11 +1,17 @@
 import xml.etree.ElementTree as ET
+import argparse
+import copy
 import json
 import logging
 import glob
 import importlib.util
 from datetime import datetime
 from pathlib import Path
-from jsonschema import validate, ValidationError  # Ensure you have installed jsonschema
+from jsonschema import ValidationError, validators  # Ensure you have installed jsonschema
+try:
+    import fastjsonschema  # Optional: generates a much faster validator
+except ImportError:
+    fastjsonschema = None
 import sys
 from pathlib import Path
 
@@ -131,6 +137,26 @@ def set_nested_value(json_obj, nested_key, value):
             return
         temp[last_key] = value
 
+def compile_template(template):
+    """
+    Compiles the template into a function that builds a fresh, independent copy
+    of it. The copy is built by evaluating a precompiled literal, which is much
+    cheaper than copy.deepcopy; templates that can't be written as a literal
+    fall back to deepcopy.
+    """
+    try:
+        code = compile(repr(template), "<template>", "eval")
+        if eval(code, {"__builtins__": {}}) == template:
+            return lambda: eval(code, {"__builtins__": {}})
+    except (SyntaxError, NameError, RecursionError, MemoryError):
+        pass
+    logger.warning("Template can't be compiled, using deepcopy")
+    return lambda: copy.deepcopy(template)
+
+def new_document(template):
+    """Returns a fresh document from a compiled template or a template dict."""
+    return template() if callable(template) else copy.deepcopy(template)
+
 def apply_transformation(value, transformation):
     if not transformation:
         return value
@@ -216,36 +242,303 @@ def parse_segment(segment, mapping_info, parent_json):
         else:
             logger.warning(f"Invalid mapping for field '{src_field}' in segment '{segment.tag}'")
 
-def parse_idoc(xml_path, config, template):
+# ---------------------------
+# Compiled Mapping (single-pass dispatch)
+# ---------------------------
+def compile_target(target_path):
+    """
+    Splits a dotted target path once. Returns (parent_keys, last_key) with list
+    indices already converted to int, so the same walk as set_nested_value can
+    run without re-parsing the path.
+    """
+    keys = [int(key) if key.isdigit() else key for key in target_path.split(".")]
+    return tuple(keys[:-1]), keys[-1]
+
+def resolve_parent(json_obj, parent_keys, target_path, parents):
+    """
+    Returns the container that holds the last key of a target path, creating
+    missing parents like set_nested_value. Resolved containers are cached in
+    parents (one cache per output document) so sibling targets walk the path once.
+    """
+    container = parents.get(parent_keys)
+    if container is not None:
+        return container
+    temp = json_obj
+    for i, key in enumerate(parent_keys):
+        if isinstance(key, int):
+            if not isinstance(temp, list):
+                logger.error(f"Expected a list at {target_path} but found {type(temp).__name__}.")
+                return None
+            while len(temp) <= key:
+                temp.append({})
+            temp = temp[key]
+        else:
+            if not isinstance(temp, dict):
+                logger.error(f"Expected a dict at {target_path} but found {type(temp).__name__}.")
+                return None
+            if key not in temp:
+                next_key = parent_keys[i+1] if i+1 < len(parent_keys) else None
+                temp[key] = [] if isinstance(next_key, int) else {}
+            temp = temp[key]
+    parents[parent_keys] = temp
+    return temp
+
+def compile_value(field_mapping, field_name):
+    """Compiles the transformation and validation of a field into one function."""
+    transformation = field_mapping.get("transformation")
+    values = transformation["values"] if transformation and transformation.get("type") == "MAP" else None
+    validation_rule = field_mapping.get("validation")
+
+    def convert(value):
+        if values is not None:
+            value = values.get(value, value)
+        if validation_rule:
+            return validate_data(value, validation_rule, field_name)
+        return value
+    return convert
+
+def compile_leaf(src_field, field_mapping, verbose):
+    target_path = field_mapping["target"]
+    parent_keys, last_key = compile_target(target_path)
+    convert = compile_value(field_mapping, src_field)
+
+    def set_leaf(field, output_json, parents):
+        value = convert(field.text.strip() if field.text else "")
+        if value is None:
+            return
+        container = resolve_parent(output_json, parent_keys, target_path, parents)
+        if container is None:
+            return
+        if isinstance(last_key, int):
+            if not isinstance(container, list):
+                logger.error(f"Expected a list at the end of {target_path} but found {type(container).__name__}.")
+                return
+            while len(container) <= last_key:
+                container.append(None)
+            container[last_key] = value
+        else:
+            if not isinstance(container, dict):
+                logger.error(f"Expected a dict to set key '{last_key}' but found {type(container).__name__}.")
+                return
+            container[last_key] = value
+        if verbose:
+            logger.debug(f"Mapped '{src_field}' -> '{target_path}', Value: '{value}'")
+        track_mapping(target_path)
+    return set_leaf
+
+def compile_array(src_field, field_mapping, verbose):
+    target_path = field_mapping["target"]
+    parent_keys, last_key = compile_target(target_path)
+    sub_fields = {
+        sub_src_field: (sub_mapping["target"], f"{target_path}.{sub_mapping['target']}",
+                        compile_value(sub_mapping, sub_src_field))
+        for sub_src_field, sub_mapping in (field_mapping.get("mapping") or {}).items()
+    }
+
+    def append_item(field, output_json, parents):
+        new_obj = {}
+        for sub_field in field:
+            sub_src_field = sub_field.tag
+            compiled = sub_fields.get(sub_src_field)
+            if compiled is None:
+                logger.warning(f"Unmapped field '{sub_src_field}' in segment '{field.tag}' for array mapping")
+                continue
+            key, usage_key, convert = compiled
+            value = convert(sub_field.text.strip() if sub_field.text else "")
+            if value is not None:
+                new_obj[key] = value
+                if verbose:
+                    logger.debug(f"Mapped '{sub_src_field}' -> '{usage_key}', Value: '{value}'")
+                track_mapping(usage_key)
+        container = resolve_parent(output_json, parent_keys, target_path, parents)
+        if isinstance(last_key, int):
+            target_array = container[last_key] if isinstance(container, list) and len(container) > last_key else None
+        else:
+            target_array = container.get(last_key) if isinstance(container, dict) else None
+        if target_array is None and container is not None:
+            if isinstance(last_key, int):
+                while len(container) <= last_key:
+                    container.append(None)
+            container[last_key] = target_array = []
+        if isinstance(target_array, list):
+            target_array.append(new_obj)
+        else:
+            logger.error(f"Expected target {target_path} to be a list, but found {type(target_array).__name__}")
+    return append_item
+
+def compile_segment(mapping_info, verbose=False):
+    """
+    Compiles the mapping of a segment into a dispatch table from field tag to a
+    handler, equivalent to parse_segment but without per-field path parsing.
+    Returns a function mapping a segment element into an output document.
+    """
+    dispatch = {}
+    for src_field, field_mapping in mapping_info.items():
+        if isinstance(field_mapping, dict) and "target" in field_mapping and field_mapping.get("isArray"):
+            dispatch[src_field] = compile_array(src_field, field_mapping, verbose)
+        elif isinstance(field_mapping, dict) and "target" in field_mapping:
+            dispatch[src_field] = compile_leaf(src_field, field_mapping, verbose)
+        elif isinstance(field_mapping, dict):
+            dispatch[src_field] = compile_segment(field_mapping, verbose)
+        else:
+            dispatch[src_field] = None
+
+    def run_segment(segment, output_json, parents):
+        for field in segment:
+            src_field = field.tag
+            if src_field not in dispatch:
+                logger.warning(f"Unmapped field '{src_field}' in segment '{segment.tag}'")
+                continue
+            handler = dispatch[src_field]
+            if handler is None:
+                logger.warning(f"Invalid mapping for field '{src_field}' in segment '{segment.tag}'")
+                continue
+            handler(field, output_json, parents)
+    return run_segment
+
+def compile_mappings(config, verbose=False):
+    """
+    Compiles config['mappings'] into a plan for map_idoc: segment name -> handler.
+    Per-value 'Mapped ...' lines are logged at DEBUG level, and only when verbose.
+    """
+    return {seg_name: compile_segment(mapping_info, verbose)
+            for seg_name, mapping_info in config['mappings'].items()}
+
+def map_idoc(root, config, output_json, plan=None):
+    """
+    Maps the segments of one IDOC element into output_json and returns it.
+    With a plan from compile_mappings the compiled handlers are used instead
+    of parse_segment.
+    """
+    output_json["unmappedSegments"] = []
+    unmapped_summary = {}
+    parents = {}
+    for segment in root.findall("./*"):
+        seg_name = segment.tag
+        if plan is not None and seg_name in plan:
+            plan[seg_name](segment, output_json, parents)
+        elif plan is None and seg_name in config['mappings']:
+            parse_segment(segment, config['mappings'][seg_name], output_json)
+        else:
+            logger.warning(f"No mapping found for segment '{seg_name}'")
+            unmapped_summary[seg_name] = unmapped_summary.get(seg_name, 0) + 1
+            output_json["unmappedSegments"].append({seg_name: xml_to_dict(segment)})
+    output_json["unmappedSummary"] = unmapped_summary
+    output_json["mappingUsage"] = mapping_usage
+    return output_json
+
+def parse_idoc(xml_path, config, template, plan=None):
     try:
         tree = ET.parse(xml_path)
         root = tree.getroot()
-        output_json = template.copy()
-        output_json["unmappedSegments"] = []
-        unmapped_summary = {}
-        for segment in root.findall("./*"):
-            seg_name = segment.tag
-            if seg_name in config['mappings']:
-                parse_segment(segment, config['mappings'][seg_name], output_json)
-            else:
-                logger.warning(f"No mapping found for segment '{seg_name}'")
-                unmapped_summary[seg_name] = unmapped_summary.get(seg_name, 0) + 1
-                output_json["unmappedSegments"].append({seg_name: xml_to_dict(segment)})
-        output_json["unmappedSummary"] = unmapped_summary
-        output_json["mappingUsage"] = mapping_usage
+        output_json = map_idoc(root, config, new_document(template), plan)
         logger.info(f"IDoc successfully parsed from {xml_path}")
         return output_json
     except Exception as e:
         logger.error(f"Error parsing IDoc: {e}")
         raise
 
+# ---------------------------
+# Packet (multi-IDoc) Parsing
+# ---------------------------
+def iter_idocs(xml_path):
+    """
+    Streams the IDOC elements of a file holding one IDoc or a packet of many.
+    Each IDOC element is removed from the tree once the caller is done with it,
+    so only one IDoc is kept in memory at a time.
+    """
+    stack = []
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag == "IDOC":
+            yield elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+def iter_packet_documents(xml_path, config, template, plan=None):
+    """Yields one BYDM document per IDoc of the packet (packet mode 'split')."""
+    count = 0
+    for count, idoc in enumerate(iter_idocs(xml_path), 1):
+        yield map_idoc(idoc, config, new_document(template), plan)
+    logger.info(f"{count} IDocs successfully parsed from {xml_path}")
+
+def parse_packet(xml_path, config, template, plan=None):
+    """
+    Maps every IDoc of the packet into one BYDM message with one location[] entry
+    per IDoc (packet mode 'merge'). The first IDoc provides the header, unmapped
+    segments of all IDocs are collected.
+    """
+    try:
+        message = new_document(template)
+        location_seed = compile_template((message.get("location") or [{}])[0])
+        unmapped_summary = {}
+        unmapped_segments = []
+        count = 0
+        for count, idoc in enumerate(iter_idocs(xml_path), 1):
+            if count == 1:
+                output_json = map_idoc(idoc, config, message, plan)
+                message["location"] = message.get("location") or []
+            else:
+                output_json = map_idoc(idoc, config, {"location": [location_seed()]}, plan)
+                message["location"].extend(output_json["location"])
+            unmapped_segments.extend(output_json["unmappedSegments"])
+            for seg_name, seg_count in output_json["unmappedSummary"].items():
+                unmapped_summary[seg_name] = unmapped_summary.get(seg_name, 0) + seg_count
+        message["unmappedSegments"] = unmapped_segments
+        message["unmappedSummary"] = unmapped_summary
+        message["mappingUsage"] = mapping_usage
+        logger.info(f"{count} IDocs successfully parsed from {xml_path}")
+        return message
+    except Exception as e:
+        logger.error(f"Error parsing IDoc packet: {e}")
+        raise
+
 # ---------------------------
 # Schema Validation
 # ---------------------------
+# Compiled validators by schema path; each schema is loaded and compiled once per run
+schema_validators = {}
+
+def compile_schema(schema):
+    """
+    Compiles a JSON Schema into a function that raises ValidationError for an
+    invalid document. The schema itself is checked once, here, instead of on
+    every validation; fastjsonschema generates code for it when installed.
+    """
+    if fastjsonschema is not None:
+        check = fastjsonschema.compile(schema)
+
+        def validate_fast(instance):
+            try:
+                check(instance)
+            except fastjsonschema.JsonSchemaValueException as e:
+                raise ValidationError(e.message) from e
+        return validate_fast
+    validator_class = validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema).validate
+
+def get_schema_validator(schema_path):
+    """Returns the compiled validator of a schema file, None if the file doesn't exist."""
+    key = str(schema_path)
+    if key not in schema_validators:
+        if Path(schema_path).exists():
+            schema_validators[key] = compile_schema(load_json(schema_path))
+        else:
+            logger.warning(f"Schema {schema_path} not found, output is not validated")
+            schema_validators[key] = None
+    return schema_validators[key]
+
 def validate_schema(output_json, schema_path):
-    schema = load_json(schema_path)
+    validator = get_schema_validator(schema_path)
+    if validator is None:
+        return
     try:
-        validate(instance=output_json, schema=schema)
+        validator(output_json)
         logger.info("Output JSON is valid against the schema.")
     except ValidationError as ve:
         logger.error(f"Schema validation error: {ve}")
@@ -255,7 +548,22 @@ def validate_schema(output_json, schema_path):
 # Main Execution
 # ---------------------------
 if __name__ == "__main__":
-    idoc_xml_path = base_path / "source" / "Cust Locations IDOC.xml"
+    parser = argparse.ArgumentParser(description="IDoc to BYDM JSON conversion")
+    parser.add_argument("--source", default=str(base_path / "source" / "Cust Locations IDOC.xml"),
+                        help="IDoc XML file (one IDoc or a packet of many)")
+    parser.add_argument("--packet-mode", choices=["merge", "split"],
+                        help="merge: one message with one location per IDoc, split: one output file per IDoc")
+    parser.add_argument("--compiled", action="store_true",
+                        help="compile the mapping into a dispatch table once (fast, for load-test volumes)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="with --compiled, log every mapped value at DEBUG level")
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+        file_handler.setLevel(logging.DEBUG)
+
+    idoc_xml_path = Path(args.source)
     config_json_path = base_path / "config_file" / "Location_mapping.json"
     template_json_path = base_path / "config_file" / "Location_Template.json"
     bydm_json_path = base_path / "output" / "BYDM_Format.json"
@@ -267,8 +575,25 @@ if __name__ == "__main__":
     template = load_json(template_json_path)
     if "location" not in template or not template["location"]:
         template["location"] = [{}]
+    plan = compile_mappings(config, args.verbose) if args.compiled else None
+    template = compile_template(template)
+
+    if args.packet_mode == "split":
+        written = 0
+        for index, bydm_json in enumerate(iter_packet_documents(idoc_xml_path, config, template, plan), 1):
+            validate_schema(bydm_json, schema_json_path)
+            output_path = bydm_json_path.with_name(f"{bydm_json_path.stem}_{index:05d}.json")
+            with open(output_path, "w", encoding="utf-8") as json_file:
+                json.dump(bydm_json, json_file, indent=4)
+            written = index
+        logger.info(f"{written} BYDM JSON files generated in {bydm_json_path.parent}")
+        print(f"{written} BYDM JSON files generated in: {bydm_json_path.parent}")
+        sys.exit(0)
 
-    bydm_json = parse_idoc(idoc_xml_path, config, template)
+    if args.packet_mode == "merge":
+        bydm_json = parse_packet(idoc_xml_path, config, template, plan)
+    else:
+        bydm_json = parse_idoc(idoc_xml_path, config, template, plan)
     run_plugins(bydm_json, config['mappings'])
 
     validate_schema(bydm_json, schema_json_path)
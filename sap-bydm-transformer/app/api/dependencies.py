@@ -1,28 +1,82 @@
-from fastapi import Depends
+from fastapi import Depends, Request
 from typing import Annotated
 
 from app.services.storage_service import StorageService
+from app.services.async_storage_service import AsyncStorageService
 from app.services.transform_service import TransformService
+from app.services.job_service import JobService
 
-def get_storage_service() -> StorageService:
+def get_storage_service(request: Request) -> StorageService:
     """
-    Dependency to get an instance of the StorageService.
+    Dependency to get the application-wide StorageService.
     
+    The instance is created by the startup hook and shared across requests,
+    so its connection pool and its mapping and template cache survive
+    between them.
+    
+    Args:
+        request: Incoming request
+        
     Returns:
         StorageService instance
     """
-    return StorageService()
+    app_state = request.app.state
+    if getattr(app_state, "storage_service", None) is None:
+        app_state.storage_service = StorageService()
+    return app_state.storage_service
 
-def get_transform_service(
+def get_async_storage_service(
+    request: Request,
     storage_service: Annotated[StorageService, Depends(get_storage_service)]
+) -> AsyncStorageService:
+    """
+    Dependency to get the application-wide AsyncStorageService.
+    
+    Args:
+        request: Incoming request
+        storage_service: Storage service instance
+        
+    Returns:
+        AsyncStorageService instance
+    """
+    app_state = request.app.state
+    if getattr(app_state, "async_storage_service", None) is None:
+        app_state.async_storage_service = AsyncStorageService(storage_service)
+    return app_state.async_storage_service
+
+def get_transform_service(
+    request: Request,
+    storage_service: Annotated[StorageService, Depends(get_storage_service)],
+    async_storage_service: Annotated[AsyncStorageService, Depends(get_async_storage_service)]
 ) -> TransformService:
     """
     Dependency to get an instance of the TransformService.
     
     Args:
+        request: Incoming request
         storage_service: Storage service instance
+        async_storage_service: Awaitable storage facade instance
         
     Returns:
         TransformService instance
     """
-    return TransformService(storage_service)
\ No newline at end of file
+    return TransformService(
+        storage_service, async_storage_service,
+        dedup_index=getattr(request.app.state, "dedup_index", None),
+        transform_pool=getattr(request.app.state, "transform_pool", None),
+        log_sink=getattr(request.app.state, "log_sink", None)
+    )
+
+def get_job_service(request: Request) -> JobService:
+    """
+    Dependency to get the application-wide JobService.
+    
+    The job service and its workers are started by the startup hook.
+    
+    Args:
+        request: Incoming request
+        
+    Returns:
+        JobService instance
+    """
+    return request.app.state.job_service
\ No newline at end of file
@@ -2,21 +2,26 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Dict, Any
 
 from app.core.config import settings
-from app.services.storage_service import StorageService
-from app.api.dependencies import get_storage_service
+from app.services.async_storage_service import AsyncStorageService
+from app.services.batch_pipeline import SOURCE_SUFFIXES
+from app.services.plan_store import VERSIONS_SUFFIX
+from app.api.dependencies import get_async_storage_service
 
 router = APIRouter()
 
 @router.get("/mappings", response_model=List[str])
 async def list_mappings(
-    storage_service: StorageService = Depends(get_storage_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service)
 ):
     """
     List all available mapping configurations.
     """
     try:
-        mapping_files = storage_service.list_files(settings.MAPPINGS_FOLDER)
-        return [f for f in mapping_files if f.endswith('.json')]
+        mapping_files = await storage_service.list_files(settings.MAPPINGS_FOLDER)
+        return [
+            f for f in mapping_files
+            if f.endswith('.json') and f"{VERSIONS_SUFFIX}/" not in f
+        ]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -25,13 +30,13 @@ async def list_mappings(
 
 @router.get("/templates", response_model=List[str])
 async def list_templates(
-    storage_service: StorageService = Depends(get_storage_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service)
 ):
     """
     List all available BYDM templates.
     """
     try:
-        template_files = storage_service.list_files(settings.TEMPLATE_FOLDER)
+        template_files = await storage_service.list_files(settings.TEMPLATE_FOLDER)
         return [f for f in template_files if f.endswith('.json')]
     except Exception as e:
         raise HTTPException(
@@ -41,14 +46,14 @@ async def list_templates(
 
 @router.get("/sources", response_model=List[str])
 async def list_sources(
-    storage_service: StorageService = Depends(get_storage_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service)
 ):
     """
-    List all available source XML files.
+    List all available source XML files (plain or compressed).
     """
     try:
-        source_files = storage_service.list_files(settings.SOURCE_FOLDER)
-        return [f for f in source_files if f.endswith('.xml')]
+        source_files = await storage_service.list_files(settings.SOURCE_FOLDER)
+        return [f for f in source_files if f.endswith(SOURCE_SUFFIXES)]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -58,7 +63,7 @@ async def list_sources(
 @router.get("/mapping/{mapping_file}", response_model=Dict[str, Any])
 async def get_mapping(
     mapping_file: str,
-    storage_service: StorageService = Depends(get_storage_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service)
 ):
     """
     Get a specific mapping configuration.
@@ -74,9 +79,18 @@ async def get_mapping(
         if not mapping_path.endswith('.json'):
             mapping_path += '.json'
             
-        return storage_service.load_json(mapping_path)
+        return await storage_service.load_cached_json(mapping_path)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Mapping file not found or invalid: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/cache/stats", response_model=Dict[str, Any])
+async def get_cache_stats(
+    storage_service: AsyncStorageService = Depends(get_async_storage_service)
+):
+    """
+    Get hit/miss counters of the mapping and template cache.
+    """
+    return storage_service.cache_stats()
\ No newline at end of file
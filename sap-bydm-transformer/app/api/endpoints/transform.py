@@ -1,138 +1,325 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, File, UploadFile, status
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, File, Request, Response, UploadFile, status
+from datetime import datetime
+from pathlib import Path
+from typing import Literal, Optional
+import os
+import shutil
+import tempfile
 import uuid
 
 from app.core.config import settings
-from app.services.storage_service import StorageService
+from app.services.async_storage_service import AsyncStorageService
+from app.services.batch_pipeline import SOURCE_SUFFIXES
+from app.services.columnar_export import parquet_available
 from app.services.transform_service import TransformService
-from app.schemas.request import TransformRequest, BatchTransformRequest, UploadMappingRequest
-from app.schemas.response import TransformResponse, BatchTransformResponse, MappingResponse
-from app.api.dependencies import get_storage_service, get_transform_service
-from app.utils.mapping_parser import load_mapping_from_excel, convert_mapping_to_json
+from app.services.job_service import JobService, JobQueueFullError
+from app.services.mapping_service import MappingService, MappingValidationError, mapping_path_for
+from app.services.plan_store import PlanStore
+from app.utils.compression import DecompressedSizeError
+from app.utils.schema_validator import SchemaValidationError
+from app.schemas.request import TransformRequest, BatchTransformRequest
+from app.schemas.response import TransformResponse, BatchTransformResponse, MappingResponse, JobStatusResponse
+from app.api.dependencies import get_async_storage_service, get_transform_service, get_job_service
 
 router = APIRouter()
 
+async def _pin_config_path(storage_service: AsyncStorageService, config_path: str) -> str:
+    """
+    Pin a "path@latest" mapping reference to the version current at submission.
+    
+    Args:
+        storage_service: Awaitable storage facade
+        config_path: Mapping path, "path@version" or "path@latest"
+        
+    Returns:
+        Mapping reference the job runs with
+    """
+    try:
+        return await storage_service.run(PlanStore(storage_service.storage_service).resolve, config_path)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
 @router.post("/file", response_model=TransformResponse, status_code=status.HTTP_202_ACCEPTED)
 async def transform_file(
     request: TransformRequest,
-    background_tasks: BackgroundTasks,
-    storage_service: StorageService = Depends(get_storage_service),
-    transform_service: TransformService = Depends(get_transform_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service),
+    job_service: JobService = Depends(get_job_service)
 ):
     """
     Transform a single XML file to BYDM JSON format.
     
-    The transformation is executed as a background task.
+    The transformation is queued as a job; poll /jobs/{job_id} for its result.
     """
     try:
         # Check if source file exists
-        files = storage_service.list_files(request.source_file)
-        if not request.source_file in files:
+        if not await storage_service.file_exists(request.source_file):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Source file {request.source_file} not found"
             )
         
-        # Generate a job ID
-        job_id = f"job-{uuid.uuid4()}"
-        
-        # Use background task for processing
-        background_tasks.add_task(
-            transform_service.process_file,
-            request.source_file,
-            request.config_path,
-            request.template_path
-        )
+        # Queue the job with the mapping version of this moment
+        params = request.model_dump()
+        params["config_path"] = await _pin_config_path(storage_service, request.config_path)
+        job_id = await job_service.submit("transform_file", params)
         
         return {
             "status": "accepted",
-            "message": f"Transformation of {request.source_file} started",
+            "message": f"Transformation of {request.source_file} queued",
             "job_id": job_id
         }
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to start transformation: {str(e)}"
         )
 
+async def _read_payload(request: Request) -> bytes:
+    """
+    Read a request body, streamed or not, up to INLINE_MAX_BYTES.
+    
+    A compressed body is limited again once decompressed (see
+    TransformService.transform_inline).
+    
+    Args:
+        request: Incoming request
+        
+    Returns:
+        Body content
+    """
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.INLINE_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Payload exceeds {settings.INLINE_MAX_BYTES} bytes, upload it and use /transform/file"
+            )
+        chunks.append(chunk)
+    if not size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty payload")
+    return b"".join(chunks)
+
+@router.post("/inline", response_class=Response)
+async def transform_inline(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    config_path: str,
+    template_path: str,
+    packet_mode: Optional[Literal["merge", "split"]] = None,
+    schema_path: Optional[str] = None,
+    persist: bool = False,
+    transform_service: TransformService = Depends(get_transform_service)
+):
+    """
+    Transform an IDoc XML posted as the request body and return the BYDM JSON.
+    
+    Nothing goes through storage on the request path: the mapping plan
+    (config_path, "path@version" or "path@latest"), template and optional
+    schema come from the cache. The body may be sent chunked and gzip or
+    zstd compressed (Content-Encoding); it is limited to INLINE_MAX_BYTES
+    both as sent and decompressed. With persist=true the output is
+    saved after the response was sent; its path is returned in the
+    X-Output-Path header.
+    """
+    xml = await _read_payload(request)
+    try:
+        documents, body = await transform_service.transform_inline(
+            xml, config_path, template_path, packet_mode, schema_path,
+            content_encoding=request.headers.get("content-encoding")
+        )
+    except DecompressedSizeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Payload decompresses to more than {settings.INLINE_MAX_BYTES} bytes, "
+                   f"upload it and use /transform/file"
+        )
+    except SchemaValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except (ValueError, SyntaxError) as e:
+        # Unknown packet mode or mapping version, malformed XML
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to transform payload: {str(e)}"
+        )
+    
+    headers = {}
+    if persist:
+        output_id = uuid.uuid4().hex
+        headers["X-Output-Path"] = transform_service.inline_output_path(output_id, packet_mode)
+        background_tasks.add_task(transform_service.persist_inline, documents, output_id, packet_mode)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.post("/batch", response_model=BatchTransformResponse, status_code=status.HTTP_202_ACCEPTED)
 async def batch_transform(
     request: BatchTransformRequest,
-    background_tasks: BackgroundTasks,
-    storage_service: StorageService = Depends(get_storage_service),
-    transform_service: TransformService = Depends(get_transform_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service),
+    job_service: JobService = Depends(get_job_service)
 ):
     """
     Transform multiple XML files in batch mode.
     
-    The batch transformation is executed as a background task.
+    The batch transformation is queued as a job; poll /jobs/{job_id} for its results.
     """
     try:
-        # Check if source folder exists and contains files
-        files = storage_service.list_files(request.source_folder)
-        xml_files = [f for f in files if f.endswith('.xml')]
+        if request.export_parquet and not parquet_available():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parquet export is not available, pyarrow is not installed"
+            )
         
-        if not xml_files:
+        # Check if source folder contains files; stops at the first match
+        if not await storage_service.has_files(request.source_folder, SOURCE_SUFFIXES):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No XML files found in {request.source_folder}"
             )
         
-        # Generate a job ID
-        job_id = f"batch-{uuid.uuid4()}"
-        
-        # Use background task for processing
-        background_tasks.add_task(
-            transform_service.batch_process,
-            request.source_folder,
-            request.config_path,
-            request.template_path
-        )
+        # Queue the job with the mapping version of this moment
+        params = request.model_dump()
+        params["config_path"] = await _pin_config_path(storage_service, request.config_path)
+        job_id = await job_service.submit("transform_batch", params, job_id=f"batch-{uuid.uuid4()}")
         
         return {
             "status": "accepted",
-            "message": f"Batch transformation of {len(xml_files)} files in {request.source_folder} started",
+            "message": f"Batch transformation of {request.source_folder} queued",
             "job_id": job_id
         }
+    except HTTPException:
+        raise
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to start batch transformation: {str(e)}"
         )
 
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    job_service: JobService = Depends(get_job_service)
+):
+    """
+    Get the status of a transformation job with per-file results and timings.
+    """
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found"
+        )
+    
+    return {
+        "job_id": job["job_id"],
+        "job_type": job["job_type"],
+        "status": job["status"],
+        "created_at": datetime.fromtimestamp(job["created_at"]),
+        "started_at": datetime.fromtimestamp(job["started_at"]) if job["started_at"] else None,
+        "finished_at": datetime.fromtimestamp(job["finished_at"]) if job["finished_at"] else None,
+        "duration_ms": job["duration_ms"],
+        "error": job["error"],
+        "result": {
+            "results": job["results"],
+            "success_count": job["success_count"],
+            "failure_count": job["failure_count"],
+            "skipped_count": job["skipped_count"],
+            "duplicate_count": job["duplicate_count"]
+        }
+    }
+
+def _upload_size(file: UploadFile) -> int:
+    """Size of an uploaded file; leaves it positioned at the start."""
+    upload = file.file
+    upload.seek(0, os.SEEK_END)
+    size = upload.tell()
+    upload.seek(0)
+    return size
+
+async def _spool_upload(file: UploadFile, storage_service: AsyncStorageService) -> str:
+    """
+    Copy an uploaded file to UPLOAD_SPOOL_DIR in chunks, off the event loop.
+    
+    Only needed when the file must outlive the request, as the upload is
+    removed once the response is sent.
+    
+    Args:
+        file: Uploaded file
+        storage_service: Awaitable storage facade, whose threads do the copy
+        
+    Returns:
+        Spool file path
+    """
+    Path(settings.UPLOAD_SPOOL_DIR).mkdir(parents=True, exist_ok=True)
+    suffix = Path(file.filename or "").suffix
+    fd, spool_path = tempfile.mkstemp(suffix=suffix, prefix="mapping-", dir=settings.UPLOAD_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            await storage_service.run(shutil.copyfileobj, file.file, spool, settings.UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        os.remove(spool_path)
+        raise
+    return spool_path
+
 @router.post("/mapping/upload", response_model=MappingResponse)
 async def upload_mapping(
+    response: Response,
     sheet_name: str = "Data Mapping",
     file: UploadFile = File(...),
-    storage_service: StorageService = Depends(get_storage_service)
+    storage_service: AsyncStorageService = Depends(get_async_storage_service),
+    job_service: JobService = Depends(get_job_service)
 ):
     """
     Upload and process a mapping Excel sheet.
     
     The Excel sheet is parsed and converted to a JSON mapping configuration.
+    The rules are analyzed first; sheets with conflicting or unreachable
+    rules are rejected, otherwise the mapping is saved and its compiled plan
+    published as the latest version.
+    
+    The upload, already spooled to disk by the server once it is large, is
+    parsed in place off the event loop. Workbooks larger than
+    MAPPING_UPLOAD_SYNC_MAX_BYTES are copied to UPLOAD_SPOOL_DIR and
+    imported as a job (202); poll /jobs/{job_id} for the result.
     """
+    spool_path = None
     try:
-        # Read the Excel file
-        contents = await file.read()
-        
-        # Parse the mapping sheet
-        mapping_rules = load_mapping_from_excel(contents, sheet_name)
-        
-        # Convert to structured JSON
-        mapping_json = convert_mapping_to_json(mapping_rules)
+        size = await storage_service.run(_upload_size, file)
         
-        # Save to MinIO
-        file_name = file.filename.replace(' ', '_').replace('.xlsx', '').replace('.xls', '')
-        json_path = f"{settings.MAPPINGS_FOLDER}/{file_name}.json"
-        saved_path = storage_service.save_json(mapping_json, json_path)
+        if size > settings.MAPPING_UPLOAD_SYNC_MAX_BYTES:
+            spool_path = await _spool_upload(file, storage_service)
+            job_id = await job_service.submit("import_mapping", {
+                "workbook_path": spool_path,
+                "file_name": file.filename,
+                "sheet_name": sheet_name
+            })
+            # The job owns the spool file now
+            spool_path = None
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {
+                "status": "accepted",
+                "mapping_file": mapping_path_for(file.filename),
+                "job_id": job_id
+            }
         
-        return {
-            "status": "success",
-            "mapping_file": saved_path,
-            "rule_count": len(mapping_rules)
-        }
+        mapping_service = MappingService(storage_service.storage_service)
+        return await storage_service.run(mapping_service.import_workbook, file.file, file.filename, sheet_name)
+    except MappingValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to process mapping sheet: {str(e)}"
-        )
\ No newline at end of file
+        )
+    finally:
+        if spool_path is not None:
+            os.remove(spool_path)
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,6 +20,28 @@ class Settings(BaseSettings):
     MINIO_SECURE: bool = False
     MINIO_BUCKET: str = "data"
     
+    # MinIO connection pool settings
+    MINIO_MAX_POOL_CONNECTIONS: int = 32
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 60.0
+    MINIO_MAX_RETRIES: int = 3
+    MINIO_RETRY_BACKOFF: float = 0.2
+    MINIO_TCP_KEEPALIVE: bool = True
+    # Threads running blocking MinIO calls for async code (keep <= pool connections)
+    STORAGE_IO_WORKERS: int = 16
+    # Part size of streamed (multipart) uploads; MinIO requires at least 5 MiB
+    UPLOAD_PART_SIZE: int = 8 * 1024 * 1024
+    
+    # Output settings: compact JSON drops indentation (uses orjson when installed)
+    JSON_COMPACT: bool = False
+    # Compression of target files: None, "gzip" or "zstd" (needs zstandard);
+    # .gz/.zst sources are decompressed whatever this is set to
+    TARGET_COMPRESSION: Optional[str] = None
+    COMPRESSION_LEVEL: Optional[int] = None
+    # JSON Schema single file outputs are validated against when a request names none
+    # (compiled once per schema; uses fastjsonschema when installed, jsonschema otherwise)
+    OUTPUT_SCHEMA_PATH: Optional[str] = None
+    
     # File paths
     MAPPINGS_FOLDER: str = Field(default="mappings", alias="MAPPING_FOLDER")  # Added alias
     TEMPLATE_FOLDER: str = "templates"
@@ -30,6 +52,67 @@ class Settings(BaseSettings):
     # Processing settings
     BATCH_SIZE: int = 100
     MAX_WORKERS: int = 4
+    # "process" runs batch transforms in a pool of MAX_WORKERS processes,
+    # "inline" runs them in this process on MAX_WORKERS dedicated threads
+    EXECUTOR_MODE: str = "process"
+    # Start method of the worker processes, "forkserver" or "spawn" ("fork"
+    # would copy the server's threads and connections); spawn where forkserver is unavailable
+    WORKER_START_METHOD: str = "forkserver"
+    
+    # Inline transforms (/transform/inline): largest accepted XML payload
+    INLINE_MAX_BYTES: int = 10 * 1024 * 1024
+    
+    # Batch pipeline settings (listing -> download -> transform -> upload)
+    PIPELINE_DOWNLOAD_WORKERS: int = 8
+    PIPELINE_UPLOAD_WORKERS: int = 8
+    PIPELINE_QUEUE_SIZE: int = 64
+    # Bytes of sources and outputs held by the pipeline at a time; sources of
+    # PIPELINE_STREAM_MIN_BYTES or more are streamed instead of downloaded whole
+    PIPELINE_MAX_BYTES_IN_FLIGHT: int = 256 * 1024 * 1024
+    PIPELINE_STREAM_MIN_BYTES: int = 16 * 1024 * 1024
+    
+    # Bulk batch output (output_mode "bulk"): documents appended as lines to
+    # target/<batch id>/part-NNNNN.jsonl, a part is closed at either bound
+    BULK_PART_MAX_BYTES: int = 64 * 1024 * 1024
+    BULK_PART_MAX_RECORDS: int = 100_000
+    
+    # Parquet export of batch outputs (needs pyarrow): rows per row group and per file
+    PARQUET_ROW_GROUP_ROWS: int = 64 * 1024
+    PARQUET_FILE_MAX_ROWS: int = 1_000_000
+    
+    # Mapping workbook uploads: larger ones are copied to disk in chunks and imported as a job
+    UPLOAD_SPOOL_DIR: str = "data/uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAPPING_UPLOAD_SYNC_MAX_BYTES: int = 5 * 1024 * 1024
+    
+    # Batch log sink: per-file results buffered and written as one gzip JSONL
+    # object per batch (logs/<job id>.jsonl.gz), flushed at either bound or interval;
+    # every flush rewrites the object, which is continued in a new one at either object bound
+    LOG_FLUSH_RECORDS: int = 10_000
+    LOG_FLUSH_BYTES: int = 4 * 1024 * 1024
+    LOG_FLUSH_INTERVAL: float = 10.0
+    LOG_OBJECT_MAX_BYTES: int = 16 * 1024 * 1024
+    LOG_OBJECT_MAX_FLUSHES: int = 8
+    
+    # Job queue settings
+    JOB_DB_PATH: str = "data/jobs.sqlite3"
+    JOB_WORKERS: int = 2
+    JOB_QUEUE_MAX: int = 1000
+    JOB_POLL_INTERVAL: float = 1.0
+    
+    # Index of processed sources for incremental batches
+    MANIFEST_DB_PATH: str = "data/manifest.sqlite3"
+    
+    # Deduplication of resent IDocs by a fingerprint of their business segments
+    DEDUP_ENABLED: bool = False
+    DEDUP_DB_PATH: str = "data/dedup.sqlite3"
+    DEDUP_MAX_ENTRIES: int = 1_000_000
+    DEDUP_EXCLUDE_SEGMENTS: List[str] = ["EDI_DC40"]
+    
+    # Mapping/template cache settings
+    CACHE_MAX_ENTRIES: int = 128
+    CACHE_TTL_SECONDS: float = 3600.0
+    CACHE_REVALIDATE_SECONDS: float = 30.0
     
     model_config = {
         "env_file": ".env",
@@ -1,8 +1,19 @@
+import asyncio
+import uuid
+from datetime import datetime
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings, validate_config
 from app.core.logging_config import setup_logging
+from app.services.storage_service import StorageService, create_http_client
+from app.services.async_storage_service import AsyncStorageService
+from app.services.job_service import JobService
+from app.services.manifest_service import ManifestStore
+from app.services.dedup_service import DedupIndex
+from app.services.log_sink import LogSink
+from app.services.transform_worker import TransformPool
 from app.api.endpoints import transform, config
 
 # Setup logging
@@ -57,7 +68,7 @@ async def root():
 @app.on_event("startup")
 async def startup_event():
     """
-    Validate configuration on startup.
+    Validate configuration and create shared services on startup.
     """
     try:
         validate_config()
@@ -65,6 +76,70 @@ async def startup_event():
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
         raise HTTPException(status_code=500, detail=f"Configuration error: {e}")
+    
+    # One pooled MinIO client for the lifetime of the application
+    app.state.storage_service = StorageService(http_client=create_http_client())
+    app.state.async_storage_service = AsyncStorageService(app.state.storage_service)
+    
+    # Index of processed sources for incremental batches
+    app.state.manifest_store = ManifestStore(settings.MANIFEST_DB_PATH)
+    
+    # Fingerprints of transformed IDocs, for skipping resent ones
+    app.state.dedup_index = DedupIndex(settings.DEDUP_DB_PATH) if settings.DEDUP_ENABLED else None
+    
+    # Worker processes shared by all batch transforms
+    app.state.transform_pool = TransformPool() if settings.EXECUTOR_MODE == "process" else None
+    
+    # One buffered log of single file and inline transformations; the name
+    # is unique per start, so restarts and other instances never overwrite it
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    app.state.log_sink = LogSink(app.state.storage_service, f"transform_{timestamp}_{uuid.uuid4().hex[:8]}")
+    
+    # Durable job queue and its workers
+    app.state.job_service = JobService(
+        app.state.storage_service, app.state.async_storage_service,
+        manifest_store=app.state.manifest_store,
+        dedup_index=app.state.dedup_index,
+        transform_pool=app.state.transform_pool,
+        log_sink=app.state.log_sink
+    )
+    await app.state.job_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Release shared services on shutdown.
+    """
+    job_service = getattr(app.state, "job_service", None)
+    if job_service is not None:
+        await job_service.stop()
+    
+    transform_pool = getattr(app.state, "transform_pool", None)
+    if transform_pool is not None:
+        transform_pool.close()
+    
+    log_sink = getattr(app.state, "log_sink", None)
+    if log_sink is not None:
+        try:
+            await asyncio.to_thread(log_sink.close)
+        except Exception as e:
+            logger.error(f"Failed to write the transformation log: {e}")
+    
+    manifest_store = getattr(app.state, "manifest_store", None)
+    if manifest_store is not None:
+        manifest_store.close()
+    
+    dedup_index = getattr(app.state, "dedup_index", None)
+    if dedup_index is not None:
+        dedup_index.close()
+    
+    async_storage_service = getattr(app.state, "async_storage_service", None)
+    if async_storage_service is not None:
+        async_storage_service.close()
+    
+    storage_service = getattr(app.state, "storage_service", None)
+    if storage_service is not None:
+        storage_service.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,13 +1,27 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, Literal
 
 class TransformRequest(BaseModel):
     """
     Request model for single file transformation.
     """
     source_file: str = Field(..., description="Path to the source XML file")
-    config_path: str = Field(..., description="Path to the mapping configuration file")
+    config_path: str = Field(
+        ...,
+        description="Path to the mapping configuration file, optionally followed by @<version> "
+                    "or @latest to run a published plan version"
+    )
     template_path: str = Field(..., description="Path to the BYDM template file")
+    packet_mode: Optional[Literal["merge", "split"]] = Field(
+        None,
+        description="For files holding many IDocs: 'merge' into one message with one location per IDoc, "
+                    "or 'split' into one output object per IDoc"
+    )
+    schema_path: Optional[str] = Field(
+        None,
+        description="Path to a JSON Schema the output is validated against before it is saved "
+                    "(defaults to the configured output schema)"
+    )
     
     model_config = {
         "json_schema_extra": {
@@ -24,8 +38,31 @@ class BatchTransformRequest(BaseModel):
     Request model for batch file transformation.
     """
     source_folder: str = Field(..., description="Folder containing source XML files")
-    config_path: str = Field(..., description="Path to the mapping configuration file")
+    config_path: str = Field(
+        ...,
+        description="Path to the mapping configuration file, optionally followed by @<version> "
+                    "or @latest to run a published plan version"
+    )
     template_path: str = Field(..., description="Path to the BYDM template file")
+    packet_mode: Optional[Literal["merge", "split"]] = Field(
+        None,
+        description="For files holding many IDocs: 'merge' into one message with one location per IDoc, "
+                    "or 'split' into one output object per IDoc"
+    )
+    incremental: bool = Field(
+        False,
+        description="Skip sources already transformed with the same content, mapping and template"
+    )
+    output_mode: Literal["files", "bulk"] = Field(
+        "files",
+        description="'files' writes one JSON object per source file, 'bulk' appends every document as a line "
+                    "to rolling NDJSON parts in target/<job_id>/ with an index.jsonl of source to part and line"
+    )
+    export_parquet: bool = Field(
+        False,
+        description="Also export every location as a row of Parquet files in target/<job_id>/, "
+                    "one column per mapped target path (needs pyarrow)"
+    )
     
     model_config = {
         "json_schema_extra": {
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 
 class TransformResponse(BaseModel):
@@ -43,14 +44,21 @@ class MappingResponse(BaseModel):
     """
     status: str = Field(..., description="Status of the operation")
     mapping_file: Optional[str] = Field(None, description="Path to the saved mapping file")
+    plan_file: Optional[str] = Field(None, description="Path to the published, precompiled plan")
+    version: Optional[str] = Field(None, description="Published plan version, usable as config_path@version")
     rule_count: Optional[int] = Field(None, description="Number of mapping rules extracted")
+    warnings: List[str] = Field([], description="Analysis findings that did not block the upload")
+    job_id: Optional[str] = Field(None, description="Job importing a large workbook, poll /jobs/{job_id}")
     
     model_config = {
         "json_schema_extra": {
             "example": {
                 "status": "success",
                 "mapping_file": "mappings/Location.json",
-                "rule_count": 25
+                "plan_file": "mappings/Location.versions/3f9c2a71d04b6e58.plan.pkl",
+                "version": "3f9c2a71d04b6e58",
+                "rule_count": 25,
+                "warnings": []
             }
         }
     }
@@ -63,7 +71,10 @@ class TransformResultResponse(BaseModel):
     status: str = Field(..., description="Status of the transformation")
     output_file: Optional[str] = Field(None, description="Path to the output file if successful")
     log_file: Optional[str] = Field(None, description="Path to the log file")
+    line: Optional[int] = Field(None, description="First line of the file's documents in a bulk output part")
+    line_count: Optional[int] = Field(None, description="Number of the file's documents in a bulk output part")
     error: Optional[str] = Field(None, description="Error message if transformation failed")
+    duration_ms: Optional[float] = Field(None, description="Processing time of the file in milliseconds")
     
     model_config = {
         "json_schema_extra": {
@@ -72,7 +83,8 @@ class TransformResultResponse(BaseModel):
                 "status": "success",
                 "output_file": "target/Location_20250504_123456.json",
                 "log_file": "logs/transform_20250504_123456.log",
-                "error": None
+                "error": None,
+                "duration_ms": 12.5
             }
         }
     }
@@ -84,6 +96,8 @@ class BatchResultResponse(BaseModel):
     results: List[TransformResultResponse] = Field(..., description="List of transformation results")
     success_count: int = Field(..., description="Number of successful transformations")
     failure_count: int = Field(..., description="Number of failed transformations")
+    skipped_count: int = Field(0, description="Number of unchanged sources skipped by an incremental batch")
+    duplicate_count: int = Field(0, description="Number of sources holding only already transformed IDocs")
     
     model_config = {
         "json_schema_extra": {
@@ -105,7 +119,54 @@ class BatchResultResponse(BaseModel):
                     }
                 ],
                 "success_count": 1,
-                "failure_count": 1
+                "failure_count": 1,
+                "skipped_count": 0,
+                    "duplicate_count": 0
+            }
+        }
+    }
+
+class JobStatusResponse(BaseModel):
+    """
+    Response model for the status of a transformation job.
+    """
+    job_id: str = Field(..., description="Job identifier")
+    job_type: str = Field(..., description="Type of the job")
+    status: str = Field(..., description="Job status: queued, running, completed or failed")
+    created_at: datetime = Field(..., description="When the job was submitted")
+    started_at: Optional[datetime] = Field(None, description="When a worker started the job")
+    finished_at: Optional[datetime] = Field(None, description="When the job finished")
+    duration_ms: Optional[float] = Field(None, description="Run time of the job so far in milliseconds")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    result: BatchResultResponse = Field(..., description="Per-file results recorded so far")
+    
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "job_id": "batch-2f0c6a8e-6f1b-4b8e-9a57-0d7b8f0f2c11",
+                "job_type": "transform_batch",
+                "status": "completed",
+                "created_at": "2025-05-04T12:34:50",
+                "started_at": "2025-05-04T12:34:51",
+                "finished_at": "2025-05-04T12:34:56",
+                "duration_ms": 5012.3,
+                "error": None,
+                "result": {
+                    "results": [
+                        {
+                            "source_file": "source/Location1.xml",
+                            "status": "success",
+                            "output_file": "target/Location1_20250504_123456.json",
+                            "log_file": "logs/transform_20250504_123456.log",
+                            "error": None,
+                            "duration_ms": 12.5
+                        }
+                    ],
+                    "success_count": 1,
+                    "failure_count": 0,
+                    "skipped_count": 0,
+                    "duplicate_count": 0
+                }
             }
         }
     }
\ No newline at end of file
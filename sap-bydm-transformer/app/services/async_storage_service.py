@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Tuple, TypeVar, Union
+
+from app.core.config import settings
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger("app")
+
+T = TypeVar("T")
+
+class AsyncStorageService:
+    """
+    Awaitable facade over StorageService.
+
+    Blocking MinIO calls run on a bounded thread pool, so the event loop
+    keeps serving other requests while transfers are in flight.
+    """
+
+    def __init__(self, storage_service: StorageService, max_workers: Optional[int] = None):
+        """
+        Initialize with the storage service to wrap.
+
+        Args:
+            storage_service: Service for MinIO interactions
+            max_workers: Size of the I/O thread pool, STORAGE_IO_WORKERS if omitted
+        """
+        self.storage_service = storage_service
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.STORAGE_IO_WORKERS,
+            thread_name_prefix="storage-io"
+        )
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking function on the storage I/O pool.
+
+        Args:
+            func: Function to run
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The function's return value
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        """Wait for pending transfers and stop the I/O pool."""
+        self.executor.shutdown(wait=True)
+
+    async def list_files(self, prefix: str = "") -> List[str]:
+        """List all files with a given prefix (see StorageService.list_files)."""
+        return await self.run(self.storage_service.list_files, prefix)
+
+    async def has_files(self, prefix: str = "", suffix: Union[str, Tuple[str, ...]] = "") -> bool:
+        """Check whether a matching file exists (see StorageService.has_files)."""
+        return await self.run(self.storage_service.has_files, prefix, suffix)
+
+    async def file_exists(self, file_path: str) -> bool:
+        """Check whether a file exists (see StorageService.file_exists)."""
+        return await self.run(self.storage_service.file_exists, file_path)
+
+    async def stat_file(self, file_path: str):
+        """Get object metadata (see StorageService.stat_file)."""
+        return await self.run(self.storage_service.stat_file, file_path)
+
+    async def load_file(self, file_path: str) -> bytes:
+        """Load file content (see StorageService.load_file)."""
+        return await self.run(self.storage_service.load_file, file_path)
+
+    async def load_json(self, file_path: str) -> Dict[str, Any]:
+        """Load and parse a JSON file (see StorageService.load_json)."""
+        return await self.run(self.storage_service.load_json, file_path)
+
+    async def load_cached(self, file_path: str, loader: Callable[[bytes], Any], kind: str = "raw") -> Any:
+        """Load a cached value derived from a file (see StorageService.load_cached)."""
+        return await self.run(self.storage_service.load_cached, file_path, loader, kind)
+
+    async def load_cached_json(self, file_path: str) -> Dict[str, Any]:
+        """Load a cached JSON file (see StorageService.load_cached_json)."""
+        return await self.run(self.storage_service.load_cached_json, file_path)
+
+    async def save_file(self, data: bytes, file_path: str, content_type: str = "application/octet-stream") -> str:
+        """Save binary data (see StorageService.save_file)."""
+        return await self.run(self.storage_service.save_file, data, file_path, content_type)
+
+    async def save_json(self, data: Dict[str, Any], file_path: str) -> str:
+        """Save JSON data (see StorageService.save_json)."""
+        return await self.run(self.storage_service.save_json, data, file_path)
+
+    async def save_log(self, log_content: str) -> str:
+        """Save a log file (see StorageService.save_log)."""
+        return await self.run(self.storage_service.save_log, log_content)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters of the mapping and template cache."""
+        return self.storage_service.cache_stats()
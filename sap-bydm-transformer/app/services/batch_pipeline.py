@@ -0,0 +1,557 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.services import transform_worker
+from app.services.bulk_output import BulkEntry, NdjsonPartWriter
+from app.services.columnar_export import ParquetPartWriter, flatten_document
+from app.services.dedup_service import DedupFilter, DedupIndex
+from app.services.log_sink import LogSink
+from app.services.manifest_service import ManifestStore
+from app.utils.compression import with_compression_suffixes
+from app.utils.json_stream import encode_json
+from app.utils.mapping_compiler import MappingPlan
+from app.utils.template_factory import TemplateFactory
+
+logger = logging.getLogger("app")
+
+# Source files: XML, plain or compressed
+SOURCE_SUFFIXES = with_compression_suffixes(".xml")
+
+
+class ByteBudget:
+    """
+    Bound on the bytes held by the stages of a pipeline.
+
+    Sources acquire their size before they are downloaded and release it
+    once their outputs are stored. An item larger than the whole budget is
+    let through when nothing else is held.
+
+    Bytes can also be marked as buffered: held until a buffer is uploaded,
+    not by an item still moving through the stages. When a waiter is only
+    blocked by buffered bytes, nothing else would release them, so
+    on_stall is called to have the buffer uploaded early.
+    """
+
+    def __init__(self, limit: int, on_stall: Optional[Callable[[], None]] = None):
+        """
+        Initialize the budget.
+
+        Args:
+            limit: Bytes that may be held at a time
+            on_stall: Called (on the event loop, must not block) when all held bytes are buffered
+                and an acquire waits
+        """
+        self.limit = limit
+        self.used = 0
+        self.buffered = 0
+        self.on_stall = on_stall
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, size: int) -> None:
+        """Wait until size bytes fit into the budget, then hold them."""
+        async with self._condition:
+            while not (self.used == 0 or self.used + size <= self.limit):
+                if self.on_stall is not None and self.buffered and self.used <= self.buffered:
+                    self.on_stall()
+                await self._condition.wait()
+            self.used += size
+
+    async def resize(self, held: int, size: int) -> None:
+        """Replace held bytes by their actual size, without waiting (later acquires wait instead)."""
+        async with self._condition:
+            self.used += size - held
+            if size < held:
+                self._condition.notify_all()
+
+    async def release(self, size: int, buffered: bool = False) -> None:
+        """Give held bytes back; buffered if they were marked so by buffer()."""
+        async with self._condition:
+            self.used -= size
+            if buffered:
+                self.buffered -= size
+            self._condition.notify_all()
+
+    async def buffer(self, size: int) -> None:
+        """Mark held bytes as buffered, until release(size, buffered=True)."""
+        async with self._condition:
+            self.buffered += size
+            # Waiters check whether they are stalled by buffered bytes now
+            self._condition.notify_all()
+
+
+class BatchPipeline:
+    """
+    Pipelined batch transformation.
+
+    A listing producer feeds source objects, page by page, into a bounded
+    queue; download workers fetch them, transform workers map them (in a
+    shared TransformPool when EXECUTOR_MODE is "process", on dedicated threads
+    otherwise, never on the storage I/O pool) and upload workers save the
+    outputs. The bounded queues and a budget of PIPELINE_MAX_BYTES_IN_FLIGHT
+    keep memory flat, and the first files are transformed while the listing
+    is still running.
+
+    Sources of PIPELINE_STREAM_MIN_BYTES or more are not downloaded: the
+    transform stage streams them from storage, in a thread of this process,
+    and in "files" output mode uploads each document while it is produced.
+
+    With a manifest store, sources whose ETag was already transformed under
+    the same plan version are skipped during listing, and outputs get
+    deterministic names. With a dedup index, IDocs whose business content
+    was already transformed are dropped before mapping; a file holding only
+    such IDocs is reported as "duplicate" with the earlier output.
+
+    With a bulk writer, documents are appended as lines to rolling NDJSON
+    parts instead of one object per file; a file's result is reported once
+    its part is uploaded, and no per-file log is written.
+
+    With a Parquet writer, documents are also flattened into rows in the
+    transform stage and exported column by column.
+
+    With a log sink, every result is logged as one buffered JSON line
+    instead of one log object per file.
+    """
+
+    def __init__(self, transform_service, plan: MappingPlan, template: TemplateFactory,
+                 packet_mode: Optional[str] = None,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 manifest_store: Optional[ManifestStore] = None, version: Optional[str] = None,
+                 dedup_index: Optional[DedupIndex] = None,
+                 bulk_writer: Optional[NdjsonPartWriter] = None,
+                 parquet_writer: Optional[ParquetPartWriter] = None,
+                 log_sink: Optional[LogSink] = None):
+        """
+        Initialize the pipeline for one batch.
+
+        Args:
+            transform_service: TransformService providing storage access and the transform step
+            plan: Compiled mapping plan
+            template: Compiled BYDM template
+            packet_mode: How files holding many IDocs are handled (see process_file)
+            on_result: Called with each file's result as soon as it is available,
+                on a storage I/O thread
+            manifest_store: Index of processed sources, for incremental batches
+            version: Plan version the manifest entries and fingerprints are keyed by
+            dedup_index: Fingerprints of transformed IDocs
+            bulk_writer: NDJSON part writer for bulk output, None for one object per file
+            parquet_writer: Columnar export of the documents, None for no export
+            log_sink: Buffered log of the results, None for one log object per file
+        """
+        self.transform_service = transform_service
+        self.storage = transform_service.async_storage_service
+        self.plan = plan
+        self.template = template
+        self.packet_mode = packet_mode
+        self.on_result = on_result
+        self.manifest_store = manifest_store
+        self.version = version
+        self.dedup_index = dedup_index
+        self.bulk_writer = bulk_writer
+        self.parquet_writer = parquet_writer
+        self.log_sink = log_sink
+        self.results: List[Dict[str, Any]] = []
+        self.skipped = 0
+        self._stopped = threading.Event()
+        self._budget: Optional[ByteBudget] = None
+        self._bulk_flush: Optional[asyncio.Future] = None
+
+    async def run(self, source_folder: str) -> List[Dict[str, Any]]:
+        """
+        Transform all XML files under a folder.
+
+        Args:
+            source_folder: Folder containing XML files
+
+        Returns:
+            List of processing results
+        """
+        loop = asyncio.get_running_loop()
+        sources = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        downloaded = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        transformed = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        # Lines buffered in a bulk part count against the budget until the part is uploaded
+        self._budget = ByteBudget(
+            settings.PIPELINE_MAX_BYTES_IN_FLIGHT,
+            on_stall=self._flush_bulk_early if self.bulk_writer is not None else None
+        )
+
+        transform_pool = None
+        context_path = None
+        if settings.EXECUTOR_MODE == "process":
+            # The application's pool; a standalone service starts one for the batch
+            transform_pool = self.transform_service.transform_pool or transform_worker.TransformPool()
+            context_path = transform_worker.write_context(transform_worker.BatchContext(
+                self.plan, self.template,
+                self.dedup_index.db_path if self.dedup_index is not None else None,
+                self.parquet_writer.columns if self.parquet_writer is not None else None
+            ))
+            pool = transform_pool
+            # Two tasks per process, so a worker never waits for the next file
+            transform_count = transform_pool.max_workers * 2
+            # Streamed sources need storage access, so they stay in this process
+            stream_pool = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS, thread_name_prefix="batch-stream")
+        else:
+            # CPU-bound work gets its own threads, so downloads and uploads keep overlapping with it
+            pool = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS, thread_name_prefix="batch-transform")
+            stream_pool = pool
+            transform_count = settings.MAX_WORKERS
+
+        # The listing blocks for the whole batch; on its own thread it leaves the storage I/O pool to transfers
+        list_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-list")
+        lister = loop.run_in_executor(list_pool, self._list_sources, source_folder, loop, sources)
+        downloaders = [asyncio.create_task(self._download(sources, downloaded))
+                       for _ in range(settings.PIPELINE_DOWNLOAD_WORKERS)]
+        transformers = [asyncio.create_task(self._transform(downloaded, transformed, pool, stream_pool,
+                                                            context_path))
+                        for _ in range(transform_count)]
+        uploaders = [asyncio.create_task(self._upload(transformed))
+                     for _ in range(settings.PIPELINE_UPLOAD_WORKERS)]
+
+        try:
+            # Shut the stages down in order once their producers are done
+            await lister
+            await self._close_stage(sources, downloaders)
+            await self._close_stage(downloaded, transformers)
+            await self._close_stage(transformed, uploaders)
+            if self.bulk_writer is not None:
+                if self._bulk_flush is not None:
+                    await self._bulk_flush
+                await self._finish_bulk(await self.storage.run(self.bulk_writer.flush))
+                await self.storage.run(self.bulk_writer.write_index)
+            if self.parquet_writer is not None:
+                await self.storage.run(self.parquet_writer.close)
+        finally:
+            self._stopped.set()
+            for task in downloaders + transformers + uploaders:
+                task.cancel()
+            if self._bulk_flush is not None:
+                self._bulk_flush.cancel()
+            # Unblock a lister waiting for queue space
+            while not sources.empty():
+                sources.get_nowait()
+            list_pool.shutdown(wait=False)
+            stream_pool.shutdown(wait=False, cancel_futures=True)
+            if transform_pool is None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            else:
+                if transform_pool is not self.transform_service.transform_pool:
+                    transform_pool.close()
+                # Workers that still hold the file keep reading it, the name goes now
+                os.remove(context_path)
+
+        return self.results
+
+    async def _close_stage(self, queue: asyncio.Queue, workers: List[asyncio.Task]) -> None:
+        """Send one end marker per worker and wait for the workers to finish."""
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    def _list_sources(self, source_folder: str, loop: asyncio.AbstractEventLoop,
+                      sources: asyncio.Queue) -> None:
+        """Producer: feed source objects into the queue while listing (runs in a thread)."""
+        count = 0
+        for obj in self.transform_service.storage_service.iter_objects(source_folder):
+            if self._stopped.is_set():
+                return
+            if not obj.object_name.endswith(SOURCE_SUFFIXES):
+                continue
+            if self.manifest_store is not None and self._is_unchanged(obj):
+                self.skipped += 1
+                continue
+            # Blocks while the queue is full
+            asyncio.run_coroutine_threadsafe(sources.put(obj), loop).result()
+            count += 1
+        logger.info(f"Listed {count} XML files in {source_folder}")
+
+    def _is_unchanged(self, obj) -> bool:
+        """Check whether a source was already transformed in this version."""
+        entry = self.manifest_store.get(obj.object_name, self.version)
+        return entry is not None and entry[0] == obj.etag
+
+    def _output_id(self, obj) -> Optional[str]:
+        """Deterministic output name suffix for incremental batches."""
+        if self.manifest_store is None:
+            return None
+        key = f"{obj.object_name}|{obj.etag}|{self.version}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def _is_streamed(self, obj) -> bool:
+        """Check whether a source is streamed instead of downloaded."""
+        return (obj.size or 0) >= settings.PIPELINE_STREAM_MIN_BYTES
+
+    async def _download(self, sources: asyncio.Queue, downloaded: asyncio.Queue) -> None:
+        """Download worker; streamed sources are passed on without their content."""
+        while True:
+            obj = await sources.get()
+            if obj is None:
+                return
+            streamed = self._is_streamed(obj)
+            charge = 0 if streamed else obj.size or 0
+            await self._budget.acquire(charge)
+            started = time.perf_counter()
+            xml_data = None
+            if not streamed:
+                try:
+                    xml_data = await self.storage.load_file(obj.object_name)
+                except Exception as e:
+                    await self._budget.release(charge)
+                    await self._record_failure(obj.object_name, started, e)
+                    continue
+                # Compressed sources are held decompressed
+                await self._budget.resize(charge, len(xml_data))
+                charge = len(xml_data)
+            await downloaded.put((obj, started, charge, xml_data))
+
+    async def _transform(self, downloaded: asyncio.Queue, transformed: asyncio.Queue,
+                         pool: Union[Executor, transform_worker.TransformPool], stream_pool: Executor,
+                         context_path: Optional[str] = None) -> None:
+        """Transform worker; with a TransformPool, context_path names the batch context file."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await downloaded.get()
+            if item is None:
+                return
+            obj, started, charge, xml_data = item
+            dedup_version = self.version if self.dedup_index is not None else None
+            output_path = None
+            try:
+                if xml_data is None:
+                    outputs, dedup, rows, output_path = await loop.run_in_executor(
+                        stream_pool, self._transform_stream, obj, dedup_version
+                    )
+                elif isinstance(pool, transform_worker.TransformPool):
+                    executor = pool.executor
+                    try:
+                        outputs, dedup, rows = await loop.run_in_executor(
+                            executor, transform_worker.transform_to_json, context_path, xml_data,
+                            self.packet_mode, dedup_version, self.bulk_writer is not None
+                        )
+                    except BrokenProcessPool:
+                        pool.replace_broken(executor)
+                        raise
+                else:
+                    outputs, dedup, rows = await loop.run_in_executor(
+                        pool, self._transform_inline, xml_data, dedup_version
+                    )
+            except Exception as e:
+                await self._budget.release(charge)
+                await self._record_failure(obj.object_name, started, e)
+                continue
+            # The source is dropped now, its outputs are held instead
+            held = self._held_bytes(outputs, charge)
+            await self._budget.resize(charge, held)
+            await transformed.put((obj, started, held, outputs, dedup, rows, output_path))
+
+    @staticmethod
+    def _held_bytes(outputs: Optional[List[Any]], source_bytes: int) -> int:
+        """Size of transformed outputs; the source size estimates outputs not encoded yet."""
+        if outputs is None:
+            return 0
+        if outputs and isinstance(outputs[0], bytes):
+            return sum(len(output) for output in outputs)
+        return source_bytes
+
+    def _transform_inline(self, xml_data: bytes,
+                          dedup_version: Optional[str] = None
+                          ) -> Tuple[List[Any], Optional[DedupFilter], Optional[List[tuple]]]:
+        """Transform one source in this process; outputs are serialized on upload, lines right away."""
+        dedup = DedupFilter(self.dedup_index, dedup_version) if dedup_version is not None else None
+        outputs = list(self.transform_service.transform_documents(
+            xml_data, self.plan, self.template, self.packet_mode, dedup
+        ))
+        rows = None
+        if self.parquet_writer is not None:
+            rows = [
+                row for output in outputs for document in output
+                for row in flatten_document(document, self.parquet_writer.columns)
+            ]
+        if self.bulk_writer is not None:
+            return [encode_json(document, compact=True) for output in outputs for document in output], dedup, rows
+        return outputs, dedup, rows
+
+    def _transform_stream(self, obj, dedup_version: Optional[str] = None
+                          ) -> Tuple[Optional[List[bytes]], Optional[DedupFilter], Optional[List[tuple]], Optional[str]]:
+        """
+        Stream one large source from storage through the transform (runs in a thread).
+
+        Documents are produced one at a time. In "files" output mode each
+        output is serialized while it is uploaded, so neither the source nor
+        all of its documents are held in memory; bulk output gets the lines.
+
+        Returns:
+            Tuple of (lines for bulk output, None once saved; dedup filter;
+            export rows or None; output path, None if not saved yet)
+        """
+        dedup = DedupFilter(self.dedup_index, dedup_version) if dedup_version is not None else None
+        rows = [] if self.parquet_writer is not None else None
+
+        def flattened(outputs: Iterable[List[Any]]) -> Iterator[List[Any]]:
+            for output in outputs:
+                if rows is not None:
+                    for document in output:
+                        rows.extend(flatten_document(document, self.parquet_writer.columns))
+                yield output
+
+        file_path = obj.object_name
+        with self.transform_service.storage_service.open_file(file_path) as xml_stream:
+            outputs = flattened(self.transform_service.transform_documents(
+                xml_stream, self.plan, self.template, self.packet_mode, dedup
+            ))
+            if self.bulk_writer is not None:
+                lines = [encode_json(document, compact=True) for output in outputs for document in output]
+                return lines, dedup, rows, None
+            output_path = self.transform_service._save_outputs(
+                file_path, outputs, self.packet_mode, self._output_id(obj)
+            )
+        return None, dedup, rows, output_path
+
+    async def _upload(self, transformed: asyncio.Queue) -> None:
+        """Upload worker."""
+        while True:
+            item = await transformed.get()
+            if item is None:
+                return
+            obj, started, held, outputs, dedup, rows, output_path = item
+            buffered = False
+            try:
+                buffered = await self._upload_item(obj, started, held, outputs, dedup, rows, output_path)
+            finally:
+                # Buffered lines are released once their part is uploaded (see _finish_bulk)
+                if not buffered:
+                    await self._budget.release(held)
+
+    async def _upload_item(self, obj, started: float, held: int, outputs: Optional[List[Any]],
+                           dedup: Optional[DedupFilter], rows: Optional[List[tuple]],
+                           output_path: Optional[str]) -> bool:
+        """
+        Save the outputs of one source, unless streamed already, and record its result.
+
+        Returns:
+            True if the outputs were buffered by the bulk writer, which then holds their bytes
+        """
+        file_path = obj.object_name
+        if dedup is not None and not dedup.fingerprints and dedup.duplicates:
+            await self._record_duplicate(obj, started, dedup.duplicates[0])
+            return False
+        if rows:
+            try:
+                await self.storage.run(self.parquet_writer.add, file_path, rows)
+            except Exception as e:
+                await self._record_failure(file_path, started, e)
+                return False
+        if self.bulk_writer is not None:
+            try:
+                entries = await self.storage.run(
+                    self.bulk_writer.add, file_path, outputs, (obj, started, dedup, held)
+                )
+            except Exception as e:
+                await self._record_failure(file_path, started, e)
+                return False
+            await self._budget.buffer(held)
+            await self._finish_bulk(entries)
+            return True
+        try:
+            if output_path is None:
+                output_path = await self.storage.run(
+                    self.transform_service._save_outputs, file_path, outputs, self.packet_mode,
+                    self._output_id(obj)
+                )
+            if dedup is not None:
+                await self.storage.run(self.dedup_index.record, dedup.fingerprints, output_path)
+            if self.manifest_store is not None:
+                await self.storage.run(self.manifest_store.record, file_path, self.version, obj.etag, output_path)
+            log_path = None
+            if self.log_sink is None:
+                log_path = await self.storage.save_log(f"Successfully processed {file_path} to {output_path}")
+        except Exception as e:
+            await self._record_failure(file_path, started, e)
+            return
+        result = {"source_file": file_path, "status": "success", "output_file": output_path}
+        if log_path is not None:
+            result["log_file"] = log_path
+        await self._record(result, started)
+        return False
+
+    def _flush_bulk_early(self) -> None:
+        """Upload the bulk part being filled before it is full, when its lines block the budget."""
+        if self._bulk_flush is None or self._bulk_flush.done():
+            self._bulk_flush = asyncio.ensure_future(self._flush_bulk())
+
+    async def _flush_bulk(self) -> None:
+        entries = await self.storage.run(self.bulk_writer.flush)
+        logger.info(f"Uploaded a bulk part of {len(entries)} sources early to free the byte budget")
+        await self._finish_bulk(entries)
+
+    async def _finish_bulk(self, entries: List[BulkEntry]) -> None:
+        """Release the buffered lines of an uploaded bulk output part and record its sources."""
+        for _, (_, _, _, held), _, _ in entries:
+            await self._budget.release(held, buffered=True)
+        for file_path, (obj, started, dedup, _), location, error in entries:
+            if error is not None:
+                await self._record_failure(file_path, started, error)
+                continue
+            part_path = location["part"]
+            try:
+                if dedup is not None:
+                    await self.storage.run(self.dedup_index.record, dedup.fingerprints, part_path)
+                if self.manifest_store is not None:
+                    await self.storage.run(self.manifest_store.record, file_path, self.version, obj.etag, part_path)
+            except Exception as e:
+                await self._record_failure(file_path, started, e)
+                continue
+            await self._record({
+                "source_file": file_path,
+                "status": "success",
+                "output_file": part_path,
+                "line": location["line"],
+                "line_count": location["line_count"]
+            }, started)
+
+    async def _record_duplicate(self, obj, started: float, previous_output: str) -> None:
+        """Record a file whose IDocs were all transformed before."""
+        file_path = obj.object_name
+        logger.info(f"Skipped duplicate {file_path}, previous output {previous_output}")
+        if self.manifest_store is not None:
+            await self.storage.run(self.manifest_store.record, file_path, self.version, obj.etag, previous_output)
+        await self._record({
+            "source_file": file_path,
+            "status": "duplicate",
+            "output_file": previous_output
+        }, started)
+
+    async def _record_failure(self, file_path: str, started: float, error: Exception) -> None:
+        """Log a failed file and record its result."""
+        logger.error(f"Failed to process {file_path}: {error}")
+        result = {
+            "source_file": file_path,
+            "status": "failed",
+            "error": str(error)
+        }
+        if self.log_sink is None:
+            try:
+                result["log_file"] = await self.storage.save_log(f"Error processing {file_path}: {str(error)}")
+            except Exception as e:
+                logger.error(f"Failed to save error log for {file_path}: {e}")
+        await self._record(result, started)
+
+    async def _record(self, result: Dict[str, Any], started: float) -> None:
+        """Add timing to a result, log it to the sink, keep it and report it."""
+        result["duration_ms"] = (time.perf_counter() - started) * 1000
+        if self.log_sink is not None:
+            level = "ERROR" if result["status"] == "failed" else "INFO"
+            try:
+                result["log_file"] = await self.storage.run(self.log_sink.add, result, level)
+            except Exception as e:
+                logger.error(f"Failed to log result of {result['source_file']}: {e}")
+        self.results.append(result)
+        if self.on_result is not None:
+            await self.storage.run(self.on_result, result)
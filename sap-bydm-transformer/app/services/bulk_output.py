@@ -0,0 +1,151 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.storage_service import StorageService
+from app.utils.compression import compression_suffix
+from app.utils.json_stream import encode_json
+
+logger = logging.getLogger("app")
+
+# Output modes of a batch: one object per source file, or rolling NDJSON parts
+OUTPUT_MODES = ("files", "bulk")
+
+# Index of a bulk output folder: one JSON line per source file
+INDEX_FILE = "index.jsonl"
+
+# (source file, caller's token, location in the part or None, error or None)
+BulkEntry = Tuple[str, Any, Optional[Dict[str, Any]], Optional[Exception]]
+
+
+class NdjsonPartWriter:
+    """
+    Rolling NDJSON output of a batch.
+
+    Each document becomes one compact JSON line, appended to
+    <folder>/part-00001.jsonl, part-00002.jsonl, ... A part is uploaded once
+    it would exceed max_bytes or max_records; the documents of one source
+    file always stay together in one part. flush() uploads the last part,
+    write_index() an index with one line per source file: its part, first
+    line, line count and byte offset (in the uncompressed part).
+
+    A source is only durable once its part is uploaded, so add() and flush()
+    return the entries of the parts they uploaded and callers report
+    results from those.
+    """
+
+    def __init__(self, storage_service: StorageService, folder: str,
+                 max_bytes: Optional[int] = None, max_records: Optional[int] = None,
+                 content_encoding: Optional[str] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            storage_service: Service for MinIO interactions
+            folder: Folder of the parts (e.g., target/batch-<id>)
+            max_bytes: Part size bound before compression, BULK_PART_MAX_BYTES if omitted
+            max_records: Part line count bound, BULK_PART_MAX_RECORDS if omitted
+            content_encoding: "gzip" or "zstd" to store parts compressed
+        """
+        self.storage_service = storage_service
+        self.folder = folder.rstrip("/")
+        self.max_bytes = max_bytes or settings.BULK_PART_MAX_BYTES
+        self.max_records = max_records or settings.BULK_PART_MAX_RECORDS
+        self.content_encoding = content_encoding
+        self.suffix = ".jsonl" + compression_suffix(content_encoding)
+        self.index_path = f"{self.folder}/{INDEX_FILE}"
+        self.parts: List[str] = []
+        self._lock = threading.Lock()
+        self._index: List[bytes] = []
+        self._part_number = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lines: List[bytes] = []
+        self._size = 0
+        # (source file, token, first line, line count, byte offset)
+        self._pending: List[Tuple[str, Any, int, int, int]] = []
+
+    def add(self, source_file: str, lines: List[bytes], token: Any = None) -> List[BulkEntry]:
+        """
+        Append the documents of one source file.
+
+        Blocking when a part is full and gets uploaded; call it on the
+        storage I/O pool.
+
+        Args:
+            source_file: Path of the source file, recorded in the index
+            lines: Compact JSON documents without line breaks
+            token: Passed back with the entry once the part is uploaded
+
+        Returns:
+            Entries of the part completed by this call, empty if none was
+        """
+        size = sum(len(line) + 1 for line in lines)
+        with self._lock:
+            full = None
+            if self._pending and (self._size + size > self.max_bytes
+                                  or len(self._lines) + len(lines) > self.max_records):
+                full = self._take_part()
+            self._pending.append((source_file, token, len(self._lines), len(lines), self._size))
+            self._lines.extend(lines)
+            self._size += size
+        return self._write_part(*full) if full else []
+
+    def flush(self) -> List[BulkEntry]:
+        """
+        Upload the part being filled, after the last add().
+
+        Returns:
+            Entries of that part, empty if nothing was buffered
+        """
+        with self._lock:
+            last = self._take_part() if self._pending else None
+        return self._write_part(*last) if last else []
+
+    def write_index(self) -> Optional[str]:
+        """
+        Upload the index of all uploaded parts, after flush().
+
+        Returns:
+            Path to the index, or None if no part was uploaded
+        """
+        with self._lock:
+            if not self.parts:
+                logger.info(f"No parts written to {self.folder}, skipping index")
+                return None
+            index = b"".join(self._index)
+        self.storage_service.save_file(index, self.index_path, content_type="application/x-ndjson")
+        logger.info(f"Wrote {len(self.parts)} parts and index {self.index_path}")
+        return self.index_path
+
+    def _take_part(self) -> Tuple[str, List[bytes], List[Tuple[str, Any, int, int, int]]]:
+        """Number the buffered part and start a new one (called under the lock)."""
+        self._part_number += 1
+        part = (f"{self.folder}/part-{self._part_number:05d}{self.suffix}", self._lines, self._pending)
+        self._reset()
+        return part
+
+    def _write_part(self, part_path: str, lines: List[bytes],
+                    pending: List[Tuple[str, Any, int, int, int]]) -> List[BulkEntry]:
+        """Upload a part outside the lock, so other sources keep appending meanwhile."""
+        try:
+            data = b"\n".join(lines) + b"\n" if lines else b""
+            self.storage_service.save_file(
+                data, part_path, content_type="application/x-ndjson", content_encoding=self.content_encoding
+            )
+        except Exception as e:
+            logger.error(f"Failed to write part {part_path}: {e}")
+            return [(source_file, token, None, e) for source_file, token, _, _, _ in pending]
+
+        entries = []
+        index_lines = []
+        for source_file, token, line, count, offset in pending:
+            location = {"part": part_path, "line": line, "line_count": count, "byte_offset": offset}
+            index_lines.append(encode_json({"source_file": source_file, **location}, compact=True) + b"\n")
+            entries.append((source_file, token, location, None))
+        with self._lock:
+            self.parts.append(part_path)
+            self._index.extend(index_lines)
+        return entries
@@ -0,0 +1,235 @@
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.storage_service import StorageService
+from app.utils.json_stream import encode_json
+from app.utils.mapping_compiler import CompiledSegment, MappingPlan, PathKey
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+logger = logging.getLogger("app")
+
+# Array of the BYDM message holding one entry per location, one row each
+ROW_ARRAY = "location"
+
+# Column holding the source file of each row
+SOURCE_COLUMN = "source_file"
+
+
+class ExportColumn(NamedTuple):
+    """A flattened target path of the mapping."""
+    name: str
+    # True if path is relative to a location[] entry, False if to the message
+    per_row: bool
+    path: Tuple[PathKey, ...]
+
+
+def parquet_available() -> bool:
+    """Return True if pyarrow is installed."""
+    return pyarrow is not None
+
+
+def _iter_target_paths(segment_plan: CompiledSegment) -> Iterator[Tuple[PathKey, ...]]:
+    for field in segment_plan.fields:
+        if field.nested is not None:
+            yield from _iter_target_paths(field.nested)
+        elif field.path:
+            yield field.path
+
+
+def export_columns(plan: MappingPlan) -> Tuple[ExportColumn, ...]:
+    """
+    Derive the export columns from the target paths of a mapping plan.
+
+    Array indices are dropped from the names, so
+    "location.0.basicLocation.address.city" becomes the column
+    "location.basicLocation.address.city", read from every location[] entry.
+    Targets that only differ by an index keep their inner indices in the
+    name (e.g., "location.basicLocation.contact.1.personName").
+
+    Args:
+        plan: Compiled mapping plan
+
+    Returns:
+        Columns in mapping order, each target path once
+    """
+    lookups = []
+    for _, segment_plan in plan.segments:
+        for path in _iter_target_paths(segment_plan):
+            if len(path) > 2 and path[0] == ROW_ARRAY and isinstance(path[1], int):
+                lookup = (True, path[2:])
+            else:
+                lookup = (False, path)
+            if lookup not in lookups:
+                lookups.append(lookup)
+
+    def short_name(per_row: bool, path: Tuple[PathKey, ...]) -> str:
+        keys = [str(key) for key in path if not isinstance(key, int)]
+        return ".".join([ROW_ARRAY] + keys if per_row else keys)
+
+    def full_name(per_row: bool, path: Tuple[PathKey, ...]) -> str:
+        keys = [str(key) for key in path]
+        return ".".join([ROW_ARRAY] + keys if per_row else keys)
+
+    names: Dict[str, int] = {}
+    for per_row, path in lookups:
+        name = short_name(per_row, path)
+        names[name] = names.get(name, 0) + 1
+    return tuple(
+        ExportColumn(
+            short_name(per_row, path) if names[short_name(per_row, path)] == 1 else full_name(per_row, path),
+            per_row, path
+        )
+        for per_row, path in lookups
+    )
+
+
+def _lookup(value: Any, path: Tuple[PathKey, ...]) -> Optional[str]:
+    for key in path:
+        if isinstance(key, int):
+            if not isinstance(value, list) or key >= len(value):
+                return None
+        elif not isinstance(value, dict):
+            return None
+        value = value[key] if isinstance(key, int) else value.get(key)
+        if value is None:
+            return None
+    if isinstance(value, (dict, list)):
+        return encode_json(value, compact=True).decode("utf-8")
+    return str(value)
+
+
+def flatten_document(document: Dict[str, Any], columns: Tuple[ExportColumn, ...]) -> List[Tuple[Optional[str], ...]]:
+    """
+    Flatten one BYDM document into rows.
+
+    Args:
+        document: BYDM document
+        columns: Export columns (see export_columns)
+
+    Returns:
+        One row per location[] entry (one row if there is none), with one
+        text value or None per column; nested values are compact JSON
+    """
+    entries = document.get(ROW_ARRAY)
+    if not isinstance(entries, list) or not entries:
+        entries = [None]
+    shared = [None if column.per_row else _lookup(document, column.path) for column in columns]
+    rows = []
+    for entry in entries:
+        rows.append(tuple(
+            _lookup(entry, column.path) if column.per_row else shared[index]
+            for index, column in enumerate(columns)
+        ))
+    return rows
+
+
+class ParquetPartWriter:
+    """
+    Rolling Parquet export of a batch.
+
+    Rows are buffered column by column and written as one row group per
+    PARQUET_ROW_GROUP_ROWS rows; a file is uploaded as
+    <folder>/locations-00001.parquet, locations-00002.parquet, ... once it
+    holds PARQUET_FILE_MAX_ROWS rows. All columns are strings, as mapped
+    values are normalized to text; a source_file column comes first.
+    """
+
+    def __init__(self, storage_service: StorageService, folder: str, columns: Tuple[ExportColumn, ...],
+                 row_group_rows: Optional[int] = None, file_max_rows: Optional[int] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            storage_service: Service for MinIO interactions
+            folder: Folder of the Parquet files (e.g., target/batch-<id>)
+            columns: Export columns (see export_columns)
+            row_group_rows: Rows per row group, PARQUET_ROW_GROUP_ROWS if omitted
+            file_max_rows: Rows per file, PARQUET_FILE_MAX_ROWS if omitted
+
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        if pyarrow is None:
+            raise ImportError("Parquet export needs pyarrow installed")
+        self.storage_service = storage_service
+        self.folder = folder.rstrip("/")
+        self.columns = columns
+        self.row_group_rows = row_group_rows or settings.PARQUET_ROW_GROUP_ROWS
+        self.file_max_rows = file_max_rows or settings.PARQUET_FILE_MAX_ROWS
+        self.schema = pyarrow.schema(
+            [pyarrow.field(SOURCE_COLUMN, pyarrow.string())]
+            + [pyarrow.field(column.name, pyarrow.string()) for column in columns]
+        )
+        self.files: List[str] = []
+        self._lock = threading.Lock()
+        self._buffer: List[List[Optional[str]]] = [[] for _ in self.schema]
+        self._sink = None
+        self._writer = None
+        self._file_rows = 0
+
+    def add(self, source_file: str, rows: List[Tuple[Optional[str], ...]]) -> None:
+        """
+        Add the rows of one source file.
+
+        Blocking when a row group or file is written; call it on the storage
+        I/O pool.
+
+        Args:
+            source_file: Path of the source file, stored in the source_file column
+            rows: Rows as returned by flatten_document
+        """
+        with self._lock:
+            self._buffer[0].extend([source_file] * len(rows))
+            for row in rows:
+                for values, value in zip(self._buffer[1:], row):
+                    values.append(value)
+            if len(self._buffer[0]) >= self.row_group_rows:
+                self._write_row_group()
+
+    def close(self) -> List[str]:
+        """
+        Write the buffered rows and upload the last file.
+
+        Returns:
+            Paths of all uploaded Parquet files
+        """
+        with self._lock:
+            if self._buffer[0]:
+                self._write_row_group()
+            if self._writer is not None:
+                self._upload_file()
+        logger.info(f"Exported {len(self.files)} Parquet files to {self.folder}")
+        return self.files
+
+    def _write_row_group(self) -> None:
+        """Write the buffered rows as one row group (called under the lock)."""
+        if self._writer is None:
+            self._sink = pyarrow.BufferOutputStream()
+            self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema)
+        batch = pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=pyarrow.string()) for values in self._buffer], schema=self.schema
+        )
+        self._writer.write_batch(batch)
+        self._file_rows += batch.num_rows
+        self._buffer = [[] for _ in self.schema]
+        if self._file_rows >= self.file_max_rows:
+            self._upload_file()
+
+    def _upload_file(self) -> None:
+        """Finish the current file and upload it (called under the lock)."""
+        self._writer.close()
+        file_path = f"{self.folder}/locations-{len(self.files) + 1:05d}.parquet"
+        self.storage_service.save_file(
+            self._sink.getvalue().to_pybytes(), file_path, content_type="application/vnd.apache.parquet"
+        )
+        self.files.append(file_path)
+        self._sink = None
+        self._writer = None
+        self._file_rows = 0
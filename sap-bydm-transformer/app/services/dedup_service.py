@@ -0,0 +1,190 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+Segments = Sequence[Tuple[str, Any]]
+
+
+def fingerprint_segments(segments: Segments, version: str) -> bytes:
+    """
+    Fingerprint the business content of an IDoc under a plan version.
+
+    Control segments (DEDUP_EXCLUDE_SEGMENTS, EDI_DC40 by default) are left
+    out, so a resend that only differs in DOCNUM and control data gets the
+    same fingerprint.
+
+    Args:
+        segments: (segment name, segment dictionary) pairs of one IDoc
+        version: Plan version (mapping, template and output options)
+
+    Returns:
+        16 byte fingerprint
+    """
+    digest = hashlib.blake2b(version.encode("utf-8"), digest_size=16)
+    exclude = settings.DEDUP_EXCLUDE_SEGMENTS
+    for name, segment in segments:
+        if name not in exclude:
+            digest.update(repr((name, segment)).encode("utf-8"))
+    return digest.digest()
+
+
+class DedupIndex:
+    """
+    Bounded SQLite index of IDoc fingerprints and the outputs built from them.
+
+    Holds at most ``max_entries`` fingerprints; the oldest are evicted first.
+    Worker processes open the same database read-only for lookups, only the
+    application process records new fingerprints.
+    """
+
+    # Evict after this many inserts rather than on every insert
+    EVICT_EVERY = 1000
+
+    def __init__(self, db_path: str, max_entries: Optional[int] = None, read_only: bool = False):
+        """
+        Open (and create if needed) the fingerprint database.
+
+        Args:
+            db_path: Path of the SQLite database file
+            max_entries: Maximum number of fingerprints, DEDUP_MAX_ENTRIES if omitted
+            read_only: Open for lookups only (worker processes)
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries or settings.DEDUP_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._inserts = 0
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                fingerprint BLOB NOT NULL UNIQUE,
+                output_file TEXT NOT NULL,
+                seen_at REAL NOT NULL
+            )
+        """)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def lookup(self, fingerprint: bytes) -> Optional[str]:
+        """
+        Find the output built from an already seen IDoc.
+
+        Args:
+            fingerprint: Fingerprint from fingerprint_segments
+
+        Returns:
+            Path of the previous output, or None for new content
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output_file FROM fingerprints WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, fingerprints: Iterable[bytes], output_file: str) -> None:
+        """
+        Record the fingerprints of IDocs transformed into an output.
+
+        Args:
+            fingerprints: Fingerprints of the transformed IDocs
+            output_file: Path of the output they were written to
+        """
+        now = time.time()
+        rows = [(fingerprint, output_file, now) for fingerprint in fingerprints]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints (fingerprint, output_file, seen_at) VALUES (?, ?, ?)", rows
+            )
+            self._conn.execute("COMMIT")
+            self._inserts += len(rows)
+            if self._inserts >= self.EVICT_EVERY:
+                self._inserts = 0
+                self._conn.execute(
+                    "DELETE FROM fingerprints WHERE rowid <= (SELECT MAX(rowid) FROM fingerprints) - ?",
+                    (self.max_entries,)
+                )
+
+
+class DedupFilter:
+    """
+    Drops duplicate IDocs of one source file before they are mapped.
+
+    Collects the fingerprints of the IDocs that pass (to be recorded once the
+    output is saved) and the previous outputs of the ones that were dropped.
+    Only these two lists travel back from a worker process.
+    """
+
+    def __init__(self, index: Optional[DedupIndex], version: str):
+        """
+        Initialize the filter for one source file.
+
+        Args:
+            index: Fingerprint index used for lookups
+            version: Plan version the fingerprints are computed under
+        """
+        self.index = index
+        self.version = version
+        self.fingerprints: List[bytes] = []
+        self.duplicates: List[str] = []
+        self._seen = set()
+
+    def __getstate__(self):
+        # The index connection stays in the process that owns it
+        return {"version": self.version, "fingerprints": self.fingerprints, "duplicates": self.duplicates}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.index = None
+        self._seen = set(self.fingerprints)
+
+    def is_duplicate(self, segments: Segments) -> bool:
+        """
+        Check one IDoc, remembering its fingerprint if it is new.
+
+        Args:
+            segments: (segment name, segment dictionary) pairs of the IDoc
+
+        Returns:
+            True if the IDoc was already transformed (here or earlier)
+        """
+        fingerprint = fingerprint_segments(segments, self.version)
+        if fingerprint in self._seen:
+            return True
+        previous = self.index.lookup(fingerprint) if self.index is not None else None
+        if previous is not None:
+            self.duplicates.append(previous)
+            return True
+        self._seen.add(fingerprint)
+        self.fingerprints.append(fingerprint)
+        return False
+
+    def filter(self, idocs: Iterable[Segments]) -> Iterator[Segments]:
+        """
+        Yield only the IDocs that are not duplicates.
+
+        Args:
+            idocs: Segment lists, one per IDoc
+
+        Yields:
+            Segment lists of new IDocs
+        """
+        for segments in idocs:
+            if not self.is_duplicate(segments):
+                yield segments
@@ -0,0 +1,431 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.storage_service import StorageService
+from app.services.async_storage_service import AsyncStorageService
+from app.services.dedup_service import DedupIndex
+from app.services.log_sink import LogSink
+from app.services.manifest_service import ManifestStore
+from app.services.transform_worker import TransformPool
+
+logger = logging.getLogger("app")
+
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Longest wait between attempts when the job database cannot be read
+CLAIM_RETRY_MAX_DELAY = 30.0
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while JOB_QUEUE_MAX jobs are waiting."""
+
+
+class JobStore:
+    """
+    SQLite persistence for jobs and their per-file results.
+
+    Statements are short and run on the caller's thread behind a lock;
+    JobService calls them from worker threads, never on the event loop. The
+    database runs in WAL mode so commits stay cheap.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Open (and create if needed) the job database.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT,
+                skipped_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS job_results (
+                job_id TEXT NOT NULL,
+                source_file TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output_file TEXT,
+                log_file TEXT,
+                error TEXT,
+                duration_ms REAL,
+                line INTEGER,
+                line_count INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_job_results_job ON job_results (job_id);
+        """)
+        # Databases created before skipped_count existed
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "skipped_count" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN skipped_count INTEGER NOT NULL DEFAULT 0")
+        # Databases created before bulk output recorded line locations
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(job_results)")}
+        if "line" not in columns:
+            self._conn.execute("ALTER TABLE job_results ADD COLUMN line INTEGER")
+            self._conn.execute("ALTER TABLE job_results ADD COLUMN line_count INTEGER")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def add_job(self, job_id: str, job_type: str, params: Dict[str, Any]) -> None:
+        """Insert a new queued job."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, job_type, status, params, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, job_type, json.dumps(params), time.time())
+            )
+
+    def count_queued(self) -> int:
+        """Number of jobs waiting for a worker."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def claim_next(self) -> Optional[sqlite3.Row]:
+        """
+        Mark the oldest queued job as running and return it.
+
+        Returns:
+            The claimed job row, or None if the queue is empty
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?",
+                (time.time(), row["job_id"])
+            )
+            return row
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """Record the final status of a job."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?",
+                (status, time.time(), error, job_id)
+            )
+
+    def set_skipped(self, job_id: str, count: int) -> None:
+        """Record how many unchanged sources an incremental batch skipped."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET skipped_count = ? WHERE job_id = ?", (count, job_id))
+
+    def requeue_running(self) -> int:
+        """
+        Put jobs interrupted by a restart back into the queue.
+
+        Returns:
+            Number of requeued jobs
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_results WHERE job_id IN (SELECT job_id FROM jobs WHERE status = 'running')"
+            )
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+            )
+            return cursor.rowcount
+
+    def add_result(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Record the result of one processed file."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_results "
+                "(job_id, source_file, status, output_file, log_file, error, duration_ms, line, line_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    result["source_file"],
+                    result["status"],
+                    result.get("output_file"),
+                    result.get("log_file"),
+                    result.get("error"),
+                    result.get("duration_ms"),
+                    result.get("line"),
+                    result.get("line_count")
+                )
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job with its per-file results.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            Job dictionary, or None if unknown
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            results = self._conn.execute(
+                "SELECT source_file, status, output_file, log_file, error, duration_ms, line, line_count "
+                "FROM job_results WHERE job_id = ? ORDER BY rowid",
+                (job_id,)
+            ).fetchall()
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["results"] = [dict(result) for result in results]
+        return job
+
+
+class JobService:
+    """
+    Durable job queue with a bounded pool of asyncio workers.
+
+    Jobs are persisted in SQLite before they are acknowledged, at most
+    JOB_WORKERS of them run at a time, and jobs interrupted by a restart are
+    queued again on startup.
+    """
+
+    def __init__(self, storage_service: StorageService, async_storage_service: AsyncStorageService,
+                 store: Optional[JobStore] = None, manifest_store: Optional[ManifestStore] = None,
+                 dedup_index: Optional[DedupIndex] = None, transform_pool: Optional[TransformPool] = None,
+                 log_sink: Optional[LogSink] = None):
+        """
+        Initialize the job service.
+
+        Args:
+            storage_service: Service for MinIO interactions
+            async_storage_service: Awaitable facade over storage_service
+            store: Job persistence, opened at JOB_DB_PATH if omitted
+            manifest_store: Index of processed sources for incremental batches
+            dedup_index: Fingerprints of transformed IDocs, when deduplication is enabled
+            transform_pool: Worker processes for batch transforms, in EXECUTOR_MODE "process"
+            log_sink: The application's log of single file transformations
+        """
+        self.storage_service = storage_service
+        self.async_storage_service = async_storage_service
+        self.store = store or JobStore(settings.JOB_DB_PATH)
+        self.manifest_store = manifest_store
+        self.dedup_index = dedup_index
+        self.transform_pool = transform_pool
+        self.log_sink = log_sink
+        self.handlers: Dict[str, JobHandler] = {
+            "transform_file": self._run_transform_file,
+            "transform_batch": self._run_transform_batch,
+            "import_mapping": self._run_import_mapping,
+        }
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+
+    def register_handler(self, job_type: str, handler: JobHandler) -> None:
+        """
+        Register the coroutine function that runs jobs of a type.
+
+        Args:
+            job_type: Job type name
+            handler: Coroutine function called with (job_id, params)
+        """
+        self.handlers[job_type] = handler
+
+    async def start(self) -> None:
+        """Requeue interrupted jobs and start JOB_WORKERS workers."""
+        requeued = await asyncio.to_thread(self.store.requeue_running)
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs")
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker(index)) for index in range(settings.JOB_WORKERS)
+        ]
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs are requeued on the next start."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.store.close()
+
+    async def submit(self, job_type: str, params: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        """
+        Persist a new job and wake up a worker.
+
+        The database is written on a worker thread, off the event loop.
+
+        Args:
+            job_type: Job type name (see handlers)
+            params: JSON-serializable job parameters
+            job_id: Job identifier, generated if omitted
+
+        Returns:
+            The job identifier
+
+        Raises:
+            JobQueueFullError: If JOB_QUEUE_MAX jobs are already waiting
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job_id = job_id or f"job-{uuid.uuid4()}"
+        await asyncio.to_thread(self._enqueue, job_id, job_type, params)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _enqueue(self, job_id: str, job_type: str, params: Dict[str, Any]) -> None:
+        """Insert a queued job unless the queue is full (runs in a thread)."""
+        if self.store.count_queued() >= settings.JOB_QUEUE_MAX:
+            raise JobQueueFullError(f"Job queue is full ({settings.JOB_QUEUE_MAX} jobs waiting)")
+        self.store.add_job(job_id, job_type, params)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the status of a job with its per-file results and timings.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            Job dictionary, or None if unknown
+        """
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None:
+            return None
+        if job["started_at"] is not None:
+            end = job["finished_at"] or time.time()
+            job["duration_ms"] = (end - job["started_at"]) * 1000
+        else:
+            job["duration_ms"] = None
+        job["success_count"] = sum(1 for result in job["results"] if result["status"] == "success")
+        job["failure_count"] = sum(1 for result in job["results"] if result["status"] == "failed")
+        job["duplicate_count"] = sum(1 for result in job["results"] if result["status"] == "duplicate")
+        return job
+
+    async def _worker(self, index: int) -> None:
+        """Claim and run queued jobs until cancelled."""
+        failures = 0
+        while True:
+            try:
+                row = await asyncio.to_thread(self.store.claim_next)
+            except Exception as e:
+                # A locked or unreadable database must not stop the worker for good
+                failures += 1
+                delay = min(settings.JOB_POLL_INTERVAL * 2 ** failures, CLAIM_RETRY_MAX_DELAY)
+                logger.error(f"Worker {index} failed to claim a job, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id = row["job_id"]
+            logger.info(f"Worker {index} running {row['job_type']} job {job_id}")
+            try:
+                await self.handlers[row["job_type"]](job_id, json.loads(row["params"]))
+                await asyncio.to_thread(self.store.finish_job, job_id, "completed")
+            except asyncio.CancelledError:
+                # Left as 'running', requeued on the next start
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                try:
+                    await asyncio.to_thread(self.store.finish_job, job_id, "failed", str(e))
+                except Exception as store_error:
+                    # Left as 'running', requeued on the next start
+                    logger.error(f"Failed to record the failure of job {job_id}: {store_error}")
+
+    def _transform_service(self):
+        """Create a TransformService sharing the application's storage services."""
+        from app.services.transform_service import TransformService
+        return TransformService(
+            self.storage_service, self.async_storage_service, self.manifest_store, self.dedup_index,
+            self.transform_pool, self.log_sink
+        )
+
+    async def _run_transform_file(self, job_id: str, params: Dict[str, Any]) -> None:
+        """Run a single file transformation job."""
+        started = time.perf_counter()
+        result = {"source_file": params["source_file"]}
+        try:
+            output_path, log_path = await self._transform_service().process_file(
+                params["source_file"],
+                params["config_path"],
+                params["template_path"],
+                params.get("packet_mode"),
+                params.get("schema_path")
+            )
+            result.update(status="success", output_file=output_path, log_file=log_path)
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            raise
+        finally:
+            # A cancelled job records nothing and runs again after a restart
+            if "status" in result:
+                result["duration_ms"] = (time.perf_counter() - started) * 1000
+                await asyncio.to_thread(self.store.add_result, job_id, result)
+
+    async def _run_transform_batch(self, job_id: str, params: Dict[str, Any]) -> None:
+        """Run a batch transformation job, recording each file's result as it completes."""
+        # The callbacks run on storage I/O threads, so the inserts stay off the event loop
+        await self._transform_service().batch_process(
+            params["source_folder"],
+            params["config_path"],
+            params["template_path"],
+            params.get("packet_mode"),
+            on_result=lambda result: self.store.add_result(job_id, result),
+            incremental=params.get("incremental", False),
+            on_skipped=lambda count: self.store.set_skipped(job_id, count),
+            output_mode=params.get("output_mode", "files"),
+            batch_id=job_id,
+            export_parquet=params.get("export_parquet", False)
+        )
+
+    async def _run_import_mapping(self, job_id: str, params: Dict[str, Any]) -> None:
+        """Import a spooled mapping workbook; the spool file is removed once the job is done."""
+        from app.services.mapping_service import MappingService
+        started = time.perf_counter()
+        result = {"source_file": params["file_name"]}
+        try:
+            imported = await self.async_storage_service.run(
+                MappingService(self.storage_service).import_workbook,
+                params["workbook_path"],
+                params["file_name"],
+                params["sheet_name"]
+            )
+            # The pinned reference can be used as config_path directly
+            result.update(status="success", output_file=f"{imported['mapping_file']}@{imported['version']}")
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            raise
+        finally:
+            # An interrupted job keeps its spool file and runs again after a restart
+            if "status" in result:
+                result["duration_ms"] = (time.perf_counter() - started) * 1000
+                await asyncio.to_thread(self.store.add_result, job_id, result)
+                if os.path.exists(params["workbook_path"]):
+                    os.remove(params["workbook_path"])
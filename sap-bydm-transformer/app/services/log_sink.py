@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.core.config import settings
+from app.services.storage_service import StorageService
+from app.utils.compression import compress
+from app.utils.json_stream import encode_json
+
+logger = logging.getLogger("app")
+
+
+class _ObjectWrite(NamedTuple):
+    """Records taken from the buffer for one flush, with the object they go to."""
+    path: str
+    # Members already written to that object; the flush appends one
+    members: List[bytes]
+    lines: List[bytes]
+
+
+class LogSink:
+    """
+    Buffered, structured log of a job or batch.
+
+    Records (per-file results) are kept in memory and flushed as gzip
+    compressed JSON lines to logs/<name>.jsonl.gz once LOG_FLUSH_RECORDS
+    records or LOG_FLUSH_BYTES are buffered, or LOG_FLUSH_INTERVAL seconds
+    after the oldest buffered record, and on close(). Every flush appends a
+    gzip member and rewrites the object, which stays one valid gzip file. To
+    bound the rewrites, an object that had LOG_OBJECT_MAX_FLUSHES flushes or
+    may exceed LOG_OBJECT_MAX_BYTES is continued in logs/<name>.00002.jsonl.gz
+    and so on. Records of a failed flush are written to their object by the
+    next one.
+
+    Uploads run outside the buffer lock, so add() only waits for storage
+    when it triggers a flush itself; flushes are serialized.
+    """
+
+    def __init__(self, storage_service: StorageService, name: str,
+                 flush_records: Optional[int] = None, flush_bytes: Optional[int] = None,
+                 flush_interval: Optional[float] = None, object_max_bytes: Optional[int] = None,
+                 object_max_flushes: Optional[int] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            storage_service: Service for MinIO interactions
+            name: Log name, usually the job id
+            flush_records: Buffered records that trigger a flush, LOG_FLUSH_RECORDS if omitted
+            flush_bytes: Buffered bytes that trigger a flush, LOG_FLUSH_BYTES if omitted
+            flush_interval: Seconds a record may stay buffered, LOG_FLUSH_INTERVAL if omitted
+            object_max_bytes: Compressed size after which a new object is started,
+                LOG_OBJECT_MAX_BYTES if omitted
+            object_max_flushes: Flushes after which a new object is started,
+                LOG_OBJECT_MAX_FLUSHES if omitted
+        """
+        self.storage_service = storage_service
+        self.name = name
+        self.flush_records = flush_records or settings.LOG_FLUSH_RECORDS
+        self.flush_bytes = flush_bytes or settings.LOG_FLUSH_BYTES
+        self.flush_interval = flush_interval or settings.LOG_FLUSH_INTERVAL
+        self.object_max_bytes = object_max_bytes or settings.LOG_OBJECT_MAX_BYTES
+        self.object_max_flushes = object_max_flushes or settings.LOG_OBJECT_MAX_FLUSHES
+        self.paths: List[str] = []
+        self.flushes = 0
+        self._object_number = 1
+        self._object_flushes = 0
+        self._members: List[bytes] = []
+        self._lines: List[bytes] = []
+        self._size = 0
+        self._oldest: Optional[float] = None
+        # Records of a failed flush, retried before the buffer is taken again
+        self._failed: Optional[_ObjectWrite] = None
+        # Guards the buffer; held briefly, never while uploading
+        self._lock = threading.Lock()
+        # Serializes flushes, so each rewrite of an object includes the previous one
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    @property
+    def path(self) -> str:
+        """Path of the object buffered records are written to."""
+        return self._object_path(self._object_number)
+
+    def _object_path(self, number: int) -> str:
+        suffix = "" if number == 1 else f".{number:05d}"
+        return f"{settings.LOG_FOLDER}/{self.name}{suffix}.jsonl.gz"
+
+    def add(self, record: Dict[str, Any], level: str = "INFO") -> str:
+        """
+        Buffer a record, flushing if a size threshold is reached.
+
+        Blocking when it flushes; call it on the storage I/O pool.
+
+        Args:
+            record: JSON-serializable record (e.g., a file's result)
+            level: Log level stored with the record
+
+        Returns:
+            Path of the object the record is written to
+        """
+        line = encode_json({"time": datetime.now().isoformat(), "level": level, **record}, compact=True)
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError(f"Log {self.name} is closed")
+            self._lines.append(line)
+            self._size += len(line) + 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            path = self.path
+            full = self._is_full()
+        if full:
+            self._flush(force=False)
+        if self._flusher is None:
+            self._start_flusher()
+        return path
+
+    def flush(self) -> None:
+        """Write the buffered records."""
+        self._flush(force=True)
+
+    def close(self) -> None:
+        """
+        Stop the interval flushes and write the remaining records.
+
+        Raises:
+            Exception: If the remaining records could not be written
+        """
+        with self._lock:
+            self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self._flush(force=True)
+        with self._write_lock, self._lock:
+            unwritten = len(self._lines) + (len(self._failed.lines) if self._failed is not None else 0)
+        if unwritten:
+            raise Exception(f"Failed to write {unwritten} records of log {self.name}")
+
+    def _is_full(self) -> bool:
+        """Check the flush thresholds (called under the lock)."""
+        return len(self._lines) >= self.flush_records or self._size >= self.flush_bytes
+
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is None and not self._closed.is_set():
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name=f"log-sink-{self.name}", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_periodically(self) -> None:
+        """Flusher thread: write records buffered for longer than flush_interval."""
+        while not self._closed.wait(self.flush_interval / 4):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self._flush(force=True)
+
+    def _flush(self, force: bool) -> None:
+        """
+        Write a failed flush again, then the buffered records.
+
+        Args:
+            force: Flush whatever is buffered; otherwise only if a threshold is
+                still reached once the previous flush finished
+        """
+        with self._write_lock:
+            if self._failed is not None:
+                if not self._write(self._failed):
+                    return
+                self._failed = None
+            with self._lock:
+                if not self._lines or not (force or self._is_full()):
+                    return
+                write = self._take()
+            if not self._write(write):
+                self._failed = write
+
+    def _take(self) -> _ObjectWrite:
+        """
+        Take the buffered records for the current object (called under both locks).
+
+        The next object is started right away if this flush may fill the
+        current one, so later records report the object they end up in.
+        """
+        write = _ObjectWrite(self.path, self._members, self._lines)
+        written = sum(len(member) for member in self._members)
+        self._object_flushes += 1
+        # The uncompressed size bounds the member about to be written
+        if self._object_flushes >= self.object_max_flushes or written + self._size >= self.object_max_bytes:
+            self._object_number += 1
+            self._object_flushes = 0
+            self._members = []
+        self._lines = []
+        self._size = 0
+        self._oldest = None
+        return write
+
+    def _write(self, write: _ObjectWrite) -> bool:
+        """Append taken records to their object (called under the write lock, not the buffer lock)."""
+        member = compress(b"\n".join(write.lines) + b"\n", "gzip", settings.COMPRESSION_LEVEL)
+        try:
+            self.storage_service.save_file(b"".join(write.members) + member, write.path,
+                                           content_type="application/gzip")
+        except Exception as e:
+            logger.error(f"Failed to flush {len(write.lines)} records of log {self.name}: {e}")
+            return False
+        write.members.append(member)
+        self.flushes += 1
+        if write.path not in self.paths:
+            self.paths.append(write.path)
+        return True
@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+class ManifestStore:
+    """
+    SQLite index of processed sources for incremental batches.
+
+    Maps a source object and a plan version (mapping, template and output
+    options) to the ETag that was transformed and the output written for it.
+    Lookups are primary-key reads, safe to call from any thread.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Open (and create if needed) the manifest database.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                source_file TEXT NOT NULL,
+                version TEXT NOT NULL,
+                source_etag TEXT NOT NULL,
+                output_file TEXT NOT NULL,
+                processed_at REAL NOT NULL,
+                PRIMARY KEY (source_file, version)
+            ) WITHOUT ROWID
+        """)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def get(self, source_file: str, version: str) -> Optional[Tuple[str, str]]:
+        """
+        Look up the last processing of a source under a plan version.
+
+        Args:
+            source_file: Source object name
+            version: Plan version
+
+        Returns:
+            Tuple of (source_etag, output_file), or None if never processed
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_etag, output_file FROM manifest WHERE source_file = ? AND version = ?",
+                (source_file, version)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def record(self, source_file: str, version: str, source_etag: str, output_file: str) -> None:
+        """
+        Record that a source version was transformed.
+
+        Args:
+            source_file: Source object name
+            version: Plan version
+            source_etag: ETag of the transformed source object
+            output_file: Path of the output
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifest (source_file, version, source_etag, output_file, processed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source_file, version, source_etag, output_file, time.time())
+            )
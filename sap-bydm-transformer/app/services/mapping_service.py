@@ -0,0 +1,91 @@
+import logging
+from typing import Any, BinaryIO, Dict, List, Union
+
+from app.core.config import settings
+from app.services.plan_store import PlanStore
+from app.services.storage_service import StorageService
+from app.utils.mapping_parser import MappingIssue, analyze_mapping, convert_mapping_to_json, load_mapping_from_excel
+
+logger = logging.getLogger("app")
+
+
+class MappingValidationError(ValueError):
+    """Raised when a mapping sheet has rules that analyze_mapping reports as errors."""
+
+    def __init__(self, issues: List[MappingIssue]):
+        self.issues = issues
+        errors = [issue.message for issue in issues if issue.severity == "error"]
+        super().__init__(f"Mapping sheet has {len(errors)} invalid rules: {'; '.join(errors)}")
+
+
+def mapping_path_for(file_name: str) -> str:
+    """
+    Get the mapping JSON path for an uploaded workbook name.
+
+    Args:
+        file_name: Name of the uploaded workbook (e.g., "Location Mapping.xlsx")
+
+    Returns:
+        Path of the mapping JSON (e.g., "mappings/Location_Mapping.json")
+    """
+    name = file_name.replace(' ', '_').replace('.xlsx', '').replace('.xls', '')
+    return f"{settings.MAPPINGS_FOLDER}/{name}.json"
+
+
+class MappingService:
+    """Imports mapping workbooks: parse, analyze, convert, store and publish."""
+
+    def __init__(self, storage_service: StorageService):
+        """
+        Initialize the mapping service.
+
+        Args:
+            storage_service: Service for MinIO interactions
+        """
+        self.storage_service = storage_service
+        self.plan_store = PlanStore(storage_service)
+
+    def import_workbook(self, workbook: Union[bytes, str, BinaryIO], file_name: str,
+                        sheet_name: str = "Data Mapping") -> Dict[str, Any]:
+        """
+        Import a mapping workbook.
+
+        Blocking (workbook parsing is CPU-bound); call it from a worker
+        thread or a job, never directly on the event loop.
+
+        Args:
+            workbook: Workbook content, an uploaded file, or the path of a spooled workbook
+            file_name: Name of the uploaded workbook, used for the mapping path
+            sheet_name: Name of the sheet containing mapping rules
+
+        Returns:
+            Dictionary with the saved mapping, published plan artifact and version,
+            the number of rules and the analysis warnings
+
+        Raises:
+            MappingValidationError: If the rules would be dropped or overwritten at runtime
+        """
+        mapping_rules = load_mapping_from_excel(workbook, sheet_name)
+
+        # Reject rules that would be dropped or overwritten at runtime
+        issues = analyze_mapping(mapping_rules)
+        if any(issue.severity == "error" for issue in issues):
+            raise MappingValidationError(issues)
+
+        mapping_json = convert_mapping_to_json(mapping_rules)
+
+        json_path = mapping_path_for(file_name)
+        saved_path = self.storage_service.save_json(mapping_json, json_path)
+
+        # Publish the compiled plan as the latest version; transforms load this artifact
+        version = self.plan_store.publish(json_path, mapping_json)
+        logger.info(f"Imported {file_name} as {saved_path} version {version['version']}")
+
+        return {
+            "status": "success",
+            "mapping_file": saved_path,
+            "plan_file": version["plan_file"],
+            "version": version["version"],
+            "rule_count": len(mapping_rules),
+            "warnings": [issue.message for issue in issues]
+        }
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+
+class CacheEntry(NamedTuple):
+    """A cached value together with the ETag of the object it was built from."""
+    etag: Optional[str]
+    value: Any
+    checked_at: float
+    used_at: float
+
+
+class ObjectCache:
+    """
+    Thread-safe LRU cache for values derived from storage objects.
+
+    Entries are keyed by an arbitrary hashable key and carry the ETag of the
+    object they were built from. Callers decide freshness with ``needs_check``
+    and ``touch``; entries idle for longer than ``ttl_seconds`` are evicted.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 3600.0,
+                 revalidate_seconds: float = 30.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept (least recently used are evicted)
+            ttl_seconds: Evict entries that have not been used for this long
+            revalidate_seconds: Trust an entry this long before checking its ETag again
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """
+        Get an entry without counting a hit or miss.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cache entry, or None if absent or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now - entry.used_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def needs_check(self, entry: CacheEntry) -> bool:
+        """Return True if the entry should be revalidated against storage."""
+        return time.monotonic() - entry.checked_at >= self.revalidate_seconds
+
+    def touch(self, key: Hashable, entry: CacheEntry, revalidated: bool = False) -> Any:
+        """
+        Record a hit on an entry and return its value.
+
+        Args:
+            key: Cache key
+            entry: Entry returned by ``get``
+            revalidated: True if the ETag was just confirmed against storage
+
+        Returns:
+            The cached value
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidations += 1
+            if key in self._entries:
+                self._entries[key] = entry._replace(
+                    checked_at=now if revalidated else entry.checked_at,
+                    used_at=now
+                )
+        return entry.value
+
+    def mark_checked(self, key: Hashable, entry: CacheEntry) -> None:
+        """
+        Record that an entry's ETag was confirmed against storage, without counting a hit.
+
+        Args:
+            key: Cache key
+            entry: Entry returned by ``get``
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.revalidations += 1
+            current = self._entries.get(key)
+            if current is not None and current.etag == entry.etag:
+                self._entries[key] = current._replace(checked_at=now)
+
+    def put(self, key: Hashable, etag: Optional[str], value: Any) -> Any:
+        """
+        Store a freshly loaded value, counting a miss.
+
+        Args:
+            key: Cache key
+            etag: ETag of the object the value was built from
+            value: Value to cache
+
+        Returns:
+            The cached value
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = CacheEntry(etag=etag, value=value, checked_at=now, used_at=now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """
+        Drop the entries whose key matches a predicate, or all entries.
+
+        Args:
+            predicate: Function returning True for keys to drop
+        """
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+            }
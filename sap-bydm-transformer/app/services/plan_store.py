@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.storage_service import StorageService
+from app.utils.json_stream import content_sha256
+from app.utils.mapping_compiler import MappingPlan, compile_mapping, dump_plan, load_plan
+
+logger = logging.getLogger("app")
+
+# config_path@version selects a published plan version
+VERSION_SEPARATOR = "@"
+LATEST_VERSION = "latest"
+
+# Versions of mappings/<name>.json live in mappings/<name>.versions/
+VERSIONS_SUFFIX = ".versions"
+PLAN_FILE_SUFFIX = ".plan.pkl"
+INDEX_FILE = "index.json"
+
+
+def split_config_ref(config_ref: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a mapping reference into its path and version.
+
+    Args:
+        config_ref: Mapping path, optionally followed by "@<version>" or "@latest"
+
+    Returns:
+        Tuple of (mapping path, version or None)
+    """
+    path, separator, version = config_ref.rpartition(VERSION_SEPARATOR)
+    if not separator or "/" in version:
+        return config_ref, None
+    return path, version or None
+
+
+def versions_folder(mapping_path: str) -> str:
+    """Get the folder holding the published versions of a mapping."""
+    base = mapping_path[:-len(".json")] if mapping_path.endswith(".json") else mapping_path
+    return f"{base}{VERSIONS_SUFFIX}"
+
+
+def mapping_version(mapping_json: Dict[str, Any]) -> str:
+    """
+    Compute the content hash identifying a mapping version.
+
+    Args:
+        mapping_json: Structured JSON mapping configuration
+
+    Returns:
+        16 hex digit version, equal for equal mappings
+    """
+    return content_sha256(mapping_json)[:16]
+
+
+class PlanStore:
+    """
+    Versioned, precompiled mapping plans in storage.
+
+    Publishing a mapping compiles it once and stores the serialized plan
+    under a content-hashed version, together with an index of all versions
+    of that mapping and the latest one. Loading a version only deserializes
+    the plan, and as versions never change, a cached plan never goes stale.
+    """
+
+    def __init__(self, storage_service: StorageService):
+        """
+        Initialize the plan store.
+
+        Args:
+            storage_service: Service for MinIO interactions
+        """
+        self.storage_service = storage_service
+
+    def publish(self, mapping_path: str, mapping_json: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Compile a mapping and publish it as the latest version.
+
+        Publishing unchanged content again makes its existing version the
+        latest one instead of adding a new version. The index is rewritten
+        as a whole, concurrent publishes of one mapping are not merged.
+
+        Args:
+            mapping_path: Path of the mapping JSON (e.g., mappings/Location.json)
+            mapping_json: Structured JSON mapping configuration, already analyzed
+
+        Returns:
+            Index entry of the published version
+        """
+        version = mapping_version(mapping_json)
+        folder = versions_folder(mapping_path)
+        index = self.load_index(mapping_path) or {"mapping": mapping_path, "latest": None, "versions": []}
+
+        entry = next((entry for entry in index["versions"] if entry["version"] == version), None)
+        if entry is None:
+            plan = compile_mapping(mapping_json)
+            data = dump_plan(plan)
+            plan_file = f"{folder}/{version}{PLAN_FILE_SUFFIX}"
+            self.storage_service.save_file(data, plan_file, content_type="application/octet-stream")
+            entry = {
+                "version": version,
+                "plan_file": plan_file,
+                "plan_sha256": hashlib.sha256(data).hexdigest(),
+                "segment_count": len(plan.segments),
+                "published_at": time.time()
+            }
+            index["versions"].append(entry)
+
+        index["latest"] = version
+        self.storage_service.save_json(index, f"{folder}/{INDEX_FILE}")
+        logger.info(f"Published {mapping_path} version {version}")
+        return entry
+
+    def load_index(self, mapping_path: str, background: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Load the version index of a mapping.
+
+        Args:
+            mapping_path: Path of the mapping JSON
+            background: Revalidate a cached index in the background (see StorageService.load_cached)
+
+        Returns:
+            Index dictionary, or None if no version was published
+        """
+        index_path = f"{versions_folder(mapping_path)}/{INDEX_FILE}"
+        # A cached index is revalidated by load_cached, only a miss needs the existence check
+        if not self.storage_service.is_cached(index_path, kind="json") and \
+                not self.storage_service.file_exists(index_path):
+            return None
+        return self.storage_service.load_cached_json(index_path, background=background)
+
+    def resolve(self, config_ref: str, background: bool = False) -> str:
+        """
+        Pin a mapping reference to a concrete version.
+
+        Args:
+            config_ref: Mapping path, "path@version" or "path@latest"
+            background: Resolve "latest" from a cached index without waiting for its revalidation
+
+        Returns:
+            "path@version" for versioned references, the path unchanged otherwise
+
+        Raises:
+            ValueError: If the mapping has no published version
+        """
+        mapping_path, version = split_config_ref(config_ref)
+        if version is None:
+            return config_ref
+        if version == LATEST_VERSION:
+            index = self.load_index(mapping_path, background=background)
+            if index is None or not index["latest"]:
+                raise ValueError(f"No published version of {mapping_path}")
+            version = index["latest"]
+        return f"{mapping_path}{VERSION_SEPARATOR}{version}"
+
+    def load_plan(self, config_ref: str, background: bool = False) -> MappingPlan:
+        """
+        Load a published plan version, using the storage cache.
+
+        Args:
+            config_ref: "path@version" or "path@latest"
+            background: Serve cached index and plan, revalidating them in the background
+
+        Returns:
+            Compiled mapping plan
+
+        Raises:
+            ValueError: If the version is unknown or its artifact is corrupt
+        """
+        mapping_path, version = split_config_ref(self.resolve(config_ref, background=background))
+        plan_file = f"{versions_folder(mapping_path)}/{version}{PLAN_FILE_SUFFIX}"
+
+        def verified_plan(data: bytes) -> MappingPlan:
+            # Only runs on a cache miss; the artifact must match its index entry
+            index = self.load_index(mapping_path) or {"versions": []}
+            entry = next((entry for entry in index["versions"] if entry["version"] == version), None)
+            if entry is None:
+                raise ValueError(f"Unknown version {version} of {mapping_path}")
+            if hashlib.sha256(data).hexdigest() != entry["plan_sha256"]:
+                raise ValueError(f"Plan artifact {plan_file} does not match its index entry")
+            return load_plan(data)
+
+        return self.storage_service.load_cached(plan_file, verified_plan, kind="plan", background=background)
@@ -1,27 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
 import json
 import logging
+import os
+import socket
+import threading
+import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple, Union, Iterable, Iterator, BinaryIO
 
+import certifi
+import urllib3
+from urllib3.connection import HTTPConnection
+from urllib3.util import Retry, Timeout
 from minio import Minio
 from minio.error import S3Error
 
 from app.core.config import settings
+from app.services.object_cache import CacheEntry, ObjectCache
+from app.utils.compression import compress, compress_chunks, decompress, decompress_stream, detect_compression
+from app.utils.json_stream import ChunkReader, iter_json_chunks
 
 logger = logging.getLogger("app")
 
+def create_http_client() -> urllib3.PoolManager:
+    """
+    Create the connection pool used by the MinIO client.
+    
+    Pool size, timeouts, retries and TCP keep-alive come from settings.
+    
+    Returns:
+        urllib3 PoolManager
+    """
+    socket_options = list(HTTPConnection.default_socket_options)
+    if settings.MINIO_TCP_KEEPALIVE:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    
+    pool_kwargs = {}
+    if settings.MINIO_SECURE:
+        pool_kwargs["cert_reqs"] = "CERT_REQUIRED"
+        pool_kwargs["ca_certs"] = os.environ.get("SSL_CERT_FILE") or certifi.where()
+    
+    return urllib3.PoolManager(
+        maxsize=settings.MINIO_MAX_POOL_CONNECTIONS,
+        block=True,
+        timeout=Timeout(connect=settings.MINIO_CONNECT_TIMEOUT, read=settings.MINIO_READ_TIMEOUT),
+        retries=Retry(
+            total=settings.MINIO_MAX_RETRIES,
+            backoff_factor=settings.MINIO_RETRY_BACKOFF,
+            status_forcelist=[500, 502, 503, 504]
+        ),
+        socket_options=socket_options,
+        **pool_kwargs
+    )
+
 class StorageService:
     """Service for interacting with MinIO object storage."""
     
-    def __init__(self):
-        """Initialize MinIO client with configuration from settings."""
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE
+    def __init__(self, http_client: Optional[urllib3.PoolManager] = None, client: Optional[Minio] = None):
+        """
+        Initialize MinIO client with configuration from settings.
+        
+        A StorageService is meant to live for the whole application (see
+        the startup hook in app.main), so the connection pool is reused and
+        the bucket is only checked once.
+        
+        Args:
+            http_client: Connection pool to use, created from settings if omitted
+            client: MinIO client (or a stand-in with the same methods, e.g.
+                for benchmarks), created from settings if omitted
+        """
+        if client is not None:
+            self.http_client = http_client
+            self.client = client
+        else:
+            self.http_client = http_client or create_http_client()
+            self.client = Minio(
+                settings.MINIO_ENDPOINT,
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_SECURE,
+                http_client=self.http_client
+            )
+        
+        # Process-wide cache for mappings, templates and values derived from them
+        self.cache = ObjectCache(
+            max_entries=settings.CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.CACHE_TTL_SECONDS,
+            revalidate_seconds=settings.CACHE_REVALIDATE_SECONDS
         )
+        # Entries served stale by load_cached(background=True) are revalidated here
+        self._revalidator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-revalidate")
+        self._revalidating: Set[Tuple[str, str]] = set()
+        self._revalidating_lock = threading.Lock()
         
         # Ensure bucket exists
         self._ensure_bucket_exists()
@@ -38,6 +110,12 @@ class StorageService:
             logger.error(f"Error checking/creating bucket: {e}")
             raise
     
+    def close(self):
+        """Close all pooled connections."""
+        self._revalidator.shutdown(wait=False)
+        if self.http_client is not None:
+            self.http_client.clear()
+    
     def list_files(self, prefix: str = "") -> List[str]:
         """
         List all files with a given prefix.
@@ -55,10 +133,66 @@ class StorageService:
             logger.error(f"Failed to list files with prefix '{prefix}': {e}")
             raise Exception(f"Failed to list files: {e}")
     
+    def iter_objects(self, prefix: str = "") -> Iterator[Any]:
+        """
+        Iterate over the objects with a given prefix, page by page.
+        
+        Unlike list_files, objects are yielded while the listing is still
+        being paginated, so callers can start working on the first ones
+        right away.
+        
+        Args:
+            prefix: The prefix to filter objects (like a folder path)
+            
+        Yields:
+            MinIO objects (object_name, etag, size, ...)
+        """
+        try:
+            yield from self.client.list_objects(settings.MINIO_BUCKET, prefix=prefix, recursive=True)
+        except S3Error as e:
+            logger.error(f"Failed to list files with prefix '{prefix}': {e}")
+            raise Exception(f"Failed to list files: {e}")
+    
+    def has_files(self, prefix: str = "", suffix: Union[str, Tuple[str, ...]] = "") -> bool:
+        """
+        Check whether at least one file with a prefix (and suffix) exists.
+        
+        Stops listing at the first match.
+        
+        Args:
+            prefix: The prefix to filter objects (like a folder path)
+            suffix: Required file name ending, e.g. '.xml', or a tuple of endings
+            
+        Returns:
+            True if a matching file exists
+        """
+        return any(obj.object_name.endswith(suffix) for obj in self.iter_objects(prefix))
+    
+    def file_exists(self, file_path: str) -> bool:
+        """
+        Check whether a file exists, with a single stat call.
+        
+        Args:
+            file_path: Path to the file within the bucket
+            
+        Returns:
+            True if the file exists
+        """
+        try:
+            self.client.stat_object(settings.MINIO_BUCKET, file_path)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+                return False
+            logger.error(f"Failed to stat file '{file_path}': {e}")
+            raise Exception(f"Failed to stat file {file_path}: {e}")
+    
     def load_file(self, file_path: str) -> bytes:
         """
         Load file content from MinIO.
         
+        Compressed files (.gz/.zst name or Content-Encoding) are decompressed.
+        
         Args:
             file_path: Path to the file within the bucket
             
@@ -67,7 +201,7 @@ class StorageService:
         """
         try:
             response = self.client.get_object(settings.MINIO_BUCKET, file_path)
-            data = response.read()
+            data = self._read_body(response, file_path)
             response.close()
             response.release_conn()
             return data
@@ -75,6 +209,188 @@ class StorageService:
             logger.error(f"Failed to load file '{file_path}': {e}")
             raise Exception(f"Failed to load file {file_path}: {e}")
     
+    def _read_body(self, response, file_path: str) -> bytes:
+        """Read a whole get_object response, decompressing compressed files."""
+        encoding = detect_compression(file_path, response.headers.get("Content-Encoding"))
+        if encoding is None:
+            return response.read()
+        # Read the stored bytes, the HTTP client must not decode them itself
+        return decompress(response.read(decode_content=False), encoding)
+    
+    @contextmanager
+    def open_file(self, file_path: str) -> Iterator[BinaryIO]:
+        """
+        Open a file in MinIO as a readable stream.
+        
+        The content is read from the connection as it is consumed, so large
+        files never have to be held in memory as a whole. Compressed files
+        (.gz/.zst name or Content-Encoding) are decompressed on the fly.
+        
+        Args:
+            file_path: Path to the file within the bucket
+            
+        Yields:
+            File-like object supporting read()
+        """
+        try:
+            response = self.client.get_object(settings.MINIO_BUCKET, file_path)
+        except S3Error as e:
+            logger.error(f"Failed to open file '{file_path}': {e}")
+            raise Exception(f"Failed to open file {file_path}: {e}")
+        try:
+            encoding = detect_compression(file_path, response.headers.get("Content-Encoding"))
+            if encoding is None:
+                yield response
+            else:
+                raw = ChunkReader(response.stream(64 * 1024, decode_content=False))
+                yield decompress_stream(raw, encoding)
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def stat_file(self, file_path: str):
+        """
+        Get object metadata (size, ETag, ...) without downloading it.
+        
+        Args:
+            file_path: Path to the file within the bucket
+            
+        Returns:
+            MinIO object stat
+        """
+        try:
+            return self.client.stat_object(settings.MINIO_BUCKET, file_path)
+        except S3Error as e:
+            logger.error(f"Failed to stat file '{file_path}': {e}")
+            raise Exception(f"Failed to stat file {file_path}: {e}")
+    
+    def _load_file_with_etag(self, file_path: str) -> Tuple[bytes, Optional[str]]:
+        """
+        Load file content from MinIO together with its ETag.
+        
+        Args:
+            file_path: Path to the file within the bucket
+            
+        Returns:
+            Tuple of (content, etag)
+        """
+        try:
+            response = self.client.get_object(settings.MINIO_BUCKET, file_path)
+            try:
+                data = self._read_body(response, file_path)
+                etag = response.headers.get("ETag")
+            finally:
+                response.close()
+                response.release_conn()
+            return data, etag.strip('"') if etag else None
+        except S3Error as e:
+            logger.error(f"Failed to load file '{file_path}': {e}")
+            raise Exception(f"Failed to load file {file_path}: {e}")
+    
+    def load_cached(self, file_path: str, loader: Callable[[bytes], Any], kind: str = "raw",
+                    background: bool = False) -> Any:
+        """
+        Load a value derived from a file, using the process-wide cache.
+        
+        Cached values are trusted for CACHE_REVALIDATE_SECONDS, after which
+        the object's ETag is checked with a stat call and the file is only
+        downloaded again if it changed. Cached values are shared, so callers
+        must not mutate them.
+        
+        Args:
+            file_path: Path to the file within the bucket
+            loader: Function building the cached value from the file content
+            kind: Name of the loader, so that different values derived
+                from the same file are cached separately
+            background: Return a cached value due for revalidation right away
+                and check its ETag on a background thread, so only a cache
+                miss reaches storage (used by latency-sensitive callers)
+            
+        Returns:
+            The (possibly cached) value returned by the loader
+        """
+        key = (kind, file_path)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if not self.cache.needs_check(entry):
+                return self.cache.touch(key, entry)
+            if background:
+                self._revalidate_later(key, entry, loader)
+                return self.cache.touch(key, entry)
+            if entry.etag and self.stat_file(file_path).etag == entry.etag:
+                return self.cache.touch(key, entry, revalidated=True)
+        
+        data, etag = self._load_file_with_etag(file_path)
+        return self.cache.put(key, etag, loader(data))
+    
+    def _revalidate_later(self, key: Tuple[str, str], entry: CacheEntry,
+                               loader: Callable[[bytes], Any]) -> None:
+        """Schedule the revalidation of a cache entry, unless one is already running."""
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        try:
+            self._revalidator.submit(self._revalidate, key, entry, loader)
+        except RuntimeError:
+            # Shut down: the next synchronous load revalidates instead
+            with self._revalidating_lock:
+                self._revalidating.discard(key)
+    
+    def _revalidate(self, key: Tuple[str, str], entry: CacheEntry,
+                         loader: Callable[[bytes], Any]) -> None:
+        """Check a cache entry's ETag and reload the value if the file changed."""
+        file_path = key[1]
+        try:
+            if entry.etag and self.stat_file(file_path).etag == entry.etag:
+                self.cache.mark_checked(key, entry)
+                return
+            data, etag = self._load_file_with_etag(file_path)
+            self.cache.put(key, etag, loader(data))
+            logger.info(f"Reloaded changed file {file_path} into the cache")
+        except Exception as e:
+            # Drop the entry, so the next caller loads the file and sees the error
+            logger.warning(f"Failed to revalidate cached {file_path}: {e}")
+            self.cache.invalidate(lambda cached_key: cached_key == key)
+        finally:
+            with self._revalidating_lock:
+                self._revalidating.discard(key)
+    
+    def is_cached(self, file_path: str, kind: str = "raw") -> bool:
+        """
+        Check whether a value derived from a file is cached, without storage I/O.
+        
+        Args:
+            file_path: Path to the file within the bucket
+            kind: Name of the loader (see load_cached)
+            
+        Returns:
+            True if load_cached would not need to download the file now
+        """
+        return self.cache.get((kind, file_path)) is not None
+    
+    def load_cached_json(self, file_path: str, background: bool = False) -> Dict[str, Any]:
+        """
+        Load and parse a JSON file (mapping, template), using the process-wide cache.
+        
+        Args:
+            file_path: Path to the JSON file within the bucket
+            background: Revalidate a cached value in the background (see load_cached)
+            
+        Returns:
+            Parsed JSON as dictionary, shared between callers (do not mutate)
+        """
+        return self.load_cached(file_path, json.loads, kind="json", background=background)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters of the mapping and template cache.
+        
+        Returns:
+            Dictionary of cache counters
+        """
+        return self.cache.stats()
+    
     def load_json(self, file_path: str) -> Dict[str, Any]:
         """
         Load and parse JSON file from MinIO.
@@ -88,7 +404,8 @@ class StorageService:
         content = self.load_file(file_path)
         return json.loads(content)
     
-    def save_file(self, data: bytes, file_path: str, content_type: str = "application/octet-stream") -> str:
+    def save_file(self, data: bytes, file_path: str, content_type: str = "application/octet-stream",
+                  content_encoding: Optional[str] = None) -> str:
         """
         Save binary data to MinIO.
         
@@ -96,11 +413,17 @@ class StorageService:
             data: Binary data to save
             file_path: Path where to save the file
             content_type: MIME type of the content
+            content_encoding: "gzip" or "zstd" to store the data compressed
             
         Returns:
             Path to the saved file
         """
         try:
+            metadata = None
+            if content_encoding:
+                data = compress(data, content_encoding, settings.COMPRESSION_LEVEL)
+                metadata = {"Content-Encoding": content_encoding}
+            
             data_stream = BytesIO(data)
             
             self.client.put_object(
@@ -108,28 +431,77 @@ class StorageService:
                 file_path,
                 data_stream,
                 length=len(data),
-                content_type=content_type
+                content_type=content_type,
+                metadata=metadata
+            )
+            
+            # Drop cached values built from the previous version of the file
+            self.cache.invalidate(lambda key: key[1] == file_path)
+            
+            logger.info(f"Saved file to {file_path}")
+            return file_path
+        except S3Error as e:
+            logger.error(f"Failed to save file to '{file_path}': {e}")
+            raise Exception(f"Failed to save file to {file_path}: {e}")
+    
+    def save_stream(self, chunks: Iterable[bytes], file_path: str,
+                    content_type: str = "application/octet-stream",
+                    content_encoding: Optional[str] = None) -> str:
+        """
+        Save data produced in chunks to MinIO as a multipart upload.
+        
+        Only one part (UPLOAD_PART_SIZE) is held in memory at a time.
+        
+        Args:
+            chunks: Binary data in chunks
+            file_path: Path where to save the file
+            content_type: MIME type of the content
+            content_encoding: "gzip" or "zstd" to store the data compressed
+            
+        Returns:
+            Path to the saved file
+        """
+        try:
+            metadata = None
+            if content_encoding:
+                chunks = compress_chunks(chunks, content_encoding, settings.COMPRESSION_LEVEL)
+                metadata = {"Content-Encoding": content_encoding}
+            
+            self.client.put_object(
+                settings.MINIO_BUCKET,
+                file_path,
+                ChunkReader(chunks),
+                length=-1,
+                part_size=settings.UPLOAD_PART_SIZE,
+                content_type=content_type,
+                metadata=metadata
             )
             
+            # Drop cached values built from the previous version of the file
+            self.cache.invalidate(lambda key: key[1] == file_path)
+            
             logger.info(f"Saved file to {file_path}")
             return file_path
         except S3Error as e:
             logger.error(f"Failed to save file to '{file_path}': {e}")
             raise Exception(f"Failed to save file to {file_path}: {e}")
     
-    def save_json(self, data: Dict[str, Any], file_path: str) -> str:
+    def save_json(self, data: Any, file_path: str, content_encoding: Optional[str] = None) -> str:
         """
-        Save JSON data to MinIO.
+        Save JSON data to MinIO, serialized while it is uploaded.
         
         Args:
-            data: Dictionary to save as JSON
+            data: Data to save as JSON
             file_path: Path where to save the JSON file
+            content_encoding: "gzip" or "zstd" to store the JSON compressed
             
         Returns:
             Path to the saved JSON file
         """
-        json_data = json.dumps(data, indent=2).encode("utf-8")
-        return self.save_file(json_data, file_path, content_type="application/json")
+        return self.save_stream(
+            iter_json_chunks(data), file_path, content_type="application/json",
+            content_encoding=content_encoding
+        )
     
     def save_log(self, log_content: str) -> str:
         """
@@ -141,8 +513,9 @@ class StorageService:
         Returns:
             Path to the saved log file
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_path = f"{settings.LOG_FOLDER}/transform_{timestamp}.log"
+        # Microseconds and a random suffix keep concurrent logs from overwriting each other
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        log_path = f"{settings.LOG_FOLDER}/transform_{timestamp}_{uuid.uuid4().hex[:8]}.log"
         
         log_data = log_content.encode("utf-8")
         return self.save_file(log_data, log_path, content_type="text/plain")
\ No newline at end of file
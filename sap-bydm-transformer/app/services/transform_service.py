@@ -1,195 +1,599 @@
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import uuid
+from typing import Dict, Any, List, Optional, Tuple, Union, Iterable, Iterator, BinaryIO, Callable
 from datetime import datetime
 
 from app.core.config import settings
 from app.services.storage_service import StorageService
-from app.utils.xml_parser import parse_xml_to_dict, extract_segments, get_field_value
-from app.utils.mapping_parser import convert_mapping_to_json
+from app.services.async_storage_service import AsyncStorageService
+from app.services.batch_pipeline import BatchPipeline
+from app.services.bulk_output import OUTPUT_MODES, NdjsonPartWriter
+from app.services.columnar_export import ParquetPartWriter, export_columns
+from app.services.dedup_service import DedupFilter, DedupIndex
+from app.services.log_sink import LogSink
+from app.services.manifest_service import ManifestStore
+from app.services.plan_store import PlanStore, split_config_ref
+from app.services.transform_worker import TransformPool
+from app.utils.compression import compression_suffix, decompress, strip_compression_suffix
+from app.utils.json_stream import encode_json
+from app.utils.schema_validator import SchemaValidator, get_validator
+from app.utils.template_factory import TemplateFactory
+from app.utils.xml_parser import parse_xml_to_dict, extract_segments, get_field_value, iter_segments, iter_idocs
+from app.utils.mapping_compiler import (
+    MappingPlan, CompiledSegment, compile_mapping, run_segment, set_path_value, split_target_path
+)
 
 logger = logging.getLogger("app")
 
+# How a file holding many IDOC elements (a packet) is turned into BYDM output:
+# "merge" builds one message with one location[] entry per IDoc,
+# "split" writes one output object per IDoc
+PACKET_MODES = ("merge", "split")
+
+# Source name of payloads posted inline, outputs are saved as target/inline_<id>.json
+INLINE_SOURCE_NAME = "inline.xml"
+
 class TransformService:
     """Service for transforming XML to JSON according to mapping rules."""
     
-    def __init__(self, storage_service: StorageService):
+    def __init__(self, storage_service: StorageService,
+                 async_storage_service: Optional[AsyncStorageService] = None,
+                 manifest_store: Optional[ManifestStore] = None,
+                 dedup_index: Optional[DedupIndex] = None,
+                 transform_pool: Optional[TransformPool] = None,
+                 log_sink: Optional[LogSink] = None):
         """
         Initialize with a storage service.
         
         Args:
             storage_service: Service for MinIO interactions
+            async_storage_service: Awaitable facade over storage_service; the
+                application-wide one should be passed, a private one is
+                created on first use otherwise
+            manifest_store: Index of processed sources, required for incremental batches
+            dedup_index: Fingerprints of transformed IDocs; resent IDocs with
+                unchanged business content are not transformed again
+            transform_pool: The application's worker processes for batch
+                transforms; each batch starts its own pool if omitted
+            log_sink: The application's log of single file and inline
+                transformations; one log object per file is saved if omitted
         """
         self.storage_service = storage_service
+        self._async_storage_service = async_storage_service
+        self.manifest_store = manifest_store
+        self.dedup_index = dedup_index
+        self.transform_pool = transform_pool
+        self.log_sink = log_sink
+        self.plan_store = PlanStore(storage_service)
+    
+    @property
+    def async_storage_service(self) -> AsyncStorageService:
+        """Awaitable facade used for all storage I/O of the async methods."""
+        if self._async_storage_service is None:
+            self._async_storage_service = AsyncStorageService(self.storage_service)
+        return self._async_storage_service
     
-    async def process_file(self, source_file_path: str, config_path: str, template_path: str) -> Tuple[str, str]:
+    async def process_file(self, source_file_path: str, config_path: str, template_path: str,
+                           packet_mode: Optional[str] = None,
+                           schema_path: Optional[str] = None) -> Tuple[str, str]:
         """
         Process a single XML file to BYDM JSON format.
         
         Args:
             source_file_path: Path to source XML file
-            config_path: Path to mapping configuration
+            config_path: Path to mapping configuration, optionally "path@version"
+                or "path@latest" for a published plan version (see PlanStore)
             template_path: Path to BYDM template
+            packet_mode: None to map the whole file into one document, or one of
+                PACKET_MODES to transform each IDOC element of the file separately
+            schema_path: JSON Schema every output document is validated against
+                before it is saved; OUTPUT_SCHEMA_PATH if omitted, no validation
+                if neither is set
             
         Returns:
-            Tuple of (output_path, log_path)
+            Tuple of (output_path, log_path); in "split" mode output_path is
+            the folder holding one JSON object per IDoc
+            
+        Raises:
+            SchemaValidationError: If an output document does not match the schema
         """
         try:
             logger.info(f"Processing file: {source_file_path}")
             
-            # Load the source XML, mapping config, and template
-            xml_data = self.storage_service.load_file(source_file_path)
-            config = self.storage_service.load_json(config_path)
-            template = self.storage_service.load_json(template_path)
-            
-            # Parse XML to dictionary
-            xml_dict = parse_xml_to_dict(xml_data)
-            
-            # Create output using template
-            bydm_data = [template.copy()]
+            if packet_mode is not None and packet_mode not in PACKET_MODES:
+                raise ValueError(f"Unknown packet mode: {packet_mode}")
             
-            # Transform data using mapping config
-            await self._apply_mapping(xml_dict, config, bydm_data[0])
+            storage = self.async_storage_service
             
-            # Generate output file path
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_name = source_file_path.split('/')[-1].replace('.xml', '')
-            output_path = f"{settings.TARGET_FOLDER}/{file_name}_{timestamp}.json"
+            # Mapping plan and template come from the cache
+            config_path = await storage.run(self.plan_store.resolve, config_path)
+            plan = await storage.run(self._load_plan, config_path)
+            template = await storage.run(self._load_template, template_path)
+            schema_path = schema_path or settings.OUTPUT_SCHEMA_PATH
+            validator = await storage.run(self._load_validator, schema_path) if schema_path else None
+            dedup = None
+            if self.dedup_index is not None:
+                version = await storage.run(self._plan_version, config_path, template_path, packet_mode)
+                dedup = DedupFilter(self.dedup_index, version)
             
-            # Save transformed data
-            self.storage_service.save_json(bydm_data, output_path)
+            # Stream, transform and save off the event loop
+            output_path = await storage.run(
+                self._transform_file, source_file_path, plan, template, packet_mode, dedup, validator
+            )
             
             # Save processing log
-            log_content = f"Successfully processed {source_file_path} to {output_path}"
-            log_path = self.storage_service.save_log(log_content)
+            log_path = await self._log_result(
+                {"source_file": source_file_path, "status": "success", "output_file": output_path},
+                f"Successfully processed {source_file_path} to {output_path}"
+            )
             
             logger.info(f"Transformation completed: {source_file_path} -> {output_path}")
             return output_path, log_path
             
         except Exception as e:
             logger.error(f"Error processing file {source_file_path}: {str(e)}")
-            # Save error log
-            log_content = f"Error processing {source_file_path}: {str(e)}"
-            log_path = self.storage_service.save_log(log_content)
+            # Save error log, without masking the error
+            try:
+                await self._log_result(
+                    {"source_file": source_file_path, "status": "failed", "error": str(e)},
+                    f"Error processing {source_file_path}: {str(e)}",
+                    level="ERROR"
+                )
+            except Exception as log_error:
+                logger.error(f"Failed to log the error of {source_file_path}: {log_error}")
             raise
     
-    async def _apply_mapping(self, xml_dict: Dict[str, Any], config: Dict[str, Any], 
-                          output_json: Dict[str, Any]) -> None:
+    async def _log_result(self, record: Dict[str, Any], message: str, level: str = "INFO") -> str:
         """
-        Apply mapping configuration to transform XML to BYDM format.
+        Log the result of a single file or inline transformation.
         
         Args:
-            xml_dict: Dictionary representation of XML
-            config: Mapping configuration
-            output_json: Output JSON being constructed
+            record: Structured result, buffered in the log sink
+            message: Text saved as a log object of its own without a log sink
+            level: Log level of the record
+            
+        Returns:
+            Path to the log object
+        """
+        if self.log_sink is None:
+            return await self.async_storage_service.save_log(message)
+        return await self.async_storage_service.run(self.log_sink.add, record, level)
+    
+    async def transform_inline(self, xml: bytes, config_path: str, template_path: str,
+                               packet_mode: Optional[str] = None, schema_path: Optional[str] = None,
+                               content_encoding: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bytes]:
         """
-        mappings = config.get("mappings", {})
+        Transform an XML payload held in memory, without touching storage.
         
-        # Process each segment in the mapping
-        for segment_name, segment_mapping in mappings.items():
-            # Extract segment data from XML
-            segments = extract_segments(xml_dict, segment_name)
+        Mapping plan, template and schema come from the cache, so a warm
+        call does no storage I/O: entries due for revalidation are served
+        as they are and checked in the background. Loading, transforming,
+        validating and encoding run in one hop to the storage I/O pool.
+        
+        Args:
+            xml: IDoc XML content
+            config_path: Path to mapping configuration, optionally "path@version"
+                or "path@latest" for a published plan version
+            template_path: Path to BYDM template
+            packet_mode: None, or one of PACKET_MODES
+            schema_path: JSON Schema every document is validated against, none if omitted
+            content_encoding: "gzip" or "zstd" if the payload is compressed
             
-            if not segments:
-                logger.warning(f"Segment {segment_name} not found in XML")
-                continue
-                
-            # Process each segment instance
-            for segment in segments:
-                await self._process_segment(segment, segment_mapping, output_json)
+        Returns:
+            Tuple of (documents, compact JSON); the JSON holds the single
+            document, or the list of documents in "split" mode
+            
+        Raises:
+            DecompressedSizeError: If the payload decompresses to more than INLINE_MAX_BYTES
+            SchemaValidationError: If a document does not match the schema
+        """
+        if packet_mode is not None and packet_mode not in PACKET_MODES:
+            raise ValueError(f"Unknown packet mode: {packet_mode}")
+        return await self.async_storage_service.run(
+            self._transform_payload, xml, config_path, template_path, packet_mode, schema_path, content_encoding
+        )
+    
+    def _transform_payload(self, xml: bytes, config_path: str, template_path: str,
+                           packet_mode: Optional[str] = None, schema_path: Optional[str] = None,
+                           content_encoding: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bytes]:
+        """Blocking part of transform_inline."""
+        if content_encoding:
+            xml = decompress(xml, content_encoding, max_size=settings.INLINE_MAX_BYTES)
+        # Only a cold cache reaches storage, stale entries are revalidated in the background
+        plan = self._load_plan(config_path, background=True)
+        template = self._load_template(template_path, background=True)
+        documents = [
+            document
+            for output in self.transform_documents(xml, plan, template, packet_mode)
+            for document in output
+        ]
+        if schema_path:
+            validator = self._load_validator(schema_path, background=True)
+            for document in documents:
+                validator.validate(document)
+        body = documents if packet_mode == "split" else documents[0]
+        return documents, encode_json(body, compact=True)
     
-    async def _process_segment(self, segment: Dict[str, Any], 
-                            segment_mapping: Dict[str, Any], 
-                            output_json: Dict[str, Any]) -> None:
+    async def persist_inline(self, documents: List[Dict[str, Any]], output_id: str,
+                             packet_mode: Optional[str] = None) -> Optional[str]:
         """
-        Process a single segment according to mapping rules.
+        Save the documents of an inline transformation.
+        
+        Meant to run after the response was sent, so failures are logged
+        instead of raised. The result is recorded in the log sink, if there
+        is one; inline requests never save a log object of their own.
         
         Args:
-            segment: Segment dictionary
-            segment_mapping: Mapping rules for the segment
-            output_json: Output JSON being constructed
+            documents: Documents returned by transform_inline
+            output_id: Name suffix of the output (see inline_output_path)
+            packet_mode: None, or one of PACKET_MODES
+            
+        Returns:
+            Path to the output, or None if saving failed
         """
-        for field_name, field_mapping in segment_mapping.items():
-            if isinstance(field_mapping, dict) and "target" in field_mapping:
-                # Get field value from segment
-                field_value = segment.get(field_name, "")
-                
-                # Handle special case where value is in '#text' property (common in xmltodict output)
-                if isinstance(field_value, dict) and '#text' in field_value:
-                    field_value = field_value['#text']
-                
-                if not field_value and field_value != 0:
-                    # Use default value if available
-                    field_value = field_mapping.get("default_value", "")
-                
-                # Apply transformation if specified
-                transformation = field_mapping.get("transformation")
-                if transformation and field_value:
-                    field_value = self._apply_transformation(field_value, transformation)
-                
-                # Validate field value
-                validation_rule = field_mapping.get("validation")
-                if validation_rule:
-                    field_value = self._validate_field(field_value, validation_rule, field_name)
-                
-                # Set value in output JSON
-                if field_value is not None:
-                    self._set_nested_value(output_json, field_mapping["target"], field_value)
-            elif isinstance(field_mapping, dict):
-                # Handle nested mapping (recursive call)
-                nested_segment = segment.get(field_name, {})
-                if nested_segment:
-                    await self._process_segment(nested_segment, field_mapping, output_json)
+        storage = self.async_storage_service
+        try:
+            output_path = await storage.run(
+                self._save_outputs, INLINE_SOURCE_NAME, ([document] for document in documents),
+                packet_mode, output_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to save inline output {output_id}: {str(e)}")
+            return None
+        
+        if self.log_sink is not None:
+            try:
+                await storage.run(self.log_sink.add, {
+                    "source_file": INLINE_SOURCE_NAME, "status": "success", "output_file": output_path
+                })
+            except Exception as e:
+                logger.error(f"Failed to log inline output {output_path}: {str(e)}")
+        return output_path
+    
+    def inline_output_path(self, output_id: str, packet_mode: Optional[str] = None) -> str:
+        """Get the path persist_inline saves to, before it runs."""
+        return self._output_path(INLINE_SOURCE_NAME, output_id, packet_mode)
     
-    def _apply_transformation(self, value: str, transformation: Dict[str, Any]) -> str:
+    def _transform_file(self, source_file_path: str, plan: MappingPlan, template: TemplateFactory,
+                        packet_mode: Optional[str] = None, dedup: Optional[DedupFilter] = None,
+                        validator: Optional[SchemaValidator] = None) -> str:
         """
-        Apply transformation rule to a field value.
+        Stream a source file from storage through the plan and save the output.
+        
+        Blocking; process_file runs it on the storage I/O pool.
         
         Args:
-            value: Field value to transform
-            transformation: Transformation rule
+            source_file_path: Path to source XML file
+            plan: Compiled mapping plan
+            template: Compiled BYDM template
+            packet_mode: None, or one of PACKET_MODES
+            dedup: Filter dropping already transformed IDocs
+            validator: Schema every document is validated against before it is saved
             
         Returns:
-            Transformed value
+            Path to the output file, or the output folder in "split" mode; the
+            previous output if every IDoc was a duplicate
+        """
+        with self.storage_service.open_file(source_file_path) as xml_stream:
+            # Documents are serialized while they are uploaded
+            outputs = self.transform_documents(xml_stream, plan, template, packet_mode, dedup)
+            if validator is not None:
+                outputs = self._validate_outputs(outputs, validator)
+            output_path = self._save_outputs(source_file_path, outputs, packet_mode)
+        
+        if dedup is not None:
+            if not dedup.fingerprints and dedup.duplicates:
+                # Nothing was written, point at the output of the first transformation
+                logger.info(f"Skipped duplicate {source_file_path}, previous output {dedup.duplicates[0]}")
+                return dedup.duplicates[0]
+            self.dedup_index.record(dedup.fingerprints, output_path)
+        return output_path
+    
+    def _validate_outputs(self, outputs: Iterable[List[Dict[str, Any]]],
+                          validator: SchemaValidator) -> Iterator[List[Dict[str, Any]]]:
         """
-        if not transformation:
-            return value
+        Validate output objects as they stream to storage.
+        
+        Args:
+            outputs: Output objects (see transform_documents)
+            validator: Compiled schema validator
             
-        if transformation.get("type") == "MAP":
-            mapping_values = transformation.get("values", {})
-            return mapping_values.get(str(value), value)
+        Yields:
+            The output objects, each after its documents passed validation
             
-        return value
+        Raises:
+            SchemaValidationError: On the first invalid document; in "split"
+                mode the documents before it are already saved
+        """
+        for output in outputs:
+            for document in output:
+                validator.validate(document)
+            yield output
     
-    def _validate_field(self, value: Any, validation_rule: str, field_name: str) -> Optional[str]:
+    def transform_documents(self, xml_source: Union[bytes, BinaryIO], plan: MappingPlan,
+                            template: Union[TemplateFactory, Dict[str, Any]],
+                            packet_mode: Optional[str] = None,
+                            dedup: Optional[DedupFilter] = None) -> Iterator[List[Dict[str, Any]]]:
         """
-        Validate a field value against rules.
+        Transform one source XML into BYDM output objects.
+        
+        This is pure CPU work and does not touch storage, so it can also run
+        in a worker process (see transform_worker).
         
         Args:
-            value: Field value to validate
-            validation_rule: Type of validation to apply
-            field_name: Name of the field (for logging)
+            xml_source: XML content as bytes, or a binary file-like object
+            plan: Compiled mapping plan
+            template: Compiled BYDM template, or a template dictionary (not modified)
+            packet_mode: None, or one of PACKET_MODES
+            dedup: Filter dropping already transformed IDocs before they are
+                mapped (the whole file counts as one IDoc without packet_mode)
+            
+        Yields:
+            Output objects (a list holding one BYDM document); one per IDoc
+            in "split" mode, a single one otherwise, none if all were duplicates
+        """
+        if not isinstance(template, TemplateFactory):
+            template = TemplateFactory(template)
+        
+        if packet_mode in PACKET_MODES:
+            idocs = iter_idocs(xml_source)
+            if dedup is not None:
+                idocs = dedup.filter(idocs)
+            if packet_mode == "split":
+                for document in self._iter_packet_documents(idocs, plan, template):
+                    yield [document]
+            else:
+                message = self._build_packet_message(idocs, plan, template)
+                if dedup is None or dedup.fingerprints:
+                    yield [message]
+        else:
+            segments = iter_segments(xml_source)
+            if dedup is not None:
+                segments = list(segments)
+                if dedup.is_duplicate(segments):
+                    return
+            # Create output using template (each document is a fresh clone)
+            document = template.new()
+            self._apply_segments(segments, plan, document)
+            yield [document]
+    
+    def _save_outputs(self, source_file_path: str, outputs: Iterable[Union[bytes, Any]],
+                      packet_mode: Optional[str] = None, output_id: Optional[str] = None) -> str:
+        """
+        Save output objects produced from one source file.
+        
+        Args:
+            source_file_path: Path to source XML file
+            outputs: Encoded JSON output objects, or output objects to stream as JSON
+            packet_mode: None, or one of PACKET_MODES
+            output_id: Name suffix of the output, a timestamp if omitted; a
+                deterministic id makes reruns overwrite instead of duplicate
             
         Returns:
-            Validated value or None if invalid
+            Path to the output file, or the output folder in "split" mode
         """
-        if value is None or value == "":
-            return None
+        output_path = self._output_path(source_file_path, output_id, packet_mode)
+        
+        if packet_mode == "split":
+            suffix = ".json" + compression_suffix(settings.TARGET_COMPRESSION)
+            idoc_count = 0
+            for idoc_count, output in enumerate(outputs, 1):
+                self._save_output(output, f"{output_path}/idoc_{idoc_count:05d}{suffix}")
+            logger.info(f"Split {idoc_count} IDocs from {source_file_path}")
+            return output_path
+        
+        for output in outputs:
+            self._save_output(output, output_path)
+        return output_path
+    
+    def _output_path(self, source_file_path: str, output_id: Optional[str] = None,
+                     packet_mode: Optional[str] = None) -> str:
+        """
+        Get the output path for a source file.
+        
+        Args:
+            source_file_path: Path to source XML file
+            output_id: Name suffix of the output, a timestamp if omitted
+            packet_mode: None, or one of PACKET_MODES
+            
+        Returns:
+            Path to the output file, or the output folder in "split" mode
+        """
+        output_id = output_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_name = strip_compression_suffix(source_file_path.split('/')[-1]).replace('.xml', '')
+        output_path = f"{settings.TARGET_FOLDER}/{file_name}_{output_id}"
+        if packet_mode == "split":
+            return output_path
+        return output_path + ".json" + compression_suffix(settings.TARGET_COMPRESSION)
+    
+    def _save_output(self, output: Union[bytes, Any], output_path: str) -> None:
+        """Save one encoded or not yet encoded output object, compressed per TARGET_COMPRESSION."""
+        if isinstance(output, bytes):
+            self.storage_service.save_file(
+                output, output_path, content_type="application/json",
+                content_encoding=settings.TARGET_COMPRESSION
+            )
+        else:
+            self.storage_service.save_json(output, output_path, content_encoding=settings.TARGET_COMPRESSION)
+    
+    def _iter_packet_documents(self, idocs: Iterable[List[Tuple[str, Any]]], plan: MappingPlan,
+                               template: TemplateFactory) -> Iterator[Dict[str, Any]]:
+        """
+        Transform each IDoc of a packet into its own BYDM document.
+        
+        Args:
+            idocs: Segment lists, one per IDoc (see iter_idocs)
+            plan: Compiled mapping plan
+            template: Compiled BYDM template
             
-        # Convert to string for validation
-        value = str(value).strip()
-        
-        if validation_rule.upper() == "NUMBER":
-            # Allow decimal numbers
-            if not value.replace('.', '', 1).isdigit():
-                logger.warning(f"Validation failed for {field_name}: Expected NUMBER, got '{value}'")
-                return None
-        elif validation_rule.upper() == "TEXT":
-            if not value:
-                logger.warning(f"Validation failed for {field_name}: Expected TEXT, got empty string")
-                return None
+        Yields:
+            One BYDM document per IDoc
+        """
+        for segments in idocs:
+            document = template.new()
+            self._apply_segments(segments, plan, document)
+            yield document
+    
+    def _build_packet_message(self, idocs: Iterable[List[Tuple[str, Any]]], plan: MappingPlan,
+                              template: TemplateFactory) -> Dict[str, Any]:
+        """
+        Transform all IDocs of a packet into one BYDM message.
+        
+        The first IDoc is mapped onto the template as usual (so the message
+        header comes from it); every following IDoc is mapped separately and
+        only contributes its location[] entries.
+        
+        Args:
+            idocs: Segment lists, one per IDoc (see iter_idocs)
+            plan: Compiled mapping plan
+            template: Compiled BYDM template
+            
+        Returns:
+            BYDM message with one location[] entry per IDoc
+        """
+        message = template.new()
+        location_seed = template.part("location", 0)
+        
+        for index, segments in enumerate(idocs):
+            if index == 0:
+                self._apply_segments(segments, plan, message)
+                continue
+            document = {"location": [location_seed.new()]}
+            self._apply_segments(segments, plan, document)
+            locations = message.setdefault("location", [])
+            if isinstance(locations, list):
+                locations.extend(document["location"])
+        
+        return message
+    
+    def _load_plan(self, config_path: str, background: bool = False) -> MappingPlan:
+        """
+        Load a mapping configuration as a compiled plan, using the storage cache.
+        
+        Published versions ("path@version") are deserialized ready to run,
+        plain mapping JSON is compiled.
+        
+        Args:
+            config_path: Path to mapping configuration, optionally "path@version"
+            background: Serve a cached plan and revalidate it in the background
+            
+        Returns:
+            Compiled mapping plan
+        """
+        if split_config_ref(config_path)[1] is not None:
+            return self.plan_store.load_plan(config_path, background=background)
+        return self.storage_service.load_cached(
+            config_path,
+            lambda data: compile_mapping(json.loads(data)),
+            kind="plan",
+            background=background
+        )
+    
+    def _load_template(self, template_path: str, background: bool = False) -> TemplateFactory:
+        """
+        Load a BYDM template in compiled form, using the storage cache.
+        
+        Args:
+            template_path: Path to BYDM template
+            background: Serve a cached template and revalidate it in the background
+            
+        Returns:
+            Template factory building a fresh document per use
+        """
+        return self.storage_service.load_cached(
+            template_path,
+            lambda data: TemplateFactory(json.loads(data)),
+            kind="template",
+            background=background
+        )
+    
+    def _load_validator(self, schema_path: str, background: bool = False) -> SchemaValidator:
+        """
+        Load a JSON Schema as a compiled validator, using the storage cache.
+        
+        Args:
+            schema_path: Path to the JSON Schema
+            background: Serve a cached validator and revalidate it in the background
+            
+        Returns:
+            Validator compiled once per schema content
+        """
+        return self.storage_service.load_cached(
+            schema_path,
+            lambda data: get_validator(json.loads(data)),
+            kind="schema",
+            background=background
+        )
+    
+    def _apply_mapping(self, xml_dict: Dict[str, Any], config: Union[Dict[str, Any], MappingPlan],
+                       output_json: Dict[str, Any]) -> None:
+        """
+        Apply mapping configuration to transform XML to BYDM format.
+        
+        Args:
+            xml_dict: Dictionary representation of XML
+            config: Mapping configuration or a plan compiled from it
+            output_json: Output JSON being constructed
+        """
+        plan = config if isinstance(config, MappingPlan) else compile_mapping(config)
+        
+        # Process each segment in the plan
+        for segment_path, segment_plan in plan.segments:
+            # Extract segment data from XML
+            segments = extract_segments(xml_dict, segment_path)
+            
+            if not segments:
+                logger.warning(f"Segment {segment_plan.name} not found in XML")
+                continue
                 
-        return value
+            # Process each segment instance
+            for segment in segments:
+                self._process_segment(segment, segment_plan, output_json)
+    
+    def _apply_segments(self, segments: Iterable[Tuple[str, Any]], plan: MappingPlan,
+                        output_json: Dict[str, Any]) -> None:
+        """
+        Apply a mapping plan to a stream of top-level IDoc segments.
+        
+        Args:
+            segments: (segment name, segment dictionary) pairs, e.g. from iter_segments
+            plan: Compiled mapping plan
+            output_json: Output JSON being constructed
+        """
+        by_segment = plan.by_segment
+        seen = set()
+        
+        for segment_name, segment in segments:
+            entries = by_segment.get(segment_name)
+            if entries is None or not isinstance(segment, dict):
+                continue
+            seen.add(segment_name)
+            
+            for sub_path, segment_plan in entries:
+                if sub_path:
+                    for sub_segment in extract_segments(segment, sub_path):
+                        run_segment(segment_plan, sub_segment, output_json)
+                else:
+                    run_segment(segment_plan, segment, output_json)
+        
+        for segment_name in by_segment.keys() - seen:
+            logger.warning(f"Segment {segment_name} not found in XML")
+    
+    def _process_segment(self, segment: Dict[str, Any], 
+                         segment_plan: CompiledSegment, 
+                         output_json: Dict[str, Any]) -> None:
+        """
+        Process a single segment according to compiled mapping rules.
+        
+        Args:
+            segment: Segment dictionary
+            segment_plan: Compiled mapping rules for the segment
+            output_json: Output JSON being constructed
+        """
+        run_segment(segment_plan, segment, output_json)
     
     def _set_nested_value(self, json_obj: Dict[str, Any], nested_key: str, value: Any) -> None:
         """
@@ -200,103 +604,116 @@ class TransformService:
             nested_key: Nested key path (e.g., "a.b.0.c")
             value: Value to set
         """
-        keys = nested_key.split(".")
-        temp = json_obj
-        
-        # Navigate to the correct position
-        for i, key in enumerate(keys[:-1]):
-            # Handle array indices
-            if key.isdigit():
-                key = int(key)
-                # Ensure array has enough elements
-                if isinstance(temp, list):
-                    while len(temp) <= key:
-                        temp.append({})
-                    temp = temp[key]
-                else:
-                    # If not already a list, create a new list
-                    new_temp = []
-                    while len(new_temp) <= key:
-                        new_temp.append({})
-                    temp[keys[i-1]] = new_temp
-                    temp = new_temp[key]
-            else:
-                # For dictionary keys
-                if key not in temp or not isinstance(temp[key], (dict, list)):
-                    # Create dict if key doesn't exist or isn't a container
-                    if keys[i+1].isdigit():
-                        # Next key is an array index, so create a list
-                        temp[key] = []
-                    else:
-                        # Next key is a dict key, so create a dict
-                        temp[key] = {}
-                temp = temp[key]
-        
-        # Set the value at the final position
-        last_key = keys[-1]
-        if last_key.isdigit():
-            last_key = int(last_key)
-            # Ensure array has enough elements
-            if isinstance(temp, list):
-                while len(temp) <= last_key:
-                    temp.append(None)
-                temp[last_key] = value
-            else:
-                # Convert to list if not already
-                temp = []
-                while len(temp) <= last_key:
-                    temp.append(None)
-                temp[last_key] = value
-        else:
-            temp[last_key] = value
+        set_path_value(json_obj, split_target_path(nested_key), value)
     
     async def batch_process(self, source_folder: str, config_path: str, 
-                         template_path: str) -> List[Dict[str, Any]]:
+                         template_path: str, packet_mode: Optional[str] = None,
+                         on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                         incremental: bool = False,
+                         on_skipped: Optional[Callable[[int], None]] = None,
+                         output_mode: str = "files",
+                         batch_id: Optional[str] = None,
+                         export_parquet: bool = False) -> List[Dict[str, Any]]:
         """
         Process multiple XML files in batch mode.
         
+        Files stream through a BatchPipeline: listing, downloads, transforms
+        and uploads overlap instead of running one after the other.
+        
         Args:
             source_folder: Folder containing XML files
-            config_path: Path to mapping configuration
+            config_path: Path to mapping configuration, optionally "path@version"
+                or "path@latest"; "latest" is pinned for the whole batch
             template_path: Path to BYDM template
+            packet_mode: How files holding many IDocs are handled (see process_file)
+            on_result: Called with each file's result as soon as it is available,
+                on a storage I/O thread
+            incremental: Skip sources already transformed with the same ETag,
+                mapping and template (see ManifestStore)
+            on_skipped: Called with the number of skipped sources at the end, on a
+                storage I/O thread
+            output_mode: "files" for one object per source file, "bulk" to append
+                all documents as lines to rolling NDJSON parts in
+                TARGET_FOLDER/<batch_id>/ (see NdjsonPartWriter)
+            batch_id: Name of the bulk output and export folder and of the batch
+                log (see LogSink), "batch-<uuid>" if omitted
+            export_parquet: Also export all locations to Parquet files in
+                TARGET_FOLDER/<batch_id>/, one column per mapped target path
+                (see ParquetPartWriter)
             
         Returns:
-            List of processing results
+            List of processing results (skipped sources are not included)
         """
-        results = []
-        files = self.storage_service.list_files(source_folder)
-        xml_files = [f for f in files if f.endswith('.xml')]
+        if packet_mode is not None and packet_mode not in PACKET_MODES:
+            raise ValueError(f"Unknown packet mode: {packet_mode}")
+        if incremental and self.manifest_store is None:
+            raise ValueError("Incremental batches need a manifest store")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode: {output_mode}")
         
-        logger.info(f"Starting batch processing of {len(xml_files)} XML files")
+        storage = self.async_storage_service
+        config_path = await storage.run(self.plan_store.resolve, config_path)
+        version = None
+        if incremental or self.dedup_index is not None:
+            version = await storage.run(self._plan_version, config_path, template_path, packet_mode)
+        plan = await storage.run(self._load_plan, config_path)
+        template = await storage.run(self._load_template, template_path)
         
-        # Process files in chunks to limit concurrency
-        for i in range(0, len(xml_files), settings.BATCH_SIZE):
-            batch = xml_files[i:i+settings.BATCH_SIZE]
-            tasks = []
-            
-            for file_path in batch:
-                task = asyncio.create_task(
-                    self.process_file(file_path, config_path, template_path)
-                )
-                tasks.append((file_path, task))
+        logger.info(f"Starting {'incremental ' if incremental else ''}batch processing of {source_folder} with {config_path}")
+        
+        batch_id = batch_id or f"batch-{uuid.uuid4()}"
+        batch_folder = f"{settings.TARGET_FOLDER}/{batch_id}"
+        bulk_writer = None
+        if output_mode == "bulk":
+            bulk_writer = NdjsonPartWriter(
+                self.storage_service, batch_folder, content_encoding=settings.TARGET_COMPRESSION
+            )
+        parquet_writer = None
+        if export_parquet:
+            parquet_writer = ParquetPartWriter(self.storage_service, batch_folder, export_columns(plan))
+        
+        pipeline = BatchPipeline(
+            self, plan, template, packet_mode, on_result,
+            manifest_store=self.manifest_store if incremental else None,
+            dedup_index=self.dedup_index,
+            version=version,
+            bulk_writer=bulk_writer,
+            parquet_writer=parquet_writer,
+            log_sink=LogSink(self.storage_service, batch_id)
+        )
+        try:
+            results = await pipeline.run(source_folder)
+        except BaseException:
+            # Writes the remaining log records; a storage error must not replace the batch's own
+            try:
+                await storage.run(pipeline.log_sink.close)
+            except Exception as e:
+                logger.error(f"Failed to close log of batch {batch_id}: {e}")
+            raise
+        await storage.run(pipeline.log_sink.close)
+        
+        logger.info(f"Batch processing completed: {len(results)} files processed, {pipeline.skipped} unchanged files skipped")
+        if on_skipped is not None:
+            await self.async_storage_service.run(on_skipped, pipeline.skipped)
+        return results
+    
+    def _plan_version(self, config_path: str, template_path: str, packet_mode: Optional[str] = None) -> str:
+        """
+        Identify the mapping, template and output options a batch runs with.
+        
+        Args:
+            config_path: Path to mapping configuration, or a pinned "path@version"
+            template_path: Path to BYDM template
+            packet_mode: None, or one of PACKET_MODES
             
-            # Wait for all tasks in this batch to complete
-            for file_path, task in tasks:
-                try:
-                    output_path, log_path = await task
-                    results.append({
-                        "source_file": file_path,
-                        "status": "success",
-                        "output_file": output_path,
-                        "log_file": log_path
-                    })
-                except Exception as e:
-                    logger.error(f"Failed to process {file_path}: {e}")
-                    results.append({
-                        "source_file": file_path,
-                        "status": "failed",
-                        "error": str(e)
-                    })
-        
-        logger.info(f"Batch processing completed: {len(results)} files processed")
-        return results
\ No newline at end of file
+        Returns:
+            Short hash that changes whenever the outputs would change
+        """
+        # A pinned version is a content hash already
+        pinned = split_config_ref(config_path)[1] is not None
+        parts = (
+            config_path, None if pinned else self.storage_service.stat_file(config_path).etag,
+            template_path, self.storage_service.stat_file(template_path).etag,
+            packet_mode, settings.TARGET_COMPRESSION, settings.JSON_COMPACT
+        )
+        return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,172 @@
+import multiprocessing
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.columnar_export import ExportColumn, flatten_document
+from app.services.dedup_service import DedupFilter, DedupIndex
+from app.utils.json_stream import encode_json
+from app.utils.mapping_compiler import MappingPlan
+from app.utils.template_factory import TemplateFactory
+
+# Batch contexts a worker keeps loaded, so overlapping batches don't reload theirs per file
+CONTEXT_CACHE_SIZE = 4
+
+_service = None
+_contexts: "OrderedDict[str, BatchContext]" = OrderedDict()
+_dedup_indexes: Dict[str, DedupIndex] = {}
+
+
+class BatchContext(NamedTuple):
+    """What the workers need to know about a batch besides its sources."""
+    plan: MappingPlan
+    template: TemplateFactory
+    # Fingerprint database, opened read-only for lookups
+    dedup_db_path: Optional[str] = None
+    # Columns to flatten documents into for a Parquet export
+    export_columns: Optional[Tuple[ExportColumn, ...]] = None
+
+
+def write_context(context: BatchContext) -> str:
+    """
+    Write a batch context to a temporary file for the workers to load.
+
+    Args:
+        context: Plan, template and options of the batch
+
+    Returns:
+        Path of the context file; the caller removes it after the batch
+    """
+    fd, path = tempfile.mkstemp(prefix="batch-", suffix=".context")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(context, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def init_worker() -> None:
+    """
+    Initialize a worker process.
+
+    Used as ProcessPoolExecutor initializer. Batches are not known yet: a
+    worker loads a batch's context from its file on the first source of
+    that batch it transforms.
+    """
+    global _service
+    # Imported here, transform_service imports this module
+    from app.services.transform_service import TransformService
+
+    _service = TransformService(storage_service=None)
+
+
+def _load_context(context_path: str) -> BatchContext:
+    """Get a batch context, loading it on first use (least recently used ones are dropped)."""
+    context = _contexts.get(context_path)
+    if context is not None:
+        _contexts.move_to_end(context_path)
+        return context
+    # Written by write_context in the parent process, not external input
+    with open(context_path, "rb") as f:
+        context = pickle.load(f)
+    _contexts[context_path] = context
+    if len(_contexts) > CONTEXT_CACHE_SIZE:
+        _contexts.popitem(last=False)
+    return context
+
+
+def _dedup_index(db_path: str) -> DedupIndex:
+    """Read-only fingerprint index of a database, opened once per worker."""
+    index = _dedup_indexes.get(db_path)
+    if index is None:
+        index = _dedup_indexes[db_path] = DedupIndex(db_path, read_only=True)
+    return index
+
+
+class TransformPool:
+    """
+    Application-wide process pool for batch transforms.
+
+    MAX_WORKERS workers are started once, with the WORKER_START_METHOD start
+    method ("forkserver" where available, "spawn" otherwise) so they never
+    inherit the server's threads, sockets or open databases, and are shared
+    by all batches until close().
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Start the pool.
+
+        Args:
+            max_workers: Number of worker processes, MAX_WORKERS if omitted
+        """
+        self.max_workers = max_workers or settings.MAX_WORKERS
+        start_method = settings.WORKER_START_METHOD
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = "spawn"
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a server that imported the transform code once
+            self._context.set_forkserver_preload([__name__])
+        self.executor = self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=self._context, initializer=init_worker
+        )
+
+    def replace_broken(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Replace the executor after one of its workers died.
+
+        A broken ProcessPoolExecutor fails every later task, so a crashed
+        worker would otherwise fail all batches until a restart.
+
+        Args:
+            executor: The executor that raised BrokenProcessPool
+        """
+        if executor is self.executor:
+            self.executor = self._create_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """Stop the workers."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def transform_to_json(context_path: str, xml_data: bytes, packet_mode: Optional[str] = None,
+                      dedup_version: Optional[str] = None,
+                      lines: bool = False) -> Tuple[List[bytes], Optional[DedupFilter], Optional[List[tuple]]]:
+    """
+    Transform one source XML into encoded BYDM output objects.
+
+    Args:
+        context_path: Context file of the batch, from write_context
+        xml_data: Source XML content
+        packet_mode: None, or one of PACKET_MODES
+        dedup_version: Plan version to fingerprint IDocs under, None to keep duplicates
+        lines: Encode each document as one compact JSON line (for bulk output)
+            instead of each output object per JSON_COMPACT
+
+    Returns:
+        Tuple of (encoded JSON output objects or lines, dedup filter with the
+        new fingerprints and the previous outputs of dropped IDocs, export
+        rows or None without export columns)
+    """
+    context = _load_context(context_path)
+    dedup = None
+    if dedup_version is not None and context.dedup_db_path is not None:
+        dedup = DedupFilter(_dedup_index(context.dedup_db_path), dedup_version)
+    outputs = _service.transform_documents(xml_data, context.plan, context.template, packet_mode, dedup)
+    rows = None
+    if context.export_columns is not None:
+        outputs = list(outputs)
+        rows = [
+            row for output in outputs for document in output
+            for row in flatten_document(document, context.export_columns)
+        ]
+    if lines:
+        return [encode_json(document, compact=True) for output in outputs for document in output], dedup, rows
+    return [encode_json(output) for output in outputs], dedup, rows
@@ -0,0 +1,180 @@
+import gzip
+import io
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+# Content-Encoding -> object name suffix
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Bytes decompressed per read when the output size is limited
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+class DecompressedSizeError(ValueError):
+    """Raised when data decompresses to more than the allowed size."""
+
+
+def detect_compression(file_path: str, content_encoding: Optional[str] = None) -> Optional[str]:
+    """
+    Detect how an object is compressed.
+
+    Args:
+        file_path: Object name
+        content_encoding: Content-Encoding header of the object, if known
+
+    Returns:
+        "gzip", "zstd", or None for uncompressed objects
+    """
+    if content_encoding:
+        encoding = content_encoding.strip().lower()
+        if encoding in COMPRESSION_SUFFIXES:
+            return encoding
+    for encoding, suffix in COMPRESSION_SUFFIXES.items():
+        if file_path.endswith(suffix):
+            return encoding
+    return None
+
+
+def compression_suffix(encoding: Optional[str]) -> str:
+    """
+    Get the object name suffix for a compression.
+
+    Args:
+        encoding: "gzip", "zstd", or None
+
+    Returns:
+        Suffix (e.g., ".gz"), empty for None
+
+    Raises:
+        ValueError: If the compression is unknown
+    """
+    if not encoding:
+        return ""
+    if encoding not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression: {encoding}")
+    return COMPRESSION_SUFFIXES[encoding]
+
+
+def strip_compression_suffix(file_path: str) -> str:
+    """Remove a compression suffix (.gz, .zst) from an object name."""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if file_path.endswith(suffix):
+            return file_path[:-len(suffix)]
+    return file_path
+
+
+def with_compression_suffixes(suffix: str) -> Tuple[str, ...]:
+    """
+    Get a file suffix together with its compressed variants.
+
+    Args:
+        suffix: Suffix of uncompressed files (e.g., ".xml")
+
+    Returns:
+        Tuple of suffixes (e.g., (".xml", ".xml.gz", ".xml.zst"))
+    """
+    return (suffix,) + tuple(suffix + compressed for compressed in COMPRESSION_SUFFIXES.values())
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ValueError("zstd compression requires the 'zstandard' package")
+    return zstandard
+
+
+def decompress_stream(stream: BinaryIO, encoding: str) -> BinaryIO:
+    """
+    Wrap a compressed stream so that reads return decompressed data.
+
+    Args:
+        stream: Readable binary stream of compressed data
+        encoding: "gzip" or "zstd"
+
+    Returns:
+        Readable binary stream of decompressed data
+    """
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if encoding == "zstd":
+        return _require_zstandard().ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    raise ValueError(f"Unknown compression: {encoding}")
+
+
+def decompress(data: bytes, encoding: str, max_size: Optional[int] = None) -> bytes:
+    """
+    Decompress data.
+
+    Args:
+        data: Compressed data
+        encoding: "gzip" or "zstd"
+        max_size: Largest decompressed size accepted, unlimited if omitted
+
+    Returns:
+        Decompressed data
+
+    Raises:
+        DecompressedSizeError: If the data decompresses to more than max_size bytes
+    """
+    if max_size is None and encoding == "gzip":
+        return gzip.decompress(data)
+    with decompress_stream(io.BytesIO(data), encoding) as stream:
+        if max_size is None:
+            return stream.read()
+        # Read in steps, so a small payload cannot inflate beyond the limit
+        chunks = []
+        size = 0
+        while True:
+            chunk = stream.read(min(DECOMPRESS_CHUNK_SIZE, max_size - size + 1))
+            if not chunk:
+                return b"".join(chunks)
+            size += len(chunk)
+            if size > max_size:
+                raise DecompressedSizeError(f"Data decompresses to more than {max_size} bytes")
+            chunks.append(chunk)
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str,
+                    level: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Compress data produced in chunks, without holding it as a whole.
+
+    Args:
+        chunks: Uncompressed data in chunks
+        encoding: "gzip" or "zstd"
+        level: Compression level, the codec's default if omitted
+
+    Yields:
+        Compressed data in chunks
+    """
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+    elif encoding == "zstd":
+        compressor = _require_zstandard().ZstdCompressor(level=3 if level is None else level).compressobj()
+    else:
+        raise ValueError(f"Unknown compression: {encoding}")
+
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    Compress data.
+
+    Args:
+        data: Uncompressed data
+        encoding: "gzip" or "zstd"
+        level: Compression level, the codec's default if omitted
+
+    Returns:
+        Compressed data
+    """
+    return b"".join(compress_chunks((data,), encoding, level))
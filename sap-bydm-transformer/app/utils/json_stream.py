@@ -0,0 +1,125 @@
+import hashlib
+import io
+import json
+from typing import Any, Iterable, Iterator, Optional
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+# Containers nested deeper than this are encoded in one call when orjson is used
+ORJSON_STREAM_DEPTH = 3
+
+
+def _is_compact(compact: Optional[bool]) -> bool:
+    return settings.JSON_COMPACT if compact is None else compact
+
+
+def encode_json(data: Any, compact: Optional[bool] = None) -> bytes:
+    """
+    Serialize data in one piece, the way save_json stores it.
+
+    Args:
+        data: JSON-serializable data
+        compact: Omit indentation and spaces, JSON_COMPACT if omitted
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    compact = _is_compact(compact)
+    if orjson is not None:
+        return orjson.dumps(data) if compact else orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    if compact:
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def content_sha256(data: Any) -> str:
+    """
+    Hash JSON data by content.
+
+    Args:
+        data: JSON-serializable data
+
+    Returns:
+        SHA-256 hex digest of the canonical (sorted, compact) encoding,
+        equal for equal data whatever its key order
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def _iter_orjson(value: Any, depth: int = 0) -> Iterator[bytes]:
+    """Encode compact JSON with orjson, streaming the outer containers."""
+    if depth >= ORJSON_STREAM_DEPTH or not isinstance(value, (dict, list)) or not value:
+        yield orjson.dumps(value)
+    elif isinstance(value, list):
+        yield b"["
+        for index, item in enumerate(value):
+            if index:
+                yield b","
+            yield from _iter_orjson(item, depth + 1)
+        yield b"]"
+    else:
+        yield b"{"
+        for index, (key, item) in enumerate(value.items()):
+            yield (b"," if index else b"") + orjson.dumps(key) + b":"
+            yield from _iter_orjson(item, depth + 1)
+        yield b"}"
+
+
+def iter_json_chunks(data: Any, compact: Optional[bool] = None,
+                     chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Serialize data incrementally, without building the whole document.
+
+    Args:
+        data: JSON-serializable data
+        compact: Omit indentation and spaces, JSON_COMPACT if omitted
+        chunk_size: Approximate size of the yielded chunks
+
+    Yields:
+        UTF-8 encoded pieces of the JSON document
+    """
+    if orjson is not None and _is_compact(compact):
+        pieces = _iter_orjson(data)
+    else:
+        if _is_compact(compact):
+            encoder = json.JSONEncoder(separators=(",", ":"))
+        else:
+            encoder = json.JSONEncoder(indent=2)
+        pieces = (piece.encode("utf-8") for piece in encoder.iterencode(data))
+
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterable of byte chunks (for put_object)."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._chunk = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            try:
+                self._chunk = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
@@ -0,0 +1,358 @@
+import io
+import logging
+import pickle
+from typing import Dict, Any, Callable, NamedTuple, Optional, Tuple, Union
+
+from app.utils.xml_parser import IDOC_TAG
+
+logger = logging.getLogger("app")
+
+PathKey = Union[str, int]
+
+
+class MapTransformer:
+    """Value lookup for a MAP transformation, with keys pre-stringified."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Dict[Any, Any]):
+        self.values = {str(key): value for key, value in values.items()}
+
+    def __call__(self, value: Any) -> Any:
+        return self.values.get(str(value), value)
+
+
+class CompiledField(NamedTuple):
+    """A single mapping rule, or a nested group when ``nested`` is set."""
+    name: str
+    path: Tuple[PathKey, ...]
+    default_value: Any
+    transform: Optional[Callable[[Any], Any]]
+    validate: Optional[Callable[[Any, str], Any]]
+    nested: Optional["CompiledSegment"]
+
+
+class CompiledSegment(NamedTuple):
+    """Ordered mapping rules for one segment."""
+    name: str
+    fields: Tuple[CompiledField, ...]
+
+
+class MappingPlan(NamedTuple):
+    """Immutable, ready-to-run form of a mapping configuration."""
+    segments: Tuple[Tuple[Tuple[str, ...], CompiledSegment], ...]
+    # Top-level segment tag -> (path below that segment, compiled rules),
+    # used when segments are streamed one at a time
+    by_segment: Dict[str, Tuple[Tuple[Tuple[str, ...], CompiledSegment], ...]]
+
+
+def split_segment_path(source: str) -> Tuple[str, ...]:
+    """
+    Split a dotted segment or source path, relative to the IDOC element.
+
+    Paths may be given from the IDOC element ("IDOC.E1KNA1M") or bare
+    ("E1KNA1M"); both name the same segment. A path of only the IDOC
+    element names no segment and comes back empty.
+
+    Args:
+        source: Segment path, optionally followed by field names
+
+    Returns:
+        Path parts below the IDOC element
+    """
+    parts = tuple(source.split('.'))
+    if IDOC_TAG in parts:
+        parts = parts[parts.index(IDOC_TAG) + 1:]
+    return parts
+
+
+def split_target_path(target: str) -> Tuple[PathKey, ...]:
+    """
+    Split a dotted target path, converting array indices to integers.
+
+    Args:
+        target: Nested key path (e.g., "a.b.0.c")
+
+    Returns:
+        Tuple of dictionary keys and list indices
+    """
+    return tuple(int(key) if key.isdigit() else key for key in target.split("."))
+
+
+def validate_number(value: Any, field_name: str) -> Optional[str]:
+    """Validate that a value is a (decimal) number."""
+    if value is None or value == "":
+        return None
+    value = str(value).strip()
+    if not value.replace('.', '', 1).isdigit():
+        logger.warning(f"Validation failed for {field_name}: Expected NUMBER, got '{value}'")
+        return None
+    return value
+
+
+def validate_text(value: Any, field_name: str) -> Optional[str]:
+    """Validate that a value is a non-empty text."""
+    if value is None or value == "":
+        return None
+    value = str(value).strip()
+    if not value:
+        logger.warning(f"Validation failed for {field_name}: Expected TEXT, got empty string")
+        return None
+    return value
+
+
+def validate_any(value: Any, field_name: str) -> Optional[str]:
+    """Normalize a value for rules without a dedicated validator."""
+    if value is None or value == "":
+        return None
+    return str(value).strip()
+
+
+VALIDATORS = {
+    "NUMBER": validate_number,
+    "TEXT": validate_text,
+}
+
+
+def resolve_validator(validation_rule: Any) -> Optional[Callable[[Any, str], Any]]:
+    """
+    Resolve a validation rule name to its validator function.
+
+    Args:
+        validation_rule: Type of validation to apply
+
+    Returns:
+        Validator callable, or None if no validation is configured
+    """
+    if not validation_rule:
+        return None
+    return VALIDATORS.get(str(validation_rule).upper(), validate_any)
+
+
+def resolve_transformer(transformation: Any) -> Optional[Callable[[Any], Any]]:
+    """
+    Resolve a transformation rule to a callable.
+
+    Args:
+        transformation: Transformation rule from the mapping configuration
+
+    Returns:
+        Transformer callable, or None if the rule is a no-op
+    """
+    if not transformation or not isinstance(transformation, dict):
+        return None
+    if transformation.get("type") == "MAP":
+        return MapTransformer(transformation.get("values", {}))
+    return None
+
+
+def compile_segment(name: str, segment_mapping: Dict[str, Any]) -> CompiledSegment:
+    """
+    Compile the mapping rules of one segment.
+
+    Args:
+        name: Segment (or nested group) name
+        segment_mapping: Mapping rules for the segment
+
+    Returns:
+        CompiledSegment with rules in configuration order
+    """
+    fields = []
+    for field_name, field_mapping in segment_mapping.items():
+        if not isinstance(field_mapping, dict):
+            continue
+        if "target" in field_mapping:
+            fields.append(CompiledField(
+                name=field_name,
+                path=split_target_path(field_mapping["target"]),
+                default_value=field_mapping.get("default_value", ""),
+                transform=resolve_transformer(field_mapping.get("transformation")),
+                validate=resolve_validator(field_mapping.get("validation")),
+                nested=None
+            ))
+        else:
+            fields.append(CompiledField(
+                name=field_name,
+                path=(),
+                default_value=None,
+                transform=None,
+                validate=None,
+                nested=compile_segment(field_name, field_mapping)
+            ))
+    return CompiledSegment(name=name, fields=tuple(fields))
+
+
+def compile_mapping(config: Dict[str, Any]) -> MappingPlan:
+    """
+    Compile a mapping configuration into an immutable execution plan.
+
+    Args:
+        config: Mapping configuration (``{"mappings": {...}}``)
+
+    Returns:
+        MappingPlan ready to be run by ``run_segment``
+    """
+    segments = []
+    for segment_name, segment_mapping in config.get("mappings", {}).items():
+        if not isinstance(segment_mapping, dict):
+            continue
+        segment_path = split_segment_path(segment_name)
+        if not segment_path:
+            logger.warning(f"Mapping segment {segment_name} names no segment below {IDOC_TAG}, skipped")
+            continue
+        segments.append((segment_path, compile_segment(segment_name, segment_mapping)))
+    segments = tuple(segments)
+    
+    by_segment: Dict[str, list] = {}
+    for segment_path, segment_plan in segments:
+        by_segment.setdefault(segment_path[0], []).append((segment_path[1:], segment_plan))
+    
+    logger.debug(f"Compiled mapping plan with {len(segments)} segments")
+    return MappingPlan(
+        segments=segments,
+        by_segment={name: tuple(entries) for name, entries in by_segment.items()}
+    )
+
+
+# Globals a plan artifact may reference; anything else is refused on load
+PLAN_GLOBALS = frozenset({
+    "MappingPlan", "CompiledSegment", "CompiledField", "MapTransformer",
+    "validate_number", "validate_text", "validate_any",
+})
+
+
+class _PlanUnpickler(pickle.Unpickler):
+    """Unpickler restricted to the classes and validators of a compiled plan."""
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == __name__ and name in PLAN_GLOBALS:
+            return globals()[name]
+        raise pickle.UnpicklingError(f"Plan artifact references forbidden global {module}.{name}")
+
+
+def dump_plan(plan: MappingPlan) -> bytes:
+    """
+    Serialize a compiled plan into a compact artifact.
+
+    Args:
+        plan: Compiled mapping plan
+
+    Returns:
+        Pickled plan, loadable with ``load_plan``
+    """
+    return pickle.dumps(plan, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_plan(data: bytes) -> MappingPlan:
+    """
+    Load a plan serialized by ``dump_plan``, without compiling it again.
+
+    Only the plan classes and validators of this module can be referenced,
+    so an artifact cannot execute other code when loaded.
+
+    Args:
+        data: Serialized plan
+
+    Returns:
+        Compiled mapping plan
+
+    Raises:
+        ValueError: If the data is not a plan artifact
+    """
+    try:
+        plan = _PlanUnpickler(io.BytesIO(data)).load()
+    except (pickle.UnpicklingError, EOFError, AttributeError, TypeError) as e:
+        raise ValueError(f"Invalid plan artifact: {e}")
+    if not isinstance(plan, MappingPlan):
+        raise ValueError(f"Invalid plan artifact: {type(plan).__name__}")
+    return plan
+
+
+def set_path_value(json_obj: Any, path: Tuple[PathKey, ...], value: Any) -> None:
+    """
+    Set a value in a nested JSON structure using a pre-split path.
+
+    Args:
+        json_obj: JSON object to modify
+        path: Path as returned by ``split_target_path``
+        value: Value to set
+    """
+    temp = json_obj
+    parent = None
+    last = len(path) - 1
+
+    # Navigate to the correct position
+    for i in range(last):
+        key = path[i]
+        if key.__class__ is int and parent is not None and not isinstance(temp, list):
+            # An object holds the place of an array: replace it with a list
+            # under the key its parent stores it at
+            temp = [{} for _ in range(key + 1)]
+            parent[path[i - 1]] = temp
+        if key.__class__ is int and isinstance(temp, list):
+            # Ensure array has enough elements
+            while len(temp) <= key:
+                temp.append({})
+            parent, temp = temp, temp[key]
+        else:
+            # At the root an index can only name an object member
+            if key.__class__ is int:
+                key = str(key)
+            child = temp.get(key)
+            if child is None or not isinstance(child, (dict, list)):
+                # Next key decides whether an array or a dict is created
+                child = [] if path[i + 1].__class__ is int else {}
+                temp[key] = child
+            parent, temp = temp, child
+
+    # Set the value at the final position
+    last_key = path[last]
+    if last_key.__class__ is int:
+        if isinstance(temp, list):
+            while len(temp) <= last_key:
+                temp.append(None)
+            temp[last_key] = value
+    else:
+        temp[last_key] = value
+
+
+def run_segment(segment_plan: CompiledSegment, segment: Dict[str, Any],
+                output_json: Dict[str, Any]) -> None:
+    """
+    Apply the compiled rules of one segment to a segment instance.
+
+    Args:
+        segment_plan: Compiled rules for the segment
+        segment: Segment dictionary
+        output_json: Output JSON being constructed
+    """
+    for field in segment_plan.fields:
+        if field.nested is not None:
+            nested_segment = segment.get(field.name)
+            if not nested_segment:
+                continue
+            if isinstance(nested_segment, list):
+                for instance in nested_segment:
+                    if isinstance(instance, dict):
+                        run_segment(field.nested, instance, output_json)
+            elif isinstance(nested_segment, dict):
+                run_segment(field.nested, nested_segment, output_json)
+            continue
+
+        field_value = segment.get(field.name, "")
+
+        # Handle special case where value is in '#text' property (common in xmltodict output)
+        if isinstance(field_value, dict) and '#text' in field_value:
+            field_value = field_value['#text']
+
+        if not field_value and field_value != 0:
+            field_value = field.default_value
+
+        if field.transform is not None and field_value:
+            field_value = field.transform(field_value)
+
+        if field.validate is not None:
+            field_value = field.validate(field_value, field.name)
+
+        if field_value is not None:
+            set_path_value(output_json, field.path, field_value)
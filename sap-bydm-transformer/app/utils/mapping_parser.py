@@ -1,7 +1,10 @@
 import pandas as pd
+import openpyxl
 import io
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, BinaryIO, List, NamedTuple, Optional, Tuple, Union
+
+from app.utils.mapping_compiler import VALIDATORS, split_segment_path, split_target_path
 
 logger = logging.getLogger("app")
 
@@ -13,21 +16,70 @@ COL_DEFAULT_VALUE = "Default Value"
 COL_TARGET_DATA_TYPE = "Target Data Type"
 COL_IS_MANDATORY = "Is Mandatory (Target)"
 
-def load_mapping_from_excel(excel_data: bytes, sheet_name: str = "Data Mapping") -> List[Dict[str, Any]]:
+# Columns read from the sheet; all others are skipped
+MAPPING_COLUMNS = (COL_BYDM_TARGET_PATH, COL_SAP_XPATH, COL_TRANSFORMATION_RULE,
+                   COL_DEFAULT_VALUE, COL_TARGET_DATA_TYPE, COL_IS_MANDATORY)
+
+# "Is Mandatory" cell values that mean yes
+MANDATORY_VALUES = ('Y', 'YES', 'TRUE', '1')
+
+def _read_mapping_sheet(excel_data: Union[bytes, str, BinaryIO], sheet_name: str) -> pd.DataFrame:
+    """
+    Read the mapping columns of one sheet into a DataFrame.
+    
+    The workbook is opened in openpyxl's read-only (streaming) mode, so other
+    sheets are never parsed, and only the column range holding mapping
+    columns is read from each row.
+    
+    Args:
+        excel_data: Excel file content as bytes, a file path or a binary file
+        sheet_name: Name of the sheet containing mapping rules
+        
+    Returns:
+        DataFrame with the mapping columns present in the sheet (object dtype)
+    """
+    if isinstance(excel_data, bytes):
+        excel_data = io.BytesIO(excel_data)
+    workbook = openpyxl.load_workbook(excel_data, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        sheet = workbook[sheet_name]
+        
+        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        positions = {}
+        for position, name in enumerate(header):
+            if isinstance(name, str) and name in MAPPING_COLUMNS and name not in positions:
+                positions[name] = position
+        if not positions:
+            return pd.DataFrame(columns=[])
+        
+        first, last = min(positions.values()), max(positions.values())
+        rows = sheet.iter_rows(min_row=2, min_col=first + 1, max_col=last + 1, values_only=True)
+        offsets = {name: position - first for name, position in positions.items()}
+        values = {name: [] for name in offsets}
+        for row in rows:
+            for name, offset in offsets.items():
+                values[name].append(row[offset] if offset < len(row) else None)
+        return pd.DataFrame(values, dtype=object)
+    finally:
+        workbook.close()
+
+def load_mapping_from_excel(excel_data: Union[bytes, str, BinaryIO],
+                            sheet_name: str = "Data Mapping") -> List[Dict[str, Any]]:
     """
     Parse Excel mapping sheet to mapping rules.
     
     Args:
-        excel_data: Excel file content as bytes
+        excel_data: Excel file content as bytes, a binary file or the path of
+            a spooled workbook (files are read without loading them whole)
         sheet_name: Name of the sheet containing mapping rules
         
     Returns:
         List of dictionaries, each representing a mapping rule
     """
     try:
-        # Load Excel into pandas DataFrame
-        excel_file = io.BytesIO(excel_data)
-        df = pd.read_excel(excel_file, sheet_name=sheet_name, dtype=object)
+        df = _read_mapping_sheet(excel_data, sheet_name)
         
         # Check if required columns exist
         required_columns = [COL_BYDM_TARGET_PATH, COL_SAP_XPATH]
@@ -37,37 +89,25 @@ def load_mapping_from_excel(excel_data: bytes, sheet_name: str = "Data Mapping")
             logger.error(error_msg)
             raise ValueError(error_msg)
         
-        # Process DataFrame to extract mapping rules
-        mapping_rules = []
-        for _, row in df.iterrows():
-            target_path = row.get(COL_BYDM_TARGET_PATH)
-            source_path = row.get(COL_SAP_XPATH)
-            
-            # Skip rows without target or source path
-            if pd.isna(target_path) or pd.isna(source_path):
-                continue
-            
-            # Create mapping rule
-            rule = {
-                'target': target_path.strip(),
-                'source': source_path.strip(),
-                'transformation': row.get(COL_TRANSFORMATION_RULE, ''),
-                'default_value': row.get(COL_DEFAULT_VALUE, ''),
-                'validation': row.get(COL_TARGET_DATA_TYPE, 'TEXT'),
-                'is_mandatory': str(row.get(COL_IS_MANDATORY, 'N')).upper() in ('Y', 'YES', 'TRUE', '1')
-            }
-            
-            # Handle NaN values
-            for key in rule:
-                if pd.isna(rule[key]):
-                    if key in ['transformation', 'default_value']:
-                        rule[key] = ''
-                    elif key == 'validation':
-                        rule[key] = 'TEXT'
-                    elif key == 'is_mandatory':
-                        rule[key] = False
-            
-            mapping_rules.append(rule)
+        # Skip rows without target or source path
+        df = df[df[COL_BYDM_TARGET_PATH].notna() & df[COL_SAP_XPATH].notna()]
+        
+        def optional_column(column: str, default: Any) -> pd.Series:
+            # Missing columns and empty cells get the default
+            if column not in df.columns:
+                return pd.Series(default, index=df.index, dtype=object)
+            return df[column].where(df[column].notna(), default)
+        
+        rules = pd.DataFrame({
+            'target': df[COL_BYDM_TARGET_PATH].astype(str).str.strip(),
+            'source': df[COL_SAP_XPATH].astype(str).str.strip(),
+            'transformation': optional_column(COL_TRANSFORMATION_RULE, ''),
+            'default_value': optional_column(COL_DEFAULT_VALUE, ''),
+            'validation': optional_column(COL_TARGET_DATA_TYPE, 'TEXT'),
+            'is_mandatory': optional_column(COL_IS_MANDATORY, 'N').astype(str).str.strip().str.upper()
+                            .isin(MANDATORY_VALUES)
+        })
+        mapping_rules = rules.to_dict('records')
         
         logger.info(f"Loaded {len(mapping_rules)} mapping rules from Excel")
         return mapping_rules
@@ -114,8 +154,8 @@ def convert_mapping_to_json(mapping_rules: List[Dict[str, Any]]) -> Dict[str, An
     mapping_json = {"mappings": {}}
     
     for rule in mapping_rules:
-        # Extract segment name from source path
-        source_parts = rule['source'].split('.')
+        # Extract segment name from source path (relative to the IDOC element)
+        source_parts = list(split_segment_path(rule['source']))
         segment_name = source_parts[0] if source_parts else None
         
         if not segment_name:
@@ -163,4 +203,204 @@ def convert_mapping_to_json(mapping_rules: List[Dict[str, Any]]) -> Dict[str, An
             # Direct field in segment
             mapping_json["mappings"][segment_name][field_name] = mapping_rule
     
-    return mapping_json
\ No newline at end of file
+    return mapping_json
+
+class MappingIssue(NamedTuple):
+    """A problem found by analyze_mapping."""
+    severity: str
+    code: str
+    message: str
+
+class _TargetNode:
+    """Node of the target-path trie built by analyze_mapping."""
+    
+    __slots__ = ("children", "sources")
+    
+    def __init__(self):
+        self.children: Dict[Union[str, int], "_TargetNode"] = {}
+        self.sources: List[str] = []
+
+def mapping_rules_from_json(mapping_json: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Flatten a JSON mapping configuration back into mapping rules.
+    
+    Lets analyze_mapping check configurations that were not built from an
+    Excel sheet. Source collisions cannot be seen here any more, the JSON
+    structure already resolved them.
+    
+    Args:
+        mapping_json: Structured JSON mapping configuration
+        
+    Returns:
+        List of mapping rule dictionaries (only the keys the analyzer uses)
+    """
+    mapping_rules = []
+    
+    def collect(prefix: str, segment_mapping: Dict[str, Any]) -> None:
+        for field_name, field_mapping in segment_mapping.items():
+            if not isinstance(field_mapping, dict):
+                continue
+            if "target" in field_mapping:
+                mapping_rules.append({
+                    'target': field_mapping['target'],
+                    'source': f"{prefix}.{field_name}",
+                    'validation': field_mapping.get('validation', ''),
+                    'transformation': ''
+                })
+            else:
+                collect(f"{prefix}.{field_name}", field_mapping)
+    
+    for segment_name, segment_mapping in mapping_json.get("mappings", {}).items():
+        if isinstance(segment_mapping, dict):
+            collect(segment_name, segment_mapping)
+    return mapping_rules
+
+def _format_indices(indices: List[int]) -> str:
+    """Format sorted indices as ranges (e.g., "0-2, 5")."""
+    ranges = []
+    for index in indices:
+        if ranges and ranges[-1][1] == index - 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ", ".join(str(low) if low == high else f"{low}-{high}" for low, high in ranges)
+
+def _analyze_sources(mapping_rules: List[Dict[str, Any]], issues: List[MappingIssue]) -> None:
+    """Find rules that convert_mapping_to_json drops or overwrites."""
+    leaves: Dict[Tuple[str, ...], str] = {}
+    groups = set()
+    
+    for rule in mapping_rules:
+        source = rule['source']
+        # "IDOC.E1KNA1M.KUNNR" and "E1KNA1M.KUNNR" are the same source
+        parts = split_segment_path(source)
+        
+        if len(parts) < 2 or not all(parts):
+            issues.append(MappingIssue(
+                "error", "unreachable",
+                f"Source {source} does not name a segment and a field, the rule is never applied"
+            ))
+            continue
+        
+        if parts in leaves:
+            issues.append(MappingIssue(
+                "error", "source_collision",
+                f"Source {source} is mapped twice (to {leaves[parts]} and {rule['target']}), "
+                f"only the last rule would be kept"
+            ))
+            continue
+        if parts in groups:
+            issues.append(MappingIssue(
+                "error", "source_collision",
+                f"Source {source} is mapped as a field but also holds nested fields"
+            ))
+            continue
+        for length in range(2, len(parts)):
+            if parts[:length] in leaves:
+                issues.append(MappingIssue(
+                    "error", "source_collision",
+                    f"Source {source} is nested below the mapped field {'.'.join(parts[:length])}"
+                ))
+                break
+        else:
+            leaves[parts] = rule['target']
+            groups.update(parts[:length] for length in range(2, len(parts)))
+
+def _analyze_rule_options(mapping_rules: List[Dict[str, Any]], issues: List[MappingIssue]) -> None:
+    """Find validations and transformations that are silently ignored."""
+    for rule in mapping_rules:
+        validation = rule.get('validation')
+        if validation and str(validation).upper() not in VALIDATORS:
+            issues.append(MappingIssue(
+                "warning", "unknown_validation",
+                f"Validation {validation} of {rule['source']} is unknown, values are only trimmed"
+            ))
+        transformation = rule.get('transformation')
+        if transformation and not parse_transformation_rule(transformation):
+            issues.append(MappingIssue(
+                "warning", "empty_transformation",
+                f"Transformation rule of {rule['source']} has no 'key: value' lines and is ignored"
+            ))
+
+def _analyze_targets(mapping_rules: List[Dict[str, Any]], issues: List[MappingIssue]) -> None:
+    """Build the target-path trie and find conflicting or incomplete targets."""
+    root = _TargetNode()
+    
+    for rule in mapping_rules:
+        target = rule['target']
+        parts = target.split('.')
+        if not all(parts) or parts[0].isdigit():
+            issues.append(MappingIssue(
+                "error", "invalid_target",
+                f"Target {target} of {rule['source']} is not a valid path"
+            ))
+            continue
+        node = root
+        for key in split_target_path(target):
+            node = node.children.setdefault(key, _TargetNode())
+        node.sources.append(rule['source'])
+    
+    # Walk the trie; paths are kept as strings for the messages
+    stack = [(root, "")]
+    while stack:
+        node, path = stack.pop()
+        
+        if len(node.sources) > 1:
+            segments = [source.split('.')[0] for source in node.sources]
+            if len(set(segments)) < len(segments):
+                issues.append(MappingIssue(
+                    "error", "duplicate_target",
+                    f"Target {path} is written by {', '.join(node.sources)}"
+                ))
+            else:
+                # Across segments the last one found in the IDoc wins, a common fallback
+                issues.append(MappingIssue(
+                    "warning", "duplicate_target",
+                    f"Target {path} is written by {', '.join(node.sources)}, the last segment in the IDoc wins"
+                ))
+        if node.sources and node.children:
+            issues.append(MappingIssue(
+                "error", "target_conflict",
+                f"Target {path} is a value of {node.sources[0]} but also holds nested targets"
+            ))
+        
+        indices = sorted(key for key in node.children if isinstance(key, int))
+        if indices and len(indices) < len(node.children):
+            issues.append(MappingIssue(
+                "error", "target_conflict",
+                f"Target {path} is used both as an array and as an object"
+            ))
+        elif indices:
+            missing = sorted(set(range(indices[-1] + 1)) - set(indices))
+            if missing:
+                issues.append(MappingIssue(
+                    "error", "index_gap",
+                    f"Target {path}.{indices[-1]} is mapped without {path}.{_format_indices(missing)}"
+                ))
+        
+        for key, child in node.children.items():
+            stack.append((child, f"{path}.{key}" if path else str(key)))
+
+def analyze_mapping(mapping_rules: List[Dict[str, Any]]) -> List[MappingIssue]:
+    """
+    Statically check mapping rules before they are converted and compiled.
+    
+    Detects rules the transform would silently drop, overwrite or pad:
+    sources without a reachable segment, colliding source paths, several
+    rules of one segment writing one target, values that are also parents
+    of other targets, arrays mixed with objects and array indices with gaps
+    (e.g., location.3 without location.0-2). Targets written from several
+    segments, unknown validations and empty transformations are warnings.
+    
+    Args:
+        mapping_rules: Mapping rules as returned by load_mapping_from_excel
+        
+    Returns:
+        Issues found, errors first; rules with errors must not be used
+    """
+    issues: List[MappingIssue] = []
+    _analyze_sources(mapping_rules, issues)
+    _analyze_targets(mapping_rules, issues)
+    _analyze_rule_options(mapping_rules, issues)
+    issues.sort(key=lambda issue: issue.severity != "error")
+    return issues
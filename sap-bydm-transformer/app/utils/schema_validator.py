@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+from app.utils.json_stream import content_sha256
+
+try:
+    import fastjsonschema
+except ImportError:  # code-generated validators are optional, jsonschema is the fallback
+    fastjsonschema = None
+
+try:
+    import jsonschema
+except ImportError:
+    jsonschema = None
+
+# Compiled validators kept in memory, least recently used ones are dropped first
+MAX_CACHED_VALIDATORS = 32
+
+
+class SchemaValidationError(ValueError):
+    """Raised when a document does not match its JSON Schema."""
+
+    def __init__(self, message: str, path: Optional[List[Union[str, int]]] = None):
+        self.path = list(path or [])
+        location = ".".join(str(part) for part in self.path)
+        super().__init__(f"{location}: {message}" if location else message)
+
+
+def schema_hash(schema: Dict[str, Any]) -> str:
+    """
+    Compute the content hash identifying a schema.
+
+    Args:
+        schema: JSON Schema
+
+    Returns:
+        Hex digest, equal for equal schemas whatever their key order
+    """
+    return content_sha256(schema)
+
+
+class SchemaValidator:
+    """
+    Validator compiled once for one JSON Schema.
+
+    With fastjsonschema installed the schema is turned into generated Python
+    code; otherwise the jsonschema validator class for the schema's draft is
+    built once, after checking the schema itself.
+    """
+
+    def __init__(self, schema: Dict[str, Any]):
+        """
+        Compile a schema.
+
+        Args:
+            schema: JSON Schema
+
+        Raises:
+            ValueError: If the schema itself is invalid
+            ImportError: If neither fastjsonschema nor jsonschema is installed
+        """
+        self.schema_hash = schema_hash(schema)
+        if fastjsonschema is not None:
+            self.engine = "fastjsonschema"
+            try:
+                self._validate = fastjsonschema.compile(schema)
+            except fastjsonschema.JsonSchemaDefinitionException as e:
+                raise ValueError(f"Invalid JSON Schema: {e}") from e
+        elif jsonschema is not None:
+            self.engine = "jsonschema"
+            validator_class = jsonschema.validators.validator_for(schema)
+            try:
+                validator_class.check_schema(schema)
+            except jsonschema.SchemaError as e:
+                raise ValueError(f"Invalid JSON Schema: {e.message}") from e
+            self._validator = validator_class(schema)
+        else:
+            raise ImportError("Schema validation needs fastjsonschema or jsonschema installed")
+
+    def validate(self, instance: Any) -> None:
+        """
+        Validate a document.
+
+        Args:
+            instance: Document to validate
+
+        Raises:
+            SchemaValidationError: With the first violation found
+        """
+        if self.engine == "fastjsonschema":
+            try:
+                self._validate(instance)
+            except fastjsonschema.JsonSchemaValueException as e:
+                # Names and paths start with "data", the placeholder for the document itself
+                message = e.message[len(e.name):].lstrip() if e.message.startswith(e.name) else e.message
+                raise SchemaValidationError(message, e.path[1:]) from e
+            return
+        error = next(self._validator.iter_errors(instance), None)
+        if error is not None:
+            raise SchemaValidationError(error.message, list(error.absolute_path))
+
+    def is_valid(self, instance: Any) -> bool:
+        """Check a document without raising."""
+        try:
+            self.validate(instance)
+        except SchemaValidationError:
+            return False
+        return True
+
+
+_validators: "OrderedDict[str, SchemaValidator]" = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def get_validator(schema: Dict[str, Any]) -> SchemaValidator:
+    """
+    Get the compiled validator of a schema, compiling it on first use.
+
+    Validators are cached by schema hash, so schemas loaded from different
+    paths or reloaded after an unrelated change share one compilation.
+
+    Args:
+        schema: JSON Schema
+
+    Returns:
+        Compiled validator
+    """
+    key = schema_hash(schema)
+    with _validators_lock:
+        validator = _validators.get(key)
+        if validator is not None:
+            _validators.move_to_end(key)
+            return validator
+        # Compiled under the lock so concurrent first uses compile once
+        validator = SchemaValidator(schema)
+        _validators[key] = validator
+        while len(_validators) > MAX_CACHED_VALIDATORS:
+            _validators.popitem(last=False)
+    return validator
@@ -1,10 +1,15 @@
 import xml.etree.ElementTree as ET
-from typing import Dict, Any, List, Optional
+from io import BytesIO
+from typing import Dict, Any, List, Optional, Sequence, Union, Iterator, Tuple, BinaryIO
 import xmltodict
+from lxml import etree
 import logging
 
 logger = logging.getLogger("app")
 
+# Tag of the element whose children are the IDoc segments
+IDOC_TAG = "IDOC"
+
 def parse_xml_to_dict(xml_data: bytes) -> Dict[str, Any]:
     """
     Parse XML data to a dictionary.
@@ -21,20 +26,21 @@ def parse_xml_to_dict(xml_data: bytes) -> Dict[str, Any]:
         logger.error(f"Failed to parse XML: {e}")
         raise ValueError(f"Invalid XML data: {e}")
 
-def extract_segments(xml_dict: Dict[str, Any], segment_path: str) -> List[Dict[str, Any]]:
+def extract_segments(xml_dict: Dict[str, Any], segment_path: Union[str, Sequence[str]]) -> List[Dict[str, Any]]:
     """
     Extract specific segments from XML dictionary.
     
     Args:
         xml_dict: Dictionary representation of XML
-        segment_path: Path to the segment in the XML structure (e.g., "IDOC.E1LOC")
+        segment_path: Path to the segment in the XML structure (e.g., "IDOC.E1LOC"),
+            or the path already split into its parts
         
     Returns:
         List of segment dictionaries
     """
     try:
         # Split the path and navigate the dictionary
-        path_parts = segment_path.split('.')
+        path_parts = segment_path.split('.') if isinstance(segment_path, str) else segment_path
         current = xml_dict
         
         for part in path_parts:
@@ -83,4 +89,127 @@ def get_field_value(segment: Dict[str, Any], field_path: str) -> Optional[str]:
         return str(current) if current is not None else None
     except Exception as e:
         logger.error(f"Error getting field value for path '{field_path}': {e}")
-        return None
\ No newline at end of file
+        return None
+
+def element_to_dict(elem) -> Any:
+    """
+    Convert an lxml element to the same structure xmltodict produces.
+    
+    Attributes become '@name' keys, text next to children or attributes
+    becomes '#text', and repeated child tags are collected into lists.
+    
+    Args:
+        elem: lxml element
+        
+    Returns:
+        Dictionary, string or None
+    """
+    text = elem.text.strip() if elem.text else ""
+    attrib = elem.attrib
+    if len(elem) == 0 and not attrib:
+        return text or None
+    
+    result = {f"@{key}": value for key, value in attrib.items()}
+    for child in elem:
+        tag = child.tag
+        if not isinstance(tag, str):
+            # Comments and processing instructions
+            continue
+        value = element_to_dict(child)
+        if tag in result:
+            existing = result[tag]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                result[tag] = [existing, value]
+        else:
+            result[tag] = value
+    if text:
+        result["#text"] = text
+    return result
+
+def _iterparse_idocs(xml_source: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the segments of one or more IDocs, marking where each IDoc ends.
+    
+    Args:
+        xml_source: XML content as bytes, or a binary file-like object
+        
+    Yields:
+        Tuples of (segment name, segment dictionary), and (IDOC_TAG, None)
+        after the last segment of each IDoc
+    """
+    if isinstance(xml_source, (bytes, bytearray)):
+        xml_source = BytesIO(xml_source)
+    
+    context = etree.iterparse(
+        xml_source,
+        events=("end",),
+        remove_comments=True,
+        resolve_entities=False,
+        no_network=True,
+        huge_tree=True
+    )
+    try:
+        for _, elem in context:
+            parent = elem.getparent()
+            if parent is None or parent.tag != IDOC_TAG:
+                if elem.tag == IDOC_TAG:
+                    yield IDOC_TAG, None
+                    # Drop the finished IDoc from its packet
+                    elem.clear()
+                    if parent is not None:
+                        while elem.getprevious() is not None:
+                            del parent[0]
+                continue
+            
+            yield elem.tag, element_to_dict(elem)
+            
+            # Free the segment and anything parsed before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+    except etree.XMLSyntaxError as e:
+        logger.error(f"Failed to parse XML: {e}")
+        raise ValueError(f"Invalid XML data: {e}")
+    finally:
+        del context
+
+def iter_segments(xml_source: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the top-level segments of one or more IDocs.
+    
+    Yields each child of an IDOC element (EDI_DC40, E1KNA1M, ...) as soon
+    as it has been parsed, converted like xmltodict would, and then frees
+    the parsed elements so memory stays bounded by the largest segment
+    rather than by the document size.
+    
+    Args:
+        xml_source: XML content as bytes, or a binary file-like object
+        
+    Yields:
+        Tuples of (segment name, segment dictionary)
+    """
+    for segment_name, segment in _iterparse_idocs(xml_source):
+        if segment is not None:
+            yield segment_name, segment
+
+def iter_idocs(xml_source: Union[bytes, BinaryIO]) -> Iterator[List[Tuple[str, Any]]]:
+    """
+    Stream the IDocs of a packet (one file holding many IDOC elements).
+    
+    Only one IDoc is held in memory at a time.
+    
+    Args:
+        xml_source: XML content as bytes, or a binary file-like object
+        
+    Yields:
+        List of (segment name, segment dictionary) pairs for each IDoc
+    """
+    segments = []
+    for segment_name, segment in _iterparse_idocs(xml_source):
+        if segment is None:
+            yield segments
+            segments = []
+        else:
+            segments.append((segment_name, segment))
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import threading
+import types
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+from minio.error import S3Error
+
+
+class MemoryResponse:
+    """get_object response over bytes held in memory."""
+
+    def __init__(self, data: bytes, metadata: Dict[str, str]):
+        self._body = io.BytesIO(data)
+        self.headers = dict(metadata)
+
+    def read(self, amt: Optional[int] = None, decode_content: Optional[bool] = None) -> bytes:
+        return self._body.read(-1 if amt is None else amt)
+
+    def stream(self, amt: int = 64 * 1024, decode_content: Optional[bool] = None) -> Iterator[bytes]:
+        while True:
+            chunk = self._body.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
+
+
+class MemoryMinio:
+    """
+    In-memory stand-in for the MinIO client.
+
+    Implements the client methods StorageService uses, so benchmarks measure
+    the service code without network or disk I/O.
+    """
+
+    def __init__(self):
+        self.objects: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _not_found(self, object_name: str) -> S3Error:
+        return S3Error(
+            code="NoSuchKey", message="Object does not exist", resource=object_name,
+            request_id="", host_id="", response=None
+        )
+
+    def _get(self, object_name: str):
+        with self._lock:
+            if object_name not in self.objects:
+                raise self._not_found(object_name)
+            return self.objects[object_name]
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return True
+
+    def make_bucket(self, bucket_name: str) -> None:
+        pass
+
+    def get_object(self, bucket_name: str, object_name: str, *args, **kwargs) -> MemoryResponse:
+        stored = self._get(object_name)
+        # MinIO sends the quoted ETag with the object, the cache revalidates against it
+        return MemoryResponse(stored.data, {**stored.metadata, "ETag": f'"{stored.etag}"'})
+
+    def stat_object(self, bucket_name: str, object_name: str, *args, **kwargs):
+        return self._get(object_name)
+
+    def put_object(self, bucket_name: str, object_name: str, data: BinaryIO, length: int,
+                   content_type: str = "application/octet-stream", metadata: Optional[Dict[str, str]] = None,
+                   part_size: int = 0, **kwargs):
+        if length == -1:
+            # Multipart upload of unknown length, read part by part
+            parts = []
+            while True:
+                part = data.read(part_size)
+                if not part:
+                    break
+                parts.append(part)
+            body = b"".join(parts)
+        else:
+            body = data.read(length)
+        etag = hashlib.md5(body).hexdigest()
+        stored = types.SimpleNamespace(
+            object_name=object_name, data=body, etag=etag, size=len(body), is_dir=False,
+            content_type=content_type, metadata=dict(metadata or {}),
+            last_modified=datetime.now(timezone.utc)
+        )
+        with self._lock:
+            self.objects[object_name] = stored
+        return types.SimpleNamespace(object_name=object_name, etag=etag)
+
+    def list_objects(self, bucket_name: str, prefix: str = "", recursive: bool = False, **kwargs):
+        with self._lock:
+            objects = [self.objects[name] for name in sorted(self.objects) if name.startswith(prefix)]
+        yield from objects
+
+    def remove_object(self, bucket_name: str, object_name: str) -> None:
+        with self._lock:
+            self.objects.pop(object_name, None)
@@ -0,0 +1,350 @@
+"""
+Benchmark harness for the transformation pipeline.
+
+Generates synthetic DEBMAS IDocs (N customers with M partner functions each,
+seeded from "Cust Locations IDOC.xml"), runs them through the pipeline
+stages with MinIO replaced by an in-memory stand-in, and reports docs/sec,
+p50/p99 latency and peak RSS per stage. Results are compared against a
+stored baseline so regressions are visible.
+
+Run from the sap-bydm-transformer folder:
+
+    python -m benchmarks.run --customers 500 --partners 4
+    python -m benchmarks.run --update-baseline
+"""
+import argparse
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Settings require MinIO credentials; nothing connects to them here
+os.environ.setdefault("MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("MINIO_ACCESS_KEY", "benchmark")
+os.environ.setdefault("MINIO_SECRET_KEY", "benchmark")
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from benchmarks.memory_minio import MemoryMinio
+from benchmarks.synthetic_idocs import REPO_ROOT, generate_idocs, generate_mapping_rows
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCHMARK_DIR / "baseline.json"
+SIMULATOR_PATH = REPO_ROOT / "Idoc_Simulator" / "scripts" / "BYDM_Generator.py"
+MAPPING_PATH = REPO_ROOT / "Idoc_Simulator" / "config_file" / "Location_mapping.json"
+TEMPLATE_PATH = REPO_ROOT / "Idoc_Simulator" / "config_file" / "Location_Template.json"
+
+# Options that change what is measured; results are only compared when they match
+SCALE_OPTIONS = ("customers", "partners", "repeat", "mapping_rows", "workbooks")
+
+Operation = Callable[[Any], Any]
+
+
+def _load_json(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _documents(options: argparse.Namespace) -> List[bytes]:
+    return list(generate_idocs(options.customers, options.partners))
+
+
+def _transform_service():
+    from app.services.transform_service import TransformService
+    from app.utils.mapping_compiler import compile_mapping
+    from app.utils.template_factory import TemplateFactory
+
+    service = TransformService(storage_service=None)
+    return service, compile_mapping(_load_json(MAPPING_PATH)), TemplateFactory(_load_json(TEMPLATE_PATH))
+
+
+def _load_simulator():
+    """Import the simulator script, keeping its log files out of the measurement."""
+    spec = importlib.util.spec_from_file_location("BYDM_Generator", SIMULATOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    root = logging.getLogger()
+    for handler in (module.file_handler, module.error_handler):
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(logging.WARNING)
+    if module.log_file.exists() and module.log_file.stat().st_size == 0:
+        module.log_file.unlink()
+    return module
+
+
+def bench_parse_xml_to_dict(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    from app.utils.xml_parser import parse_xml_to_dict
+    return _documents(options), parse_xml_to_dict
+
+
+def bench_apply_mapping(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    from app.utils.xml_parser import parse_xml_to_dict
+    service, plan, template = _transform_service()
+    # Mapping segment paths are relative to the IDOC element
+    inputs = [parse_xml_to_dict(document)["IDOC"] for document in _documents(options)]
+
+    def apply_mapping(idoc: Dict[str, Any]) -> Dict[str, Any]:
+        output_json = template.new()
+        service._apply_mapping(idoc, plan, output_json)
+        return output_json
+
+    # Guard against timing the "segment not found" path
+    if apply_mapping(inputs[0]) == template.new():
+        raise RuntimeError("apply_mapping mapped nothing from the synthetic IDocs")
+    return inputs, apply_mapping
+
+
+def bench_transform_documents(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    service, plan, template = _transform_service()
+    return _documents(options), lambda document: list(service.transform_documents(document, plan, template))
+
+
+def bench_save_json(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    from app.services.storage_service import StorageService
+    service, plan, template = _transform_service()
+    storage = StorageService(client=MemoryMinio())
+    inputs = [
+        (f"target/benchmark_{index:07d}.json", outputs[0])
+        for index, document in enumerate(_documents(options))
+        for outputs in service.transform_documents(document, plan, template)
+    ]
+    return inputs, lambda item: storage.save_json(item[1], item[0])
+
+
+def bench_simulator_parse_idoc(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    simulator = _load_simulator()
+    config = _load_json(MAPPING_PATH)
+    template = _load_json(TEMPLATE_PATH)
+    if "location" not in template or not template["location"]:
+        template["location"] = [{}]
+    template = simulator.compile_template(template)
+    return _documents(options), lambda document: simulator.parse_idoc(io.BytesIO(document), config, template)
+
+
+def bench_simulator_parse_idoc_compiled(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    simulator = _load_simulator()
+    config = _load_json(MAPPING_PATH)
+    template = _load_json(TEMPLATE_PATH)
+    if "location" not in template or not template["location"]:
+        template["location"] = [{}]
+    template = simulator.compile_template(template)
+    plan = simulator.compile_mappings(config)
+    return _documents(options), lambda document: simulator.parse_idoc(io.BytesIO(document), config, template, plan)
+
+
+def bench_excel_loader(options: argparse.Namespace) -> Tuple[List[Any], Operation]:
+    import openpyxl
+    from app.utils.mapping_parser import (
+        COL_BYDM_TARGET_PATH, COL_SAP_XPATH, COL_TRANSFORMATION_RULE, COL_DEFAULT_VALUE,
+        COL_TARGET_DATA_TYPE, COL_IS_MANDATORY, load_mapping_from_excel
+    )
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Data Mapping")
+    sheet.append([COL_BYDM_TARGET_PATH, COL_SAP_XPATH, COL_TRANSFORMATION_RULE, COL_DEFAULT_VALUE,
+                  COL_TARGET_DATA_TYPE, COL_IS_MANDATORY])
+    for row in generate_mapping_rows(options.mapping_rows, _load_json(MAPPING_PATH)):
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return [buffer.getvalue()] * options.workbooks, load_mapping_from_excel
+
+
+# name -> (unit of the measured items, setup returning the inputs and the operation)
+BENCHMARKS: Dict[str, Tuple[str, Callable[[argparse.Namespace], Tuple[List[Any], Operation]]]] = {
+    "parse_xml_to_dict": ("docs", bench_parse_xml_to_dict),
+    "apply_mapping": ("docs", bench_apply_mapping),
+    "transform_documents": ("docs", bench_transform_documents),
+    "save_json": ("docs", bench_save_json),
+    "simulator_parse_idoc": ("docs", bench_simulator_parse_idoc),
+    "simulator_parse_idoc_compiled": ("docs", bench_simulator_parse_idoc_compiled),
+    "excel_loader": ("workbooks", bench_excel_loader),
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB, None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(name: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run one benchmark and collect its statistics.
+
+    Args:
+        name: Benchmark name (see BENCHMARKS)
+        options: Command line options as a dictionary
+
+    Returns:
+        Dictionary with the item count, docs/sec, p50/p99 latency and peak RSS
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.WARNING)
+    options = argparse.Namespace(**options)
+    unit, setup = BENCHMARKS[name]
+    inputs, operation = setup(options)
+
+    # Warm up caches and lazy imports outside the measurement
+    operation(inputs[0])
+
+    timings = []
+    started = time.perf_counter()
+    for _ in range(options.repeat):
+        for item in inputs:
+            item_started = time.perf_counter()
+            operation(item)
+            timings.append(time.perf_counter() - item_started)
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        "unit": unit,
+        "count": len(timings),
+        "docs_per_sec": len(timings) / elapsed,
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def run_benchmarks(names: List[str], options: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """
+    Run benchmarks, each in a fresh process so peak RSS is its own.
+
+    Args:
+        names: Benchmarks to run
+        options: Command line options
+
+    Returns:
+        Results by benchmark name; failed benchmarks carry an "error"
+    """
+    results = {}
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            if options.in_process:
+                results[name] = measure(name, vars(options))
+            else:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    results[name] = executor.submit(measure, name, vars(options)).result()
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float,
+            latency_tolerance: float) -> Dict[str, List[str]]:
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: Results of this run
+        baseline: Stored baseline ({"options": ..., "results": ...})
+        tolerance: Allowed relative change of throughput and peak RSS (0.2 = 20%)
+        latency_tolerance: Allowed relative change of p99 latency, which is noisier
+
+    Returns:
+        Regression messages by benchmark name
+    """
+    regressions = {}
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None or "error" in result or "error" in reference:
+            continue
+        found = []
+        if result["docs_per_sec"] < reference["docs_per_sec"] * (1 - tolerance):
+            found.append(f"{result['unit']}/sec {reference['docs_per_sec']:.1f} -> {result['docs_per_sec']:.1f}")
+        if result["p99_ms"] > reference["p99_ms"] * (1 + latency_tolerance):
+            found.append(f"p99 {reference['p99_ms']:.3f} ms -> {result['p99_ms']:.3f} ms")
+        if result["peak_rss_mb"] and reference.get("peak_rss_mb") and \
+                result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+            found.append(f"peak RSS {reference['peak_rss_mb']:.1f} MiB -> {result['peak_rss_mb']:.1f} MiB")
+        if found:
+            regressions[name] = found
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    """Print results as a table, with the throughput change against the baseline."""
+    print(f"{'benchmark':32} {'items':>8} {'items/sec':>12} {'p50 ms':>9} {'p99 ms':>9} {'RSS MiB':>8} {'vs base':>8}")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:32} skipped: {result['error']}")
+            continue
+        change = ""
+        reference = (baseline or {}).get("results", {}).get(name)
+        if reference and "docs_per_sec" in reference:
+            change = f"{(result['docs_per_sec'] / reference['docs_per_sec'] - 1) * 100:+.1f}%"
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{name:32} {result['count']:>8} {result['docs_per_sec']:>12.1f} "
+              f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {rss:>8} {change:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the SAP IDoc to BYDM transformation pipeline")
+    parser.add_argument("--customers", type=int, default=500, help="synthetic customers (IDocs) per run")
+    parser.add_argument("--partners", type=int, default=4, help="partner functions (E1KNVPM) per customer")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the generated IDocs")
+    parser.add_argument("--mapping-rows", type=int, default=5000, help="rows of the generated mapping workbook")
+    parser.add_argument("--workbooks", type=int, default=3, help="workbook loads per pass of excel_loader")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline results to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative throughput/RSS change tolerated (0.2 = 20%%)")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="relative p99 change tolerated")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--in-process", action="store_true", help="run all benchmarks in this process")
+    options = parser.parse_args(argv)
+
+    results = run_benchmarks(options.only or list(BENCHMARKS), options)
+    scale = {key: getattr(options, key) for key in SCALE_OPTIONS}
+    run = {"options": scale, "python": sys.version.split()[0], "results": results}
+
+    baseline = None
+    if options.baseline.exists() and not options.update_baseline:
+        baseline = _load_json(options.baseline)
+        if baseline.get("options") != scale:
+            print(f"Baseline was recorded with {baseline.get('options')}, not comparing", file=sys.stderr)
+            baseline = None
+
+    print_report(results, baseline)
+
+    if options.output:
+        options.output.write_text(json.dumps(run, indent=2), encoding="utf-8")
+    if options.update_baseline:
+        options.baseline.write_text(json.dumps(run, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {options.baseline}")
+        return 0
+
+    if baseline is not None:
+        regressions = compare(results, baseline, options.tolerance, options.latency_tolerance)
+        for name, found in regressions.items():
+            print(f"REGRESSION {name}: {'; '.join(found)}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
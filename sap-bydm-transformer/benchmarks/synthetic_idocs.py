@@ -0,0 +1,143 @@
+import copy
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from lxml import etree
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SEED_PATH = REPO_ROOT / "Idoc_Simulator" / "source" / "Cust Locations IDOC.xml"
+
+# Partner functions cycled through for the E1KNVPM segments of a customer
+PARTNER_FUNCTIONS = ("AG", "WE", "RE", "RG", "SP", "ZM")
+
+# Root element of a packet holding many IDocs (the DEBMAS basic type)
+PACKET_ROOT = "DEBMAS06"
+
+
+def load_seed(seed_path: Optional[Path] = None) -> etree._Element:
+    """
+    Load the IDOC element used as the seed of every synthetic customer.
+
+    Args:
+        seed_path: Seed DEBMAS IDoc, "Cust Locations IDOC.xml" if omitted
+
+    Returns:
+        IDOC element
+    """
+    root = etree.parse(str(seed_path or SEED_PATH)).getroot()
+    return root if root.tag == "IDOC" else root.find(".//IDOC")
+
+
+def _set_text(parent: etree._Element, path: str, text: str) -> None:
+    element = parent.find(path)
+    if element is not None:
+        element.text = text
+
+
+def make_idoc(seed: etree._Element, index: int, partners: int) -> etree._Element:
+    """
+    Build one synthetic customer IDoc from the seed.
+
+    Args:
+        seed: Seed IDOC element (left unchanged)
+        index: Customer number, makes DOCNUM, KUNNR and names unique
+        partners: Number of E1KNVPM partner function segments
+
+    Returns:
+        New IDOC element
+    """
+    idoc = copy.deepcopy(seed)
+    customer = f"{100000 + index:010d}"
+    _set_text(idoc, "EDI_DC40/DOCNUM", f"{index + 1:020d}")
+    _set_text(idoc, "E1KNA1M/KUNNR", customer)
+    _set_text(idoc, "E1KNA1M/NAME1", f"Customer {index} Logistics Inc.")
+    _set_text(idoc, "E1KNA1M/PSTLZ", f"{10000 + index % 90000:05d}")
+    _set_text(idoc, "E1KNVKM/PARNR", f"{index % 1000000:06d}")
+
+    sales_area = idoc.find("E1KNVVM")
+    if sales_area is not None:
+        seed_partner = sales_area.find("E1KNVPM")
+        for partner in sales_area.findall("E1KNVPM"):
+            sales_area.remove(partner)
+        if seed_partner is not None:
+            for number in range(partners):
+                partner = copy.deepcopy(seed_partner)
+                _set_text(partner, "PARVW", PARTNER_FUNCTIONS[number % len(PARTNER_FUNCTIONS)])
+                _set_text(partner, "KUNNR", f"{100000 + index * partners + number:010d}")
+                sales_area.append(partner)
+    return idoc
+
+
+def generate_idocs(customers: int, partners: int, seed_path: Optional[Path] = None) -> Iterator[bytes]:
+    """
+    Generate one XML document per synthetic customer.
+
+    Args:
+        customers: Number of customers (documents)
+        partners: Partner functions per customer
+        seed_path: Seed DEBMAS IDoc, "Cust Locations IDOC.xml" if omitted
+
+    Yields:
+        XML documents holding one IDOC element each
+    """
+    seed = load_seed(seed_path)
+    for index in range(customers):
+        yield etree.tostring(make_idoc(seed, index, partners), xml_declaration=True, encoding="UTF-8")
+
+
+def generate_packet(customers: int, partners: int, seed_path: Optional[Path] = None) -> bytes:
+    """
+    Generate one packet document holding all synthetic customers.
+
+    Args:
+        customers: Number of customers (IDOC elements)
+        partners: Partner functions per customer
+        seed_path: Seed DEBMAS IDoc, "Cust Locations IDOC.xml" if omitted
+
+    Returns:
+        XML document with one IDOC element per customer
+    """
+    seed = load_seed(seed_path)
+    packet = etree.Element(PACKET_ROOT)
+    for index in range(customers):
+        packet.append(make_idoc(seed, index, partners))
+    return etree.tostring(packet, xml_declaration=True, encoding="UTF-8")
+
+
+def generate_mapping_rows(rows: int, mapping_json: dict) -> List[List[str]]:
+    """
+    Generate mapping sheet rows by repeating the rules of a mapping.
+
+    Repeated rules get numbered source fields and array indices, so the
+    sheet stays free of conflicts for the analyzer.
+
+    Args:
+        rows: Number of rows
+        mapping_json: Mapping configuration providing the rule shapes
+
+    Returns:
+        Rows of (target path, source path, transformation rule, default value,
+        target data type, is mandatory)
+    """
+    shapes = []
+    for segment_name, fields in mapping_json["mappings"].items():
+        for field_name, rule in fields.items():
+            if isinstance(rule, dict) and "target" in rule:
+                shapes.append((segment_name, field_name, rule))
+
+    result = []
+    for number in range(rows):
+        segment_name, field_name, rule = shapes[number % len(shapes)]
+        copy_number = number // len(shapes)
+        transformation = "\n".join(
+            f"{key}: {value}" for key, value in rule.get("transformation", {}).get("values", {}).items()
+        )
+        result.append([
+            f"copy{copy_number}.{rule['target']}",
+            f"{segment_name}.{field_name}{copy_number or ''}",
+            transformation or None,
+            rule.get("default_value") or None,
+            rule.get("validation", "TEXT"),
+            "Y" if number % 3 == 0 else "N"
+        ])
+    return result
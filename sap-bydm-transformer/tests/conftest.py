@@ -0,0 +1,75 @@
+import json
+import os
+import re
+from pathlib import Path
+
+# Settings require MinIO credentials; tests use the in-memory stand-in
+os.environ.setdefault("MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("MINIO_ACCESS_KEY", "test")
+os.environ.setdefault("MINIO_SECRET_KEY", "test")
+
+import pytest
+
+from app.services.storage_service import StorageService
+from app.utils.mapping_compiler import compile_mapping
+from app.utils.template_factory import TemplateFactory
+from benchmarks.memory_minio import MemoryMinio
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+CONFIG_DIR = REPO_ROOT / "Idoc_Simulator" / "config_file"
+SEED_IDOC_PATH = REPO_ROOT / "Idoc_Simulator" / "source" / "Cust Locations IDOC.xml"
+MAPPING_PATH = "mappings/Location_mapping.json"
+TEMPLATE_PATH = "templates/Location_Template.json"
+
+
+def _load(name: str):
+    with open(CONFIG_DIR / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def customer_id(index: int) -> str:
+    return f"{100000 + index:010d}"
+
+
+def customer_idoc(index: int) -> bytes:
+    """The sample DEBMAS IDoc with its own IDoc number, customer number and name."""
+    xml = SEED_IDOC_PATH.read_text(encoding="utf-8")
+    xml = re.sub(r"<DOCNUM>\d+</DOCNUM>", f"<DOCNUM>{index + 1:020d}</DOCNUM>", xml, count=1)
+    xml = re.sub(r"<KUNNR>\d+</KUNNR>", f"<KUNNR>{customer_id(index)}</KUNNR>", xml, count=1)
+    xml = xml.replace("ABC Logistics Inc.", f"Customer {index} Logistics Inc.")
+    return xml.encode("utf-8")
+
+
+def idoc_packet(count: int) -> bytes:
+    """A DEBMAS06 packet holding customer_idoc(0) ... customer_idoc(count - 1)."""
+    idocs = [re.sub(rb"^<\?xml[^>]*\?>\s*", b"", customer_idoc(index)) for index in range(count)]
+    return b"<?xml version='1.0' encoding='UTF-8'?>\n<DEBMAS06>\n" + b"\n".join(idocs) + b"\n</DEBMAS06>\n"
+
+
+@pytest.fixture(scope="session")
+def mapping_json():
+    return _load("Location_mapping.json")
+
+
+@pytest.fixture(scope="session")
+def template_json():
+    return _load("Location_Template.json")
+
+
+@pytest.fixture(scope="session")
+def plan(mapping_json):
+    return compile_mapping(mapping_json)
+
+
+@pytest.fixture(scope="session")
+def template(template_json):
+    return TemplateFactory(template_json)
+
+
+@pytest.fixture
+def storage(mapping_json, template_json):
+    """StorageService over an in-memory bucket holding the mapping and template."""
+    service = StorageService(client=MemoryMinio())
+    service.save_json(mapping_json, MAPPING_PATH)
+    service.save_json(template_json, TEMPLATE_PATH)
+    return service
@@ -0,0 +1,106 @@
+import json
+
+from app.services.bulk_output import NdjsonPartWriter
+
+
+def _lines(source_index, count):
+    return [json.dumps({"source": source_index, "n": n}, separators=(",", ":")).encode() for n in range(count)]
+
+
+def _read_lines(storage, path):
+    return storage.load_file(path).splitlines()
+
+
+def _read_index(storage, writer):
+    return [json.loads(line) for line in _read_lines(storage, writer.index_path)]
+
+
+def test_parts_roll_over_at_record_limit(storage):
+    writer = NdjsonPartWriter(storage, "target/batch-1", max_records=5)
+    entries = []
+    for index in range(4):
+        entries += writer.add(f"source/{index}.xml", _lines(index, 2), token=index)
+    entries += writer.flush()
+    writer.write_index()
+
+    # A source's lines are never split across parts
+    assert writer.parts == ["target/batch-1/part-00001.jsonl", "target/batch-1/part-00002.jsonl"]
+    assert [len(_read_lines(storage, part)) for part in writer.parts] == [4, 4]
+    assert [(source, token, error) for source, token, _, error in entries] == [
+        (f"source/{index}.xml", index, None) for index in range(4)
+    ]
+
+    index = _read_index(storage, writer)
+    assert index == [
+        {"source_file": "source/0.xml", "part": writer.parts[0], "line": 0, "line_count": 2, "byte_offset": 0},
+        {"source_file": "source/1.xml", "part": writer.parts[0], "line": 2, "line_count": 2,
+         "byte_offset": index[1]["byte_offset"]},
+        {"source_file": "source/2.xml", "part": writer.parts[1], "line": 0, "line_count": 2, "byte_offset": 0},
+        {"source_file": "source/3.xml", "part": writer.parts[1], "line": 2, "line_count": 2,
+         "byte_offset": index[3]["byte_offset"]},
+    ]
+
+
+def test_index_locates_each_source(storage):
+    writer = NdjsonPartWriter(storage, "target/batch-1", max_bytes=200)
+    sources = {f"source/{index}.xml": _lines(index, index + 1) for index in range(6)}
+    for source_file, lines in sources.items():
+        writer.add(source_file, lines)
+    writer.flush()
+    writer.write_index()
+
+    assert len(writer.parts) > 1
+    for entry in _read_index(storage, writer):
+        data = storage.load_file(entry["part"])
+        lines = data.splitlines()[entry["line"]:entry["line"] + entry["line_count"]]
+        assert lines == sources[entry["source_file"]]
+        assert data[entry["byte_offset"]:].startswith(lines[0])
+
+
+def test_oversized_source_gets_its_own_part(storage):
+    writer = NdjsonPartWriter(storage, "target/batch-1", max_records=2)
+    writer.add("source/small.xml", _lines(0, 1))
+    writer.add("source/large.xml", _lines(1, 5))
+    writer.add("source/next.xml", _lines(2, 1))
+    writer.flush()
+
+    assert [len(_read_lines(storage, part)) for part in writer.parts] == [1, 5, 1]
+
+
+def test_compressed_parts(storage):
+    writer = NdjsonPartWriter(storage, "target/batch-1", content_encoding="gzip")
+    writer.add("source/0.xml", _lines(0, 3))
+    writer.flush()
+
+    assert writer.parts == ["target/batch-1/part-00001.jsonl.gz"]
+    assert _read_lines(storage, writer.parts[0]) == _lines(0, 3)
+
+
+def test_failed_part_reports_its_sources(storage, monkeypatch):
+    writer = NdjsonPartWriter(storage, "target/batch-1", max_records=2)
+    writer.add("source/0.xml", _lines(0, 2), token="a")
+
+    def fail(*args, **kwargs):
+        raise OSError("storage unavailable")
+
+    monkeypatch.setattr(storage, "save_file", fail)
+    [(source_file, token, location, error)] = writer.add("source/1.xml", _lines(1, 2), token="b")
+
+    assert (source_file, token, location) == ("source/0.xml", "a", None)
+    assert isinstance(error, OSError)
+    assert writer.parts == []
+
+
+def test_flush_without_pending_sources(storage):
+    writer = NdjsonPartWriter(storage, "target/batch-1")
+    writer.add("source/0.xml", _lines(0, 1))
+    assert len(writer.flush()) == 1
+    assert writer.flush() == []
+    assert writer.parts == ["target/batch-1/part-00001.jsonl"]
+
+
+def test_no_index_without_parts(storage):
+    writer = NdjsonPartWriter(storage, "target/batch-1")
+    assert writer.flush() == []
+    assert writer.write_index() is None
+    assert not storage.file_exists(writer.index_path)
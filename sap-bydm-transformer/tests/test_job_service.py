@@ -0,0 +1,231 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.async_storage_service import AsyncStorageService
+from app.services.job_service import JobQueueFullError, JobService, JobStore
+from app.services.transform_service import TransformService
+from tests.conftest import MAPPING_PATH, TEMPLATE_PATH, customer_idoc
+
+
+@pytest.fixture(autouse=True)
+def fast_jobs(monkeypatch):
+    monkeypatch.setattr(settings, "EXECUTOR_MODE", "inline")
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.05)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def _job_service(db_path, storage=None):
+    # Handlers registered by the tests never touch storage
+    async_storage = AsyncStorageService(storage) if storage is not None else None
+    return JobService(storage, async_storage, store=JobStore(db_path))
+
+
+async def _wait_for(service, job_id, statuses, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await service.get_job(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} still {job['status']}")
+
+
+def _file_params(source_file):
+    return {"source_file": source_file, "config_path": MAPPING_PATH, "template_path": TEMPLATE_PATH}
+
+
+async def _run_until_done(service, job_type, params=None, job_id=None):
+    """Run a job to completion; without params, job_id is already queued."""
+    await service.start()
+    try:
+        queued_id = job_id or await service.submit(job_type, params)
+        return await _wait_for(service, queued_id, ("completed", "failed"))
+    finally:
+        await service.stop()
+
+
+def _run_job(db_path, handler, params=None, job_id=None):
+    """Run a job of type "test" with the handler built for its service."""
+    service = _job_service(db_path)
+    service.register_handler("test", handler(service))
+    return asyncio.run(_run_until_done(service, "test", params, job_id))
+
+
+def test_job_records_results_and_completes(db_path):
+    def handler(service):
+        async def run(job_id, params):
+            for source_file in params["files"]:
+                service.store.add_result(job_id, {"source_file": source_file, "status": "success"})
+        return run
+
+    job = _run_job(db_path, handler, {"files": ["source/a.xml", "source/b.xml"]})
+
+    assert job["status"] == "completed"
+    assert job["params"] == {"files": ["source/a.xml", "source/b.xml"]}
+    assert [result["source_file"] for result in job["results"]] == ["source/a.xml", "source/b.xml"]
+    assert job["success_count"] == 2
+    assert job["duration_ms"] is not None
+
+
+def test_failed_job_records_error(db_path):
+    def handler(service):
+        async def run(job_id, params):
+            raise ValueError("mapping not found")
+        return run
+
+    job = _run_job(db_path, handler, {})
+    assert job["status"] == "failed"
+    assert job["error"] == "mapping not found"
+
+
+def test_submit_validates_type_and_queue_size(db_path, monkeypatch):
+    service = _job_service(db_path)
+    with pytest.raises(ValueError, match="Unknown job type"):
+        asyncio.run(service.submit("compile", {}))
+
+    monkeypatch.setattr(settings, "JOB_QUEUE_MAX", 1)
+    asyncio.run(service.submit("transform_file", {"source_file": "source/a.xml"}))
+    with pytest.raises(JobQueueFullError):
+        asyncio.run(service.submit("transform_file", {"source_file": "source/b.xml"}))
+    service.store.close()
+
+
+def test_interrupted_job_is_requeued_on_restart(db_path):
+    started = asyncio.Event()
+    runs = []
+
+    async def blocking_handler(job_id, params):
+        runs.append(job_id)
+        started.set()
+        await asyncio.Event().wait()
+
+    async def interrupted_run():
+        service = _job_service(db_path)
+        service.register_handler("test", blocking_handler)
+        await service.start()
+        job_id = await service.submit("test", {})
+        await asyncio.wait_for(started.wait(), timeout=10)
+        # Stopping cancels the running job instead of waiting for it
+        await asyncio.wait_for(service.stop(), timeout=5)
+        return job_id
+
+    job_id = asyncio.run(interrupted_run())
+    store = JobStore(db_path)
+    assert store.get_job(job_id)["status"] == "running"
+    store.close()
+
+    def finishing_handler(service):
+        async def run(job_id, params):
+            runs.append(job_id)
+        return run
+
+    job = _run_job(db_path, finishing_handler, job_id=job_id)
+    assert job["status"] == "completed"
+    assert runs == [job_id, job_id]
+
+
+def test_worker_survives_claim_errors(db_path, monkeypatch):
+    def handler(service):
+        claim_next = service.store.claim_next
+        failures = [sqlite3.OperationalError("database is locked")] * 2
+
+        def flaky_claim_next():
+            if failures:
+                raise failures.pop()
+            return claim_next()
+
+        monkeypatch.setattr(service.store, "claim_next", flaky_claim_next)
+
+        async def run(job_id, params):
+            pass
+        return run
+
+    job = _run_job(db_path, handler, {})
+    assert job["status"] == "completed"
+
+
+def test_requeue_drops_partial_results(db_path):
+    store = JobStore(db_path)
+    store.add_job("job-1", "transform_batch", {})
+    assert store.claim_next()["job_id"] == "job-1"
+    store.add_result("job-1", {"source_file": "source/a.xml", "status": "success"})
+
+    assert store.requeue_running() == 1
+    job = store.get_job("job-1")
+    assert job["status"] == "queued"
+    assert job["started_at"] is None
+    assert job["results"] == []
+    store.close()
+
+
+def test_transform_file_job_completes(storage, db_path):
+    storage.save_file(customer_idoc(0), "source/a.xml", content_type="application/xml")
+
+    job = asyncio.run(_run_until_done(_job_service(db_path, storage), "transform_file",
+                                      _file_params("source/a.xml")))
+    assert job["status"] == "completed"
+    assert job["success_count"] == 1
+    [result] = job["results"]
+    assert result["status"] == "success"
+    assert storage.file_exists(result["output_file"])
+
+
+def test_transform_file_job_records_failure(storage, db_path):
+    job = asyncio.run(_run_until_done(_job_service(db_path, storage), "transform_file",
+                                      _file_params("source/missing.xml")))
+    assert job["status"] == "failed"
+    assert job["failure_count"] == 1
+    assert job["results"][0]["status"] == "failed"
+
+
+def test_batch_job_records_each_file(storage, db_path):
+    for index in range(3):
+        storage.save_file(customer_idoc(index), f"source/idoc_{index}.xml", content_type="application/xml")
+
+    job = asyncio.run(_run_until_done(_job_service(db_path, storage), "transform_batch", {
+        "source_folder": "source", "config_path": MAPPING_PATH, "template_path": TEMPLATE_PATH
+    }))
+    assert job["status"] == "completed"
+    assert sorted(result["source_file"] for result in job["results"]) == [
+        f"source/idoc_{index}.xml" for index in range(3)
+    ]
+    assert job["success_count"] == 3
+
+
+def test_cancelled_transform_file_job_is_requeued(storage, db_path, monkeypatch):
+    storage.save_file(customer_idoc(0), "source/a.xml", content_type="application/xml")
+    started = asyncio.Event()
+
+    class BlockingTransformService(TransformService):
+        async def process_file(self, *args, **kwargs):
+            started.set()
+            await asyncio.Event().wait()
+
+    async def interrupted_run():
+        service = _job_service(db_path, storage)
+        monkeypatch.setattr(service, "_transform_service", lambda: BlockingTransformService(storage))
+        await service.start()
+        job_id = await service.submit("transform_file", _file_params("source/a.xml"))
+        await asyncio.wait_for(started.wait(), timeout=10)
+        # A cancelled job records no result and stop() returns
+        await asyncio.wait_for(service.stop(), timeout=5)
+        return job_id
+
+    job_id = asyncio.run(interrupted_run())
+    store = JobStore(db_path)
+    job = store.get_job(job_id)
+    store.close()
+    assert job["status"] == "running"
+    assert job["results"] == []
+
+    job = asyncio.run(_run_until_done(_job_service(db_path, storage), "transform_file", job_id=job_id))
+    assert job["status"] == "completed"
+    assert [result["status"] for result in job["results"]] == ["success"]
@@ -0,0 +1,108 @@
+import json
+import time
+
+import pytest
+
+from app.services.log_sink import LogSink
+
+
+def _records(storage, path):
+    return [json.loads(line) for line in storage.load_file(path).splitlines()]
+
+
+def _add(sink, count, start=0):
+    for index in range(start, start + count):
+        sink.add({"source_file": f"source/{index}.xml", "status": "success"})
+
+
+def test_flushes_at_record_threshold(storage):
+    sink = LogSink(storage, "job-1", flush_records=3, flush_interval=60)
+    _add(sink, 2)
+    assert sink.flushes == 0
+    assert not storage.file_exists(sink.path)
+
+    _add(sink, 1, start=2)
+    assert sink.flushes == 1
+    assert [record["source_file"] for record in _records(storage, "logs/job-1.jsonl.gz")] == [
+        "source/0.xml", "source/1.xml", "source/2.xml"
+    ]
+    sink.close()
+
+
+def test_flushes_at_byte_threshold(storage):
+    sink = LogSink(storage, "job-1", flush_bytes=200, flush_interval=60)
+    sink.add({"source_file": "source/0.xml", "status": "success"})
+    assert sink.flushes == 0
+    sink.add({"source_file": "source/1.xml", "error": "x" * 200}, level="ERROR")
+    assert sink.flushes == 1
+
+    records = _records(storage, "logs/job-1.jsonl.gz")
+    assert [record["level"] for record in records] == ["INFO", "ERROR"]
+    sink.close()
+
+
+def test_flushes_after_interval(storage):
+    sink = LogSink(storage, "job-1", flush_interval=0.1)
+    _add(sink, 1)
+    deadline = time.monotonic() + 5
+    while sink.flushes == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert sink.flushes == 1
+    sink.close()
+    assert sink.flushes == 1
+
+
+def test_appends_flushes_and_rolls_over_objects(storage):
+    sink = LogSink(storage, "job-1", flush_records=2, flush_interval=60, object_max_flushes=2)
+    paths = [sink.add({"n": index}) for index in range(9)]
+    sink.close()
+
+    assert sink.paths == ["logs/job-1.jsonl.gz", "logs/job-1.00002.jsonl.gz", "logs/job-1.00003.jsonl.gz"]
+    # Each object holds two flushes of two records, the last one the remainder
+    assert [[record["n"] for record in _records(storage, path)] for path in sink.paths] == [
+        [0, 1, 2, 3], [4, 5, 6, 7], [8]
+    ]
+    # add() reports the object each record ends up in
+    assert paths == ["logs/job-1.jsonl.gz"] * 4 + ["logs/job-1.00002.jsonl.gz"] * 4 + ["logs/job-1.00003.jsonl.gz"]
+
+
+def test_rolls_over_at_object_size(storage):
+    sink = LogSink(storage, "job-1", flush_records=1, flush_interval=60, object_max_bytes=1)
+    _add(sink, 3)
+    sink.close()
+    assert len(sink.paths) == 3
+
+
+def test_failed_flush_is_written_by_the_next_one(storage, monkeypatch):
+    sink = LogSink(storage, "job-1", flush_records=2, flush_interval=60)
+    save_file = storage.save_file
+    failures = [OSError("storage unavailable")]
+
+    def flaky_save_file(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return save_file(*args, **kwargs)
+
+    monkeypatch.setattr(storage, "save_file", flaky_save_file)
+    _add(sink, 2)
+    assert sink.flushes == 0
+
+    _add(sink, 2, start=2)
+    sink.close()
+    assert [record["source_file"] for record in _records(storage, "logs/job-1.jsonl.gz")] == [
+        f"source/{index}.xml" for index in range(4)
+    ]
+
+
+def test_close_raises_when_records_cannot_be_written(storage, monkeypatch):
+    sink = LogSink(storage, "job-1", flush_interval=60)
+    _add(sink, 2)
+
+    def fail(*args, **kwargs):
+        raise OSError("storage unavailable")
+
+    monkeypatch.setattr(storage, "save_file", fail)
+    with pytest.raises(Exception, match="Failed to write 2 records"):
+        sink.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        sink.add({"n": 3})
@@ -0,0 +1,250 @@
+import copy
+import pickle
+import re
+
+import pytest
+
+from app.services.plan_store import PlanStore
+from app.services.transform_service import TransformService
+from app.utils.mapping_compiler import compile_mapping, dump_plan, load_plan, set_path_value
+from app.utils.mapping_parser import analyze_mapping, convert_mapping_to_json
+from app.utils.xml_parser import extract_segments, iter_segments, parse_xml_to_dict
+from tests.conftest import MAPPING_PATH, customer_idoc
+
+
+# Reference: the dictionary walk _apply_mapping did before mappings were compiled
+
+def _reference_apply_mapping(xml_dict, config, output_json):
+    for segment_name, segment_mapping in config.get("mappings", {}).items():
+        for segment in extract_segments(xml_dict, segment_name):
+            _reference_process_segment(segment, segment_mapping, output_json)
+
+
+def _reference_process_segment(segment, segment_mapping, output_json):
+    for field_name, field_mapping in segment_mapping.items():
+        if isinstance(field_mapping, dict) and "target" in field_mapping:
+            field_value = segment.get(field_name, "")
+            if isinstance(field_value, dict) and '#text' in field_value:
+                field_value = field_value['#text']
+            if not field_value and field_value != 0:
+                field_value = field_mapping.get("default_value", "")
+            transformation = field_mapping.get("transformation")
+            if transformation and field_value and transformation.get("type") == "MAP":
+                field_value = transformation.get("values", {}).get(str(field_value), field_value)
+            validation_rule = field_mapping.get("validation")
+            if validation_rule:
+                field_value = _reference_validate_field(field_value, validation_rule)
+            if field_value is not None:
+                _reference_set_nested_value(output_json, field_mapping["target"], field_value)
+        elif isinstance(field_mapping, dict):
+            nested_segment = segment.get(field_name, {})
+            if nested_segment:
+                _reference_process_segment(nested_segment, field_mapping, output_json)
+
+
+def _reference_validate_field(value, validation_rule):
+    if value is None or value == "":
+        return None
+    value = str(value).strip()
+    if validation_rule.upper() == "NUMBER":
+        if not value.replace('.', '', 1).isdigit():
+            return None
+    elif validation_rule.upper() == "TEXT":
+        if not value:
+            return None
+    return value
+
+
+def _reference_set_nested_value(json_obj, nested_key, value):
+    keys = nested_key.split(".")
+    temp = json_obj
+    for i, key in enumerate(keys[:-1]):
+        if key.isdigit():
+            key = int(key)
+            if isinstance(temp, list):
+                while len(temp) <= key:
+                    temp.append({})
+                temp = temp[key]
+            else:
+                new_temp = []
+                while len(new_temp) <= key:
+                    new_temp.append({})
+                temp[keys[i-1]] = new_temp
+                temp = new_temp[key]
+        else:
+            if key not in temp or not isinstance(temp[key], (dict, list)):
+                temp[key] = [] if keys[i+1].isdigit() else {}
+            temp = temp[key]
+    last_key = keys[-1]
+    if last_key.isdigit():
+        last_key = int(last_key)
+        if isinstance(temp, list):
+            while len(temp) <= last_key:
+                temp.append(None)
+            temp[last_key] = value
+    else:
+        temp[last_key] = value
+
+
+def _edge_case_idoc() -> bytes:
+    """An IDoc hitting MAP fall-through, failed and decimal NUMBERs, blanks and a missing segment."""
+    xml = customer_idoc(0).decode("utf-8")
+    replacements = [
+        (r"<LAND1>US</LAND1>", "<LAND1>DE</LAND1>"),
+        (r"<KUNNR>0000100000</KUNNR>", "<KUNNR>ABC</KUNNR>"),
+        (r"<NAME1>Customer 0 Logistics Inc.</NAME1>", "<NAME1></NAME1>"),
+        (r"<ORT01>New York</ORT01>", "<ORT01>  New York  </ORT01>"),
+        (r"<VKORG>1000</VKORG>", "<VKORG>10.5</VKORG>"),
+        (r"<E1KNBAT .*?</E1KNBAT>", ""),
+    ]
+    for pattern, replacement in replacements:
+        xml = re.sub(pattern, replacement, xml, count=1, flags=re.DOTALL)
+    return xml.encode("utf-8")
+
+
+DOCUMENTS = [customer_idoc(index) for index in range(3)] + [_edge_case_idoc()]
+DOCUMENT_IDS = [f"customer-{index}" for index in range(3)] + ["edge-cases"]
+
+
+def _idoc(xml_data):
+    # Segment paths in the mapping are relative to the IDOC element
+    return parse_xml_to_dict(xml_data)["IDOC"]
+
+
+def _expected(xml_data, mapping_json, template_json):
+    output = copy.deepcopy(template_json)
+    _reference_apply_mapping(_idoc(xml_data), mapping_json, output)
+    return output
+
+
+@pytest.mark.parametrize("xml_data", DOCUMENTS, ids=DOCUMENT_IDS)
+def test_apply_mapping_matches_reference(xml_data, mapping_json, template_json, plan, template):
+    expected = _expected(xml_data, mapping_json, template_json)
+    service = TransformService(storage_service=None)
+
+    output = template.new()
+    service._apply_mapping(_idoc(xml_data), plan, output)
+    assert output == expected
+
+    # A mapping dictionary is compiled on the fly
+    output = template.new()
+    service._apply_mapping(_idoc(xml_data), mapping_json, output)
+    assert output == expected
+
+
+@pytest.mark.parametrize("xml_data", DOCUMENTS, ids=DOCUMENT_IDS)
+def test_streamed_segments_match_reference(xml_data, mapping_json, template_json, plan):
+    expected = _expected(xml_data, mapping_json, template_json)
+    output = copy.deepcopy(template_json)
+    TransformService(storage_service=None)._apply_segments(iter_segments(xml_data), plan, output)
+    assert output == expected
+
+
+def test_edge_case_idoc_exercises_rules(mapping_json, template_json):
+    output = _expected(_edge_case_idoc(), mapping_json, template_json)
+    location = output["location"][0]
+    assert location["basicLocation"]["address"]["countryCode"] == "DE"
+    assert location["basicLocation"]["address"]["city"] == "New York"
+    assert location["sales"]["organization"] == "10.5"
+    assert "locationId" not in location
+    assert "parentParty" not in location
+    assert "bankDetails" not in location["financial"]
+
+
+def test_idoc_prefixed_segments_match_bare_ones(mapping_json, template, plan):
+    prefixed = compile_mapping({"mappings": {f"IDOC.{name}": segment
+                                             for name, segment in mapping_json["mappings"].items()}})
+    service = TransformService(storage_service=None)
+    xml_data = customer_idoc(0)
+
+    assert (list(service.transform_documents(xml_data, prefixed, template))
+            == list(service.transform_documents(xml_data, plan, template)))
+    output, expected = template.new(), template.new()
+    service._apply_mapping(_idoc(xml_data), prefixed, output)
+    service._apply_mapping(_idoc(xml_data), plan, expected)
+    assert output == expected
+
+
+def test_idoc_prefixed_sources_are_analyzed_and_converted_like_bare_ones():
+    def rule(source, target):
+        return {"source": source, "target": target, "validation": "TEXT", "default_value": "",
+                "transformation": ""}
+
+    targets = {"KUNNR": "location.0.locationId", "NAME1": "location.0.name"}
+    prefixed = [rule(f"IDOC.E1KNA1M.{field}", target) for field, target in targets.items()]
+    bare = [rule(f"E1KNA1M.{field}", target) for field, target in targets.items()]
+
+    assert analyze_mapping(prefixed) == analyze_mapping(bare) == []
+    assert convert_mapping_to_json(prefixed) == convert_mapping_to_json(bare)
+    # The IDOC element itself is no segment
+    assert [issue.code for issue in analyze_mapping([rule("IDOC.KUNNR", "location.0.locationId")])] == [
+        "unreachable"
+    ]
+
+
+@pytest.mark.parametrize("json_obj, path, expected", [
+    ({}, ("location", 0, "id"), {"location": [{"id": "A"}]}),
+    ({"location": [{"id": "B"}]}, ("location", 1, "id"), {"location": [{"id": "B"}, {"id": "A"}]}),
+    # An object where the path expects an array is replaced in its parent
+    ({"location": {}}, ("location", 1, "id"), {"location": [{}, {"id": "A"}]}),
+    ({"a": [{"b": {}}]}, ("a", 0, "b", 0, "id"), {"a": [{"b": [{"id": "A"}]}]}),
+    ({}, ("location", "ids", 2), {"location": {"ids": [None, None, "A"]}}),
+])
+def test_set_path_value(json_obj, path, expected):
+    set_path_value(json_obj, path, "A")
+    assert json_obj == expected
+
+
+def test_template_new_returns_independent_copies(template, template_json):
+    first = template.new()
+    first["definitions"].clear()
+    assert template.new() == template_json
+
+
+def test_plan_pickle_round_trip(plan):
+    data = dump_plan(plan)
+    loaded = load_plan(data)
+    assert loaded.segments[0][1].fields == plan.segments[0][1].fields
+    assert dump_plan(loaded) == data
+
+    xml_data = _edge_case_idoc()
+    service = TransformService(storage_service=None)
+    assert (list(service.transform_documents(xml_data, loaded, {"location": [{}]}))
+            == list(service.transform_documents(xml_data, plan, {"location": [{}]})))
+
+
+class _Exploit:
+    def __reduce__(self):
+        return (print, ("unpickled",))
+
+
+@pytest.mark.parametrize("data", [
+    pickle.dumps(_Exploit()),
+    pickle.dumps({"segments": []}),
+    b"not a pickle",
+])
+def test_load_plan_rejects_other_objects(data):
+    with pytest.raises(ValueError, match="Invalid plan artifact"):
+        load_plan(data)
+
+
+def test_plan_store_publishes_versions(storage, mapping_json):
+    plan_store = PlanStore(storage)
+    version = plan_store.publish(MAPPING_PATH, mapping_json)
+
+    index = plan_store.load_index(MAPPING_PATH)
+    assert index["latest"] == version["version"]
+    assert plan_store.resolve(f"{MAPPING_PATH}@latest") == f"{MAPPING_PATH}@{version['version']}"
+    assert dump_plan(plan_store.load_plan(f"{MAPPING_PATH}@latest")) == dump_plan(compile_mapping(mapping_json))
+
+    # Publishing the same mapping again keeps the version
+    assert plan_store.publish(MAPPING_PATH, mapping_json)["version"] == version["version"]
+    assert len(plan_store.load_index(MAPPING_PATH)["versions"]) == 1
+
+
+def test_plan_store_rejects_tampered_artifact(storage, mapping_json):
+    version = PlanStore(storage).publish(MAPPING_PATH, mapping_json)
+    storage.save_file(pickle.dumps(_Exploit()), version["plan_file"], content_type="application/octet-stream")
+
+    with pytest.raises(ValueError, match="does not match its index entry"):
+        PlanStore(storage).load_plan(f"{MAPPING_PATH}@{version['version']}")
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services.dedup_service import DedupIndex
+from app.services.log_sink import LogSink
+from app.services.manifest_service import ManifestStore
+from app.services.plan_store import PlanStore
+from app.services.transform_service import TransformService
+from app.services.transform_worker import TransformPool
+from app.utils.xml_parser import iter_idocs, iter_segments
+from tests.conftest import MAPPING_PATH, TEMPLATE_PATH, customer_id, customer_idoc, idoc_packet
+
+CUSTOMERS = 4
+
+
+@pytest.fixture(autouse=True)
+def inline_executor(monkeypatch):
+    # Worker processes would dominate the runtime of these small batches
+    monkeypatch.setattr(settings, "EXECUTOR_MODE", "inline")
+
+
+@pytest.fixture
+def service():
+    return TransformService(storage_service=None)
+
+
+def _location_ids(document):
+    return [location.get("locationId") for location in document["location"]]
+
+
+def _single_document(service, plan, template, xml_data):
+    document = template.new()
+    service._apply_segments(iter_segments(xml_data), plan, document)
+    return document
+
+
+def test_iter_idocs_groups_segments_per_idoc():
+    idocs = list(iter_idocs(idoc_packet(CUSTOMERS)))
+    assert len(idocs) == CUSTOMERS
+    assert [name for name, _ in idocs[0]] == [name for name, _ in iter_segments(customer_idoc(0))]
+    # A plain IDoc file is a packet of one
+    assert len(list(iter_idocs(customer_idoc(0)))) == 1
+
+
+def test_split_packet_yields_one_document_per_idoc(service, plan, template):
+    documents = list(service._iter_packet_documents(iter_idocs(idoc_packet(CUSTOMERS)), plan, template))
+
+    assert documents == [
+        _single_document(service, plan, template, customer_idoc(index)) for index in range(CUSTOMERS)
+    ]
+
+
+def test_merge_packet_yields_one_message_with_all_locations(service, plan, template):
+    message = service._build_packet_message(iter_idocs(idoc_packet(CUSTOMERS)), plan, template)
+
+    assert _location_ids(message) == [customer_id(index) for index in range(CUSTOMERS)]
+    # The header comes from the first IDoc
+    first = _single_document(service, plan, template, customer_idoc(0))
+    assert message["header"] == first["header"]
+    assert message["location"][0] == first["location"][0]
+
+
+def test_process_file_saves_split_packet(storage):
+    storage.save_file(idoc_packet(CUSTOMERS), "source/packet.xml", content_type="application/xml")
+    service = TransformService(storage)
+
+    output_path, _ = asyncio.run(service.process_file("source/packet.xml", MAPPING_PATH, TEMPLATE_PATH,
+                                                      packet_mode="split"))
+
+    files = sorted(storage.list_files(output_path + "/"))
+    assert [name.rsplit("/", 1)[-1] for name in files] == [f"idoc_{i:05d}.json" for i in range(1, CUSTOMERS + 1)]
+    assert [storage.load_json(name)[0]["location"][0]["locationId"] for name in files] == [
+        customer_id(index) for index in range(CUSTOMERS)
+    ]
+
+
+def test_process_file_logs_to_shared_sink(storage):
+    storage.save_file(customer_idoc(0), "source/a.xml", content_type="application/xml")
+    sink = LogSink(storage, "service-1", flush_interval=60)
+    service = TransformService(storage, log_sink=sink)
+
+    output_path, log_path = asyncio.run(service.process_file("source/a.xml", MAPPING_PATH, TEMPLATE_PATH))
+    with pytest.raises(Exception):
+        asyncio.run(service.process_file("source/missing.xml", MAPPING_PATH, TEMPLATE_PATH))
+    sink.close()
+
+    # No log object per file, both results are records of the shared log
+    assert log_path == sink.path
+    assert storage.list_files("logs/") == ["logs/service-1.jsonl.gz"]
+    records = [json.loads(line) for line in storage.load_file(log_path).splitlines()]
+    assert [(record["source_file"], record["status"], record["level"]) for record in records] == [
+        ("source/a.xml", "success", "INFO"), ("source/missing.xml", "failed", "ERROR")
+    ]
+    assert records[0]["output_file"] == output_path
+
+
+def test_process_file_rejects_unknown_packet_mode(storage):
+    with pytest.raises(ValueError, match="Unknown packet mode"):
+        asyncio.run(TransformService(storage).process_file("source/a.xml", MAPPING_PATH, TEMPLATE_PATH,
+                                                           packet_mode="zip"))
+
+
+def test_inline_revalidates_cached_plan_in_background(storage, mapping_json, monkeypatch):
+    PlanStore(storage).publish(MAPPING_PATH, mapping_json)
+    service = TransformService(storage)
+    config_ref = f"{MAPPING_PATH}@latest"
+    first, _ = asyncio.run(service.transform_inline(customer_idoc(0), config_ref, TEMPLATE_PATH))
+
+    # Every entry is now due for revalidation: requests must not wait for it
+    monkeypatch.setattr(storage.cache, "revalidate_seconds", 0)
+    callers = []
+    for method in ("stat_object", "get_object"):
+        def recorded(*args, _call=getattr(storage.client, method), **kwargs):
+            callers.append(threading.current_thread().name)
+            return _call(*args, **kwargs)
+        monkeypatch.setattr(storage.client, method, recorded)
+
+    second, _ = asyncio.run(service.transform_inline(customer_idoc(0), config_ref, TEMPLATE_PATH))
+    storage._revalidator.submit(lambda: None).result()
+
+    assert second == first
+    assert callers and all(name.startswith("cache-revalidate") for name in callers)
+    assert storage.cache_stats()["revalidations"] >= 2
+
+
+def _save_sources(storage, folder, idocs):
+    for index, idoc in enumerate(idocs):
+        storage.save_file(idoc, f"{folder}/idoc_{index}.xml", content_type="application/xml")
+
+
+def test_incremental_batch_skips_unchanged_sources(storage, tmp_path):
+    idocs = [customer_idoc(index) for index in range(CUSTOMERS)]
+    _save_sources(storage, "source", idocs)
+    service = TransformService(storage, manifest_store=ManifestStore(str(tmp_path / "manifest.sqlite3")))
+    skipped = []
+
+    first = asyncio.run(service.batch_process("source", MAPPING_PATH, TEMPLATE_PATH, incremental=True,
+                                              on_skipped=skipped.append))
+    assert sorted(result["status"] for result in first) == ["success"] * CUSTOMERS
+
+    # A changed source gets a new ETag and is transformed again
+    storage.save_file(idocs[0].replace(b"New York", b"Boston"), "source/idoc_0.xml",
+                      content_type="application/xml")
+    second = asyncio.run(service.batch_process("source", MAPPING_PATH, TEMPLATE_PATH, incremental=True,
+                                               on_skipped=skipped.append))
+    assert [result["source_file"] for result in second] == ["source/idoc_0.xml"]
+    assert skipped == [0, CUSTOMERS - 1]
+
+    # Without incremental every source runs
+    third = asyncio.run(service.batch_process("source", MAPPING_PATH, TEMPLATE_PATH))
+    assert len(third) == CUSTOMERS
+
+
+def test_incremental_batch_needs_manifest_store(storage):
+    with pytest.raises(ValueError, match="manifest store"):
+        asyncio.run(TransformService(storage).batch_process("source", MAPPING_PATH, TEMPLATE_PATH,
+                                                            incremental=True))
+
+
+def test_batch_reports_duplicate_idocs(storage, tmp_path):
+    idocs = [customer_idoc(index) for index in range(2)]
+    _save_sources(storage, "source/first", idocs)
+    # Same business content under a new IDoc number: EDI_DC40 is not fingerprinted
+    _save_sources(storage, "source/second", [
+        idocs[0].replace(b"00000000000000000001", b"00000000000000000099"),
+        idocs[1].replace(b"New York", b"Boston"),
+    ])
+    service = TransformService(storage, dedup_index=DedupIndex(str(tmp_path / "dedup.sqlite3")))
+
+    first = asyncio.run(service.batch_process("source/first", MAPPING_PATH, TEMPLATE_PATH))
+    assert sorted(result["status"] for result in first) == ["success", "success"]
+    first_outputs = {result["source_file"]: result["output_file"] for result in first}
+
+    second = {result["source_file"]: result for result in
+              asyncio.run(service.batch_process("source/second", MAPPING_PATH, TEMPLATE_PATH))}
+    assert second["source/second/idoc_0.xml"]["status"] == "duplicate"
+    assert second["source/second/idoc_0.xml"]["output_file"] == first_outputs["source/first/idoc_0.xml"]
+    assert second["source/second/idoc_1.xml"]["status"] == "success"
+
+
+def test_split_packet_drops_duplicate_idocs(storage, tmp_path):
+    storage.save_file(idoc_packet(2), "source/first/packet_1.xml", content_type="application/xml")
+    storage.save_file(idoc_packet(3), "source/second/packet_2.xml", content_type="application/xml")
+    service = TransformService(storage, dedup_index=DedupIndex(str(tmp_path / "dedup.sqlite3")))
+
+    asyncio.run(service.batch_process("source/first", MAPPING_PATH, TEMPLATE_PATH, packet_mode="split"))
+    [result] = asyncio.run(service.batch_process("source/second", MAPPING_PATH, TEMPLATE_PATH,
+                                                 packet_mode="split"))
+
+    assert result["status"] == "success"
+    [output] = storage.list_files(result["output_file"] + "/")
+    assert storage.load_json(output)[0]["location"][0]["locationId"] == customer_id(2)
+
+
+def test_bulk_batch_uploads_parts_early_when_budget_is_full(storage, monkeypatch):
+    idocs = [customer_idoc(index) for index in range(CUSTOMERS)]
+    _save_sources(storage, "source", idocs)
+    # Room for about two sources: buffered lines must not starve the downloads
+    monkeypatch.setattr(settings, "PIPELINE_MAX_BYTES_IN_FLIGHT", 2 * len(idocs[0]))
+    service = TransformService(storage)
+
+    results = asyncio.run(asyncio.wait_for(
+        service.batch_process("source", MAPPING_PATH, TEMPLATE_PATH, output_mode="bulk", batch_id="batch-1"),
+        timeout=30
+    ))
+
+    assert sorted(result["status"] for result in results) == ["success"] * CUSTOMERS
+    parts = sorted({result["output_file"] for result in results})
+    assert len(parts) > 1
+    location_ids = sorted(json.loads(line)["location"][0]["locationId"]
+                          for part in parts for line in storage.load_file(part).splitlines())
+    assert location_ids == [customer_id(index) for index in range(CUSTOMERS)]
+
+
+def test_batch_in_worker_processes(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXECUTOR_MODE", "process")
+    _save_sources(storage, "source/first", [customer_idoc(index) for index in range(CUSTOMERS)])
+    # A resent IDoc: the worker's dedup filter reports it back to this process
+    _save_sources(storage, "source/second", [customer_idoc(0)])
+    pool = TransformPool(max_workers=2)
+    try:
+        service = TransformService(storage, dedup_index=DedupIndex(str(tmp_path / "dedup.sqlite3")),
+                                   transform_pool=pool)
+        first = asyncio.run(service.batch_process("source/first", MAPPING_PATH, TEMPLATE_PATH))
+        [second] = asyncio.run(service.batch_process("source/second", MAPPING_PATH, TEMPLATE_PATH))
+    finally:
+        pool.close()
+
+    assert sorted(result["status"] for result in first) == ["success"] * CUSTOMERS
+    location_ids = sorted(storage.load_json(result["output_file"])[0]["location"][0]["locationId"]
+                          for result in first)
+    assert location_ids == [customer_id(index) for index in range(CUSTOMERS)]
+    assert second["status"] == "duplicate"